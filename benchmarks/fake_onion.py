@@ -0,0 +1,218 @@
+"""
+Synthetic onion web for offline benchmarks
+ - Deterministic: the same seed always produces the same sites, pages and links
+ - Every site gets a valid v3 .onion hostname plus optional mirror hostnames
+ - Per-page latency, failure rate and page size are configurable
+ - Served by a threaded HTTP server that routes on the Host header
+"""
+
+import base64
+import hashlib
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+WORDS = (
+    "market forum vendor escrow listing mirror login account wallet service "
+    "private secure anonymous hidden board thread reply post index archive "
+    "support contact rules faq news update release onion relay bridge"
+).split()
+
+THREAT_WORDS = ["leak", "passwords", "ransomware", "carding", "phishing", "exploit"]
+
+ASSET_EXTENSIONS = [".png", ".svg", ".avif", ".css", ".js", ".xml"]
+
+
+def onion_v3_address(pubkey: bytes) -> str:
+    """Build a v3 onion hostname (pubkey || checksum || version, base32)."""
+    version = b"\x03"
+    checksum = hashlib.sha3_256(b".onion checksum" + pubkey + version).digest()[:2]
+    return base64.b32encode(pubkey + checksum + version).decode("ascii").lower() + ".onion"
+
+
+class OnionWeb:
+    """A generated set of onion sites. Pages are rendered on demand."""
+
+    def __init__(self, sites=20, pages_per_site=50, links_per_page=12,
+                 external_link_ratio=0.1, asset_link_ratio=0.2, mirrors=1,
+                 page_bytes=8 * 1024, latency_ms=0.0, latency_jitter_ms=0.0,
+                 failure_rate=0.0, keyword_rate=0.2, seed=1337):
+        self.sites = sites
+        self.pages_per_site = pages_per_site
+        self.links_per_page = links_per_page
+        self.external_link_ratio = external_link_ratio
+        self.asset_link_ratio = asset_link_ratio
+        self.mirrors = mirrors
+        self.page_bytes = page_bytes
+        self.latency_ms = latency_ms
+        self.latency_jitter_ms = latency_jitter_ms
+        self.failure_rate = failure_rate
+        self.keyword_rate = keyword_rate
+        self.seed = seed
+
+        rng = random.Random(seed)
+        # hosts[site] is a list of hostnames; hosts[site][0] is the primary
+        self.hosts = [
+            [onion_v3_address(rng.randbytes(32)) for _ in range(max(1, mirrors))]
+            for _ in range(sites)
+        ]
+        self.host_to_site = {h: i for i, names in enumerate(self.hosts) for h in names}
+
+        self._hits = {}
+        self._lock = threading.Lock()
+        self.bytes_served = 0
+        self.requests_served = 0
+
+    def config(self) -> dict:
+        keys = ["sites", "pages_per_site", "links_per_page", "external_link_ratio",
+                "asset_link_ratio", "mirrors", "page_bytes", "latency_ms",
+                "latency_jitter_ms", "failure_rate", "keyword_rate", "seed"]
+        return {k: getattr(self, k) for k in keys}
+
+    # --- URLs ---
+    @staticmethod
+    def page_path(page: int) -> str:
+        return "/" if page == 0 else f"/page/{page}.html"
+
+    @staticmethod
+    def parse_path(path: str) -> int:
+        path = path.split("?")[0].split("#")[0]
+        if path in ("", "/"):
+            return 0
+        if path.startswith("/page/") and path.endswith(".html"):
+            try:
+                return int(path[len("/page/"):-len(".html")])
+            except ValueError:
+                return -1
+        return -1
+
+    def seed_urls(self, count=None):
+        count = self.sites if count is None else min(count, self.sites)
+        return [f"http://{self.hosts[i][0]}" for i in range(count)]
+
+    # --- Rendering ---
+    def _rng(self, site: int, page: int) -> random.Random:
+        return random.Random(f"{self.seed}:{site}:{page}")
+
+    def render(self, site: int, page: int) -> str:
+        rng = self._rng(site, page)
+        title_words = " ".join(rng.choice(WORDS) for _ in range(4)).title()
+
+        links = []
+        for _ in range(self.links_per_page):
+            roll = rng.random()
+            if roll < self.external_link_ratio and self.sites > 1:
+                other = rng.randrange(self.sites)
+                target_host = rng.choice(self.hosts[other])
+                links.append(f"http://{target_host}{self.page_path(rng.randrange(self.pages_per_site))}")
+            elif roll < self.external_link_ratio + self.asset_link_ratio:
+                links.append(f"/static/{rng.randrange(1000)}{rng.choice(ASSET_EXTENSIONS)}")
+            else:
+                links.append(self.page_path(rng.randrange(self.pages_per_site)))
+
+        paragraphs = []
+        if rng.random() < self.keyword_rate:
+            paragraphs.append(
+                f"Fresh {rng.choice(THREAT_WORDS)} dump posted by vendor, "
+                f"contact admin{rng.randrange(100)}@mail2tor.onion for access details."
+            )
+        size = 0
+        target = max(0, int(self.page_bytes * rng.uniform(0.5, 1.5)))
+        while size < target:
+            para = " ".join(rng.choice(WORDS) for _ in range(rng.randint(12, 40))).capitalize() + "."
+            paragraphs.append(para)
+            size += len(para) + 8
+
+        anchors = "\n".join(f'<li><a href="{href}">{rng.choice(WORDS)}</a></li>' for href in links)
+        body = "\n".join(f"<p>{p}</p>" for p in paragraphs)
+        return (
+            f"<!DOCTYPE html><html><head><title>{title_words}</title>"
+            f'<link rel="icon" href="/static/favicon.png"></head>'
+            f"<body><article>{body}</article>"
+            f"<div class=\"nav\"><ul>{anchors}</ul></div></body></html>"
+        )
+
+    def pages(self, limit=None):
+        """Yield (url, html) for every page without going through HTTP."""
+        count = 0
+        for site in range(self.sites):
+            for page in range(self.pages_per_site):
+                if limit is not None and count >= limit:
+                    return
+                host = self.hosts[site][0]
+                yield f"http://{host}{self.page_path(page)}", self.render(site, page)
+                count += 1
+
+    # --- Behaviour knobs ---
+    def latency_for(self, host: str, path: str) -> float:
+        if self.latency_ms <= 0 and self.latency_jitter_ms <= 0:
+            return 0.0
+        rng = random.Random(f"{self.seed}:latency:{host}{path}")
+        jitter = rng.uniform(-self.latency_jitter_ms, self.latency_jitter_ms)
+        return max(0.0, self.latency_ms + jitter) / 1000.0
+
+    def should_fail(self, host: str, path: str) -> bool:
+        if self.failure_rate <= 0:
+            return False
+        key = f"{host}{path}"
+        with self._lock:
+            hit = self._hits.get(key, 0)
+            self._hits[key] = hit + 1
+        rng = random.Random(f"{self.seed}:fail:{key}:{hit}")
+        return rng.random() < self.failure_rate
+
+    def record(self, nbytes: int):
+        with self._lock:
+            self.bytes_served += nbytes
+            self.requests_served += 1
+
+
+class _OnionHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status: int, body: bytes, content_type: str):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        if self.command != "HEAD":
+            self.wfile.write(body)
+        self.server.web.record(len(body))
+
+    def do_GET(self):
+        web = self.server.web
+        host = (self.headers.get("Host") or "").split(":")[0].lower()
+        site = web.host_to_site.get(host)
+        page = web.parse_path(self.path)
+
+        delay = web.latency_for(host, self.path)
+        if delay:
+            time.sleep(delay)
+
+        if site is None:
+            self._send(404, b"unknown onion service", "text/plain")
+        elif web.should_fail(host, self.path):
+            self._send(503, b"service unavailable", "text/plain")
+        elif self.path.startswith("/static/"):
+            self._send(200, b"\x89PNG" + b"\x00" * 256, "image/png")
+        elif 0 <= page < web.pages_per_site:
+            html = web.render(site, page).encode("utf-8")
+            self._send(200, html, "text/html; charset=utf-8")
+        else:
+            self._send(404, b"not found", "text/plain")
+
+    do_HEAD = do_GET
+
+
+def serve(web: OnionWeb, host="127.0.0.1", port=0) -> ThreadingHTTPServer:
+    """Start the fake web in a daemon thread. Returns the running server."""
+    server = ThreadingHTTPServer((host, port), _OnionHandler)
+    server.daemon_threads = True
+    server.web = web
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,450 @@
+"""
+Offline benchmark suite
+ - Runs entirely on localhost: a synthetic onion web behind a SOCKS5h stand-in
+ - Scenarios: crawl engine, distributed workers, parse backends, storage
+   writers, raw page archive, indicator extraction, keyword detection,
+   SOC sink delivery against slow local collectors, URL-seen sets,
+   query API caching
+ - Reports pages/sec, bytes/page and peak traced memory per scenario
+ - Results are seeded and written as JSON so runs can be compared for regressions
+
+Usage:
+    python benchmarks/run_bench.py                       # all scenarios
+    python benchmarks/run_bench.py crawl parse --sites 50 --latency-ms 20
+    python benchmarks/run_bench.py --out bench.json
+    python benchmarks/run_bench.py --compare bench.json  # exit 1 on regression
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+REPO_ROOT = BENCH_DIR.parent
+sys.path.insert(0, str(REPO_ROOT / "crawler"))
+
+import fake_onion
+import socks_stub
+import sink_stub
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    def register(fn):
+        SCENARIOS[name] = fn
+        return fn
+    return register
+
+
+@contextlib.contextmanager
+def measure():
+    """Wall time + peak traced memory for the enclosed block."""
+    result = {}
+    tracemalloc.start()
+    start = time.perf_counter()
+    try:
+        yield result
+    finally:
+        result["seconds"] = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        result["peak_mem_bytes"] = peak
+
+
+@contextlib.contextmanager
+def quiet():
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        yield
+
+
+def rates(stats: dict, pages: int, nbytes: int) -> dict:
+    seconds = stats["seconds"] or 1e-9
+    return {
+        "pages": pages,
+        "seconds": round(seconds, 4),
+        "pages_per_sec": round(pages / seconds, 2),
+        "bytes_per_page": round(nbytes / pages, 1) if pages else 0,
+        "peak_mem_bytes": stats["peak_mem_bytes"],
+    }
+
+
+def sample_pages(web, limit):
+    return list(web.pages(limit))
+
+
+def start_network(web):
+    """Serve the fake web behind the SOCKS stand-in and point the crawler at it.
+
+    Must run before crawler.py is imported: its proxy settings are read at import.
+    """
+    http_server = fake_onion.serve(web)
+    socks = socks_stub.serve(http_server.server_address)
+    os.environ.update({
+        "TOR_SOCKS_HOST": socks.server_address[0],
+        "TOR_SOCKS_PORT": str(socks.server_address[1]),
+        "CRAWLER_RATE_LIMIT_SECONDS": "0",
+        "CRAWLER_JITTER_SECONDS": "0",
+        "CRAWLER_IDLE_POLL_SECONDS": "0.05",
+        "CRAWLER_ARCHIVE_DIR": tempfile.mkdtemp(prefix="bench-archive-"),
+        "CRAWLER_METRICS_DIR": tempfile.mkdtemp(prefix="bench-metrics-"),
+        "THREAT_STORE_PATH": str(Path(tempfile.mkdtemp(prefix="bench-store-")) / "threat_store.sqlite"),
+    })
+    return http_server, socks
+
+
+# --- SCENARIOS ---
+@scenario("crawl")
+def bench_crawl(web, args):
+    """End-to-end crawler.crawl() through the SOCKS stand-in."""
+    import crawler as engine
+    engine.MAX_PAGES_PER_DOMAIN = args.crawl_pages
+
+    with tempfile.TemporaryDirectory() as tmp:
+        out = Path(tmp) / "crawl.jsonl"
+        web.bytes_served = web.requests_served = 0
+        with quiet(), measure() as stats:
+            engine.crawl(web.seed_urls(args.seeds), db_path=str(out))
+        pages = sum(1 for _ in open(out, encoding="utf-8")) if out.exists() else 0
+
+    result = rates(stats, pages, web.bytes_served)
+    result["requests"] = web.requests_served
+    return result
+
+
+@scenario("distributed")
+def bench_distributed(web, args):
+    """crawler.crawl_worker() threads sharing one in-memory frontier, 1..N workers."""
+    import threading
+    import crawler as engine
+    import coordinator
+
+    results = {}
+    for workers in sorted({1, args.workers}):
+        frontier = coordinator.open_frontier("memory://", max_pages_per_domain=args.crawl_pages)
+        with tempfile.TemporaryDirectory() as tmp:
+            out = Path(tmp) / "crawl.jsonl"
+            web.bytes_served = web.requests_served = 0
+            threads = [
+                threading.Thread(target=engine.crawl_worker,
+                                 args=(web.seed_urls(args.seeds), frontier, f"bench-{i}", str(out)))
+                for i in range(workers)
+            ]
+            with quiet(), measure() as stats:
+                for t in threads:
+                    t.start()
+                for t in threads:
+                    t.join()
+            pages = sum(1 for _ in open(out, encoding="utf-8")) if out.exists() else 0
+        results[f"{workers}_workers"] = rates(stats, pages, web.bytes_served)
+    return results
+
+
+@scenario("parse")
+def bench_parse(web, args):
+    """crawler.parse_page() with every installed BeautifulSoup backend."""
+    import crawler as engine
+    from bs4 import FeatureNotFound
+
+    pages = sample_pages(web, args.sample_pages)
+    nbytes = sum(len(html.encode("utf-8")) for _, html in pages)
+    results = {}
+    for backend in ("html.parser", "lxml", "html5lib"):
+        try:
+            engine.parse_page(pages[0][0], pages[0][1], features=backend)
+        except FeatureNotFound:
+            results[backend] = {"skipped": "not installed"}
+            continue
+        with measure() as stats:
+            for url, html in pages:
+                engine.parse_page(url, html, features=backend)
+        results[backend] = rates(stats, len(pages), nbytes)
+    return results
+
+
+@scenario("storage")
+def bench_storage(web, args):
+    """JSONL append (crawler.py) vs SQLite insert (crawler1.py)."""
+    import crawler as engine
+
+    records = []
+    for url, html in sample_pages(web, args.sample_pages):
+        parsed = engine.parse_page(url, html)
+        parsed["url"] = url
+        records.append(parsed)
+    nbytes = sum(len(json.dumps(r, ensure_ascii=False).encode("utf-8")) + 1 for r in records)
+
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "out.jsonl")
+        with measure() as stats:
+            for record in records:
+                engine.save_to_json(record, path)
+        results["jsonl"] = rates(stats, len(records), nbytes)
+
+        try:
+            import crawler1
+        except ImportError as e:
+            results["sqlite"] = {"skipped": str(e)}
+        else:
+            conn = crawler1.init_db(str(Path(tmp) / "out.sqlite"))
+            with quiet(), measure() as stats:
+                for record in records:
+                    crawler1.save_page(conn, record["url"], "", 200, record["title"], record["passage"])
+            conn.close()
+            results["sqlite"] = rates(stats, len(records), nbytes)
+    return results
+
+
+@scenario("archive")
+def bench_archive(web, args):
+    """archive.Archive put/get: compression ratio, dedupe and throughput."""
+    import archive
+
+    pages = [(url, html.encode("utf-8")) for url, html in sample_pages(web, args.sample_pages)]
+    nbytes = sum(len(body) for _, body in pages)
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        store = archive.Archive(tmp)
+        with measure() as stats:
+            for url, body in pages:
+                store.put(url, body)
+            for url, body in pages[: len(pages) // 4]:  # re-fetches of unchanged pages
+                store.put(url, body)
+        results["put"] = rates(stats, len(pages) + len(pages) // 4, nbytes)
+        with measure() as stats:
+            for url, _ in pages:
+                store.get(store.latest(url)[0])
+        results["get"] = rates(stats, len(pages), nbytes)
+        results["stats"] = store.stats()
+        store.close()
+    return results
+
+
+@scenario("indicators")
+def bench_indicators(web, args):
+    """indicators.extract() single-pass scan over raw HTML."""
+    import indicators
+
+    pages = sample_pages(web, args.sample_pages)
+    nbytes = sum(len(html.encode("utf-8")) for _, html in pages)
+    found = 0
+    with measure() as stats:
+        for _, html in pages:
+            found += len(indicators.extract(html))
+    result = rates(stats, len(pages), nbytes)
+    result["indicators"] = found
+    return result
+
+
+@scenario("detect")
+def bench_detect(web, args):
+    """preprc.py-style keyword detection over parsed records."""
+    import crawler as engine
+    import detector
+
+    records = []
+    for url, html in sample_pages(web, args.sample_pages):
+        parsed = engine.parse_page(url, html)
+        parsed["url"] = url
+        records.append(parsed)
+    records = records * args.detect_repeat
+    nbytes = sum(len(detector.entry_text(r).encode("utf-8")) for r in records)
+
+    with measure() as stats:
+        hits = detector.find_threats(records)
+    result = rates(stats, len(records), nbytes)
+    result["threat_entries"] = len(hits)
+    return result
+
+
+@scenario("sinks")
+def bench_sinks(web, args):
+    """sinks.Dispatcher emit() cost and delivery to a slow, flaky webhook + syslog + file drop."""
+    import sinks
+
+    http = sink_stub.serve_http(latency_ms=args.sink_latency_ms, failure_rate=0.1, seed=args.seed)
+    syslog = sink_stub.SyslogCollector(tcp=True)
+    with tempfile.TemporaryDirectory() as tmp:
+        drop = Path(tmp) / "outbox"
+        dispatcher = sinks.open_dispatcher([http.url, syslog.url, drop.as_uri()], spool_root=Path(tmp) / "spool",
+                                           batch_seconds=0.2, queue_size=2000)
+        records = [{"ts": time.time(), "org": "*", "threat_type": "Malware", "severity": "HIGH",
+                    "description": f"Keyword 'malware' on page {i}", "url": f"http://x{i % 97}.onion/"}
+                   for i in range(args.sink_records)]
+        nbytes = sum(len(json.dumps(r)) for r in records)
+        with measure() as stats:
+            for record in records:
+                dispatcher.emit("detection", record)
+        emitted = time.perf_counter()
+        with quiet():
+            dispatcher.close()
+        drain_seconds = time.perf_counter() - emitted
+        delivery = dispatcher.stats()
+        dropped_files = len(list(drop.glob("*.jsonl.gz")))
+
+    result = rates(stats, len(records), nbytes)
+    result["drain_seconds"] = round(drain_seconds, 3)
+    result["webhook_received"] = http.records
+    result["syslog_received"] = syslog.messages
+    result["file_batches"] = dropped_files
+    result["channels"] = {name.split("_")[0]: c for name, c in delivery.items()}
+    http.shutdown()
+    return result
+
+
+@scenario("seen")
+def bench_seen(web, args):
+    """Visited-set memory and false positives: set of strings vs fingerprint table vs Bloom."""
+    import seen
+
+    results = {}
+    for name, factory in (("python_set", set), ("fingerprint_set", seen.SeenSet),
+                          ("scalable_bloom", seen.ScalableBloom)):
+        with measure() as stats:
+            structure = factory()
+            for url in seen.synthetic_urls(args.seen_urls):
+                structure.add(url)
+        false_positives = sum(url in structure for url in seen.synthetic_urls(args.seen_urls // 5, prefix="b"))
+        result = rates(stats, args.seen_urls, 0)
+        # mmap'd tables live outside tracemalloc's view
+        nbytes = getattr(structure, "nbytes", stats["peak_mem_bytes"])
+        result["bytes_per_url"] = round(nbytes / args.seen_urls, 2)
+        result["false_positive_rate"] = false_positives / (args.seen_urls // 5)
+        results[name] = result
+    return results
+
+
+@scenario("api")
+def bench_api(web, args):
+    """Query API: first read of the crawl file vs cached answers vs ETag revalidation (304)."""
+    import requests
+    import api
+    import crawler as engine
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = str(Path(tmp) / "crawl.jsonl")
+        for url, html in sample_pages(web, args.sample_pages):
+            parsed = engine.parse_page(url, html)
+            parsed["url"] = url
+            engine.save_to_json(parsed, path)
+        nbytes = os.path.getsize(path)
+
+        server = api.serve("127.0.0.1", 0, api.QueryService(db_path=path))
+        base = f"http://127.0.0.1:{server.server_address[1]}/pages?limit=100"
+        session = requests.Session()
+        session.trust_env = False
+        results = {}
+        with measure() as stats:
+            etag = session.get(base).headers["ETag"]
+        results["cold"] = rates(stats, 1, nbytes)
+        with measure() as stats:
+            for _ in range(args.api_requests):
+                session.get(base)
+        results["cached"] = rates(stats, args.api_requests, 0)
+        with measure() as stats:
+            for _ in range(args.api_requests):
+                assert session.get(base, headers={"If-None-Match": etag}).status_code == 304
+        results["not_modified"] = rates(stats, args.api_requests, 0)
+        server.shutdown()
+        server.server_close()
+    return results
+
+
+# --- REGRESSION CHECK ---
+def flatten(results, prefix=""):
+    for key, value in results.items():
+        if isinstance(value, dict) and "pages_per_sec" not in value:
+            yield from flatten(value, f"{prefix}{key}.")
+        elif isinstance(value, dict):
+            yield f"{prefix}{key}", value
+
+
+def compare(current: dict, baseline: dict, tolerance: float):
+    """Return a list of human-readable regressions."""
+    regressions = []
+    base = dict(flatten(baseline.get("scenarios", {})))
+    for name, now in flatten(current["scenarios"]):
+        before = base.get(name)
+        if not before or "pages_per_sec" not in before:
+            continue
+        if now["pages_per_sec"] < before["pages_per_sec"] * (1 - tolerance):
+            regressions.append(f"{name}: pages/sec {before['pages_per_sec']} -> {now['pages_per_sec']}")
+        if now["peak_mem_bytes"] > before["peak_mem_bytes"] * (1 + tolerance):
+            regressions.append(f"{name}: peak mem {before['peak_mem_bytes']} -> {now['peak_mem_bytes']}")
+    return regressions
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("scenarios", nargs="*", help=f"any of: {', '.join(SCENARIOS)} (default: all)")
+    parser.add_argument("--sites", type=int, default=20)
+    parser.add_argument("--pages-per-site", type=int, default=50)
+    parser.add_argument("--links-per-page", type=int, default=12)
+    parser.add_argument("--mirrors", type=int, default=1)
+    parser.add_argument("--page-bytes", type=int, default=8 * 1024)
+    parser.add_argument("--latency-ms", type=float, default=0.0)
+    parser.add_argument("--latency-jitter-ms", type=float, default=0.0)
+    parser.add_argument("--failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--seeds", type=int, default=2, help="seed sites for the crawl scenarios")
+    parser.add_argument("--workers", type=int, default=4, help="workers for the distributed scenario")
+    parser.add_argument("--crawl-pages", type=int, default=100, help="per-domain page budget for the crawl scenario")
+    parser.add_argument("--sample-pages", type=int, default=200, help="pages for parse/storage/detect")
+    parser.add_argument("--detect-repeat", type=int, default=10)
+    parser.add_argument("--sink-records", type=int, default=20000)
+    parser.add_argument("--sink-latency-ms", type=float, default=200.0, help="webhook stand-in latency")
+    parser.add_argument("--seen-urls", type=int, default=200000)
+    parser.add_argument("--api-requests", type=int, default=500)
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--compare", help="baseline results JSON to check against")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args(argv)
+    unknown = set(args.scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f"unknown scenario(s): {', '.join(sorted(unknown))}")
+
+    web = fake_onion.OnionWeb(
+        sites=args.sites, pages_per_site=args.pages_per_site, links_per_page=args.links_per_page,
+        mirrors=args.mirrors, page_bytes=args.page_bytes, latency_ms=args.latency_ms,
+        latency_jitter_ms=args.latency_jitter_ms, failure_rate=args.failure_rate, seed=args.seed,
+    )
+    start_network(web)
+    results = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "web": web.config(),
+        "args": {k: v for k, v in vars(args).items() if k not in ("out", "compare")},
+        "scenarios": {},
+    }
+
+    for name in args.scenarios or list(SCENARIOS):
+        print(f"🏁 Running scenario: {name}")
+        results["scenarios"][name] = SCENARIOS[name](web, args)
+        print(json.dumps(results["scenarios"][name], indent=2))
+
+    if args.out:
+        Path(args.out).write_text(json.dumps(results, indent=2), encoding="utf-8")
+        print(f"💾 Results saved to: {args.out}")
+
+    if args.compare:
+        baseline = json.loads(Path(args.compare).read_text(encoding="utf-8"))
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print("❌ Regressions detected:")
+            for line in regressions:
+                print("   -", line)
+            return 1
+        print("✅ No regressions against baseline.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,109 @@
+"""
+Local stand-ins for SOC delivery targets
+ - HTTP collector for the webhook sink: accepts gzip JSON POSTs, with
+   configurable latency and failure rate to play a slow or flaky SIEM
+ - Syslog collector for the syslog sink: UDP datagrams or TCP octet-counted
+ - Both count what they received so a run can check end-to-end delivery
+"""
+
+import gzip
+import json
+import random
+import socket
+import socketserver
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class _CollectorHandler(BaseHTTPRequestHandler):
+    disable_nagle_algorithm = True
+
+    def do_POST(self):
+        server = self.server
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        if server.latency_ms:
+            time.sleep(server.latency_ms / 1000.0)
+        if server.rng.random() < server.failure_rate:
+            self.send_response(503)
+            self.end_headers()
+            return
+        if self.headers.get("Content-Encoding") == "gzip":
+            body = gzip.decompress(body)
+        records = json.loads(body)["records"]
+        with server.lock:
+            server.batches += 1
+            server.records += len(records)
+        self.send_response(202)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class HTTPCollector(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, latency_ms=0.0, failure_rate=0.0, seed=1337, host="127.0.0.1", port=0):
+        super().__init__((host, port), _CollectorHandler)
+        self.latency_ms = latency_ms
+        self.failure_rate = failure_rate
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.batches = 0
+        self.records = 0
+
+    @property
+    def url(self):
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/ingest"
+
+
+class _SyslogTCPHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        while True:
+            length = b""
+            while not length.endswith(b" "):
+                ch = self.rfile.read(1)
+                if not ch:
+                    return
+                length += ch
+            self.server.receive(self.rfile.read(int(length)))
+
+
+class SyslogCollector:
+    def __init__(self, tcp=False, host="127.0.0.1", port=0):
+        self.tcp = tcp
+        self.lock = threading.Lock()
+        self.messages = 0
+        if tcp:
+            self.server = socketserver.ThreadingTCPServer((host, port), _SyslogTCPHandler)
+            self.server.daemon_threads = True
+            self.server.receive = self.receive
+            threading.Thread(target=self.server.serve_forever, daemon=True).start()
+            self.address = self.server.server_address
+        else:
+            self.sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+            self.sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4 * 1024 * 1024)
+            self.sock.bind((host, port))
+            self.address = self.sock.getsockname()
+            threading.Thread(target=self._recv_udp, daemon=True).start()
+
+    def _recv_udp(self):
+        while True:
+            self.receive(self.sock.recv(65536))
+
+    def receive(self, message: bytes):
+        with self.lock:
+            self.messages += 1
+
+    @property
+    def url(self):
+        scheme = "syslog+tcp" if self.tcp else "syslog"
+        return f"{scheme}://{self.address[0]}:{self.address[1]}"
+
+
+def serve_http(latency_ms=0.0, failure_rate=0.0, seed=1337) -> HTTPCollector:
+    """Start the HTTP collector in a daemon thread. Returns the running server."""
+    server = HTTPCollector(latency_ms, failure_rate, seed)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
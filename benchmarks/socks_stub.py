@@ -0,0 +1,123 @@
+"""
+Local SOCKS5h stand-in for Tor
+ - Speaks enough SOCKS5 (RFC 1928/1929) for requests[socks] / PySocks
+ - Hostnames are resolved by the proxy (socks5h), so .onion names work
+ - Every CONNECT is routed to one upstream address (the fake onion web)
+ - SOCKS usernames are accepted and counted, like Tor's per-auth isolation
+"""
+
+import select
+import socket
+import socketserver
+import struct
+import threading
+
+
+class _SocksHandler(socketserver.BaseRequestHandler):
+    def _recv_exact(self, n: int) -> bytes:
+        buf = b""
+        while len(buf) < n:
+            chunk = self.request.recv(n - len(buf))
+            if not chunk:
+                raise ConnectionError("client closed during handshake")
+            buf += chunk
+        return buf
+
+    def handle(self):
+        try:
+            username = self._handshake()
+            target = self._read_request()
+        except (ConnectionError, ValueError, struct.error):
+            return
+
+        server = self.server
+        try:
+            upstream = socket.create_connection(server.route(*target), timeout=10)
+        except OSError:
+            self.request.sendall(b"\x05\x04\x00\x01" + b"\x00" * 6)  # host unreachable
+            return
+
+        for sock in (self.request, upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        server.record(username, target[0])
+        self.request.sendall(b"\x05\x00\x00\x01" + b"\x00" * 6)
+        self._relay(upstream)
+
+    def _handshake(self):
+        version, nmethods = self._recv_exact(2)
+        if version != 5:
+            raise ValueError("not SOCKS5")
+        methods = self._recv_exact(nmethods)
+        if 2 in methods:
+            self.request.sendall(b"\x05\x02")
+            _, ulen = self._recv_exact(2)
+            username = self._recv_exact(ulen).decode("utf-8", "replace")
+            (plen,) = self._recv_exact(1)
+            self._recv_exact(plen)
+            self.request.sendall(b"\x01\x00")
+            return username
+        self.request.sendall(b"\x05\x00")
+        return ""
+
+    def _read_request(self):
+        version, cmd, _, atyp = self._recv_exact(4)
+        if version != 5 or cmd != 1:
+            self.request.sendall(b"\x05\x07\x00\x01" + b"\x00" * 6)  # command not supported
+            raise ValueError("only CONNECT is supported")
+        if atyp == 1:
+            host = socket.inet_ntoa(self._recv_exact(4))
+        elif atyp == 3:
+            (length,) = self._recv_exact(1)
+            host = self._recv_exact(length).decode("idna")
+        elif atyp == 4:
+            host = socket.inet_ntop(socket.AF_INET6, self._recv_exact(16))
+        else:
+            raise ValueError("bad address type")
+        (port,) = struct.unpack("!H", self._recv_exact(2))
+        return host, port
+
+    def _relay(self, upstream: socket.socket):
+        sockets = [self.request, upstream]
+        try:
+            while True:
+                readable, _, _ = select.select(sockets, [], [], 30)
+                if not readable:
+                    return
+                for sock in readable:
+                    data = sock.recv(65536)
+                    if not data:
+                        return
+                    (upstream if sock is self.request else self.request).sendall(data)
+        except OSError:
+            return
+        finally:
+            upstream.close()
+
+
+class SocksStub(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, upstream, host="127.0.0.1", port=0):
+        super().__init__((host, port), _SocksHandler)
+        self.upstream = upstream
+        self.connections = 0
+        self.usernames = {}
+        self.hosts = set()
+        self._lock = threading.Lock()
+
+    def route(self, host: str, port: int):
+        return self.upstream
+
+    def record(self, username: str, host: str):
+        with self._lock:
+            self.connections += 1
+            self.usernames[username] = self.usernames.get(username, 0) + 1
+            self.hosts.add(host)
+
+
+def serve(upstream, host="127.0.0.1", port=0) -> SocksStub:
+    """Start the SOCKS stand-in in a daemon thread. Returns the running server."""
+    server = SocksStub(upstream, host, port)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
@@ -0,0 +1,292 @@
+"""
+Streaming alert engine
+ - Evaluates rules on every page as it is stored, so alerts land seconds
+   after the fetch instead of on the next batch run
+ - Rules: watchlist match for an org, severity threshold, first-seen onion
+   host, detection-rate spike (per-minute count vs an EWMA baseline)
+ - Running aggregates (totals, per-type counts and the time-series rollups
+   in rollups.py) are updated incrementally; nothing rescans the history
+ - Repeat alerts with the same key inside ALERT_DEDUPE_SECONDS are folded
+   into the existing alert (its count goes up) instead of creating new ones
+ - Readers (ui.py) call the get_* functions, which only read current state
+ - With a sinks.Dispatcher attached, detections and alerts are also forwarded
+   to the configured SIEM/webhook/syslog targets
+
+Watchlists live in data/watchlists.json (start from data/watchlists.example.json):
+    {"Example Corp": {"terms": ["example corp", "example.com"]}, ...}
+Without that file no organization is watched; the other rules still run.
+"""
+
+import json
+import re
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+from settings import DATA_DIR, STORE_PATH, env_str, env_float, env_int
+import detector
+import rollups
+
+# --- CONFIG ---
+WATCHLIST_PATH = env_str("THREAT_WATCHLIST_PATH", str(DATA_DIR / "watchlists.json"))
+ALERT_MIN_SEVERITY = env_str("ALERT_MIN_SEVERITY", "HIGH")
+ALERT_DEDUPE_SECONDS = env_float("ALERT_DEDUPE_SECONDS", 3600)
+SPIKE_FACTOR = env_float("ALERT_SPIKE_FACTOR", 3.0)
+SPIKE_MIN_COUNT = env_int("ALERT_SPIKE_MIN_COUNT", 5)
+SPIKE_WARMUP_MINUTES = env_int("ALERT_SPIKE_WARMUP_MINUTES", 10)
+SPIKE_ALPHA = 0.2  # EWMA smoothing per minute
+
+GLOBAL_ORG = "*"
+
+DEFAULT_WATCHLISTS = {}  # real orgs come from WATCHLIST_PATH, never from code
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS detections (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        org TEXT NOT NULL,
+        threat_type TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        description TEXT,
+        url TEXT
+    );
+    CREATE INDEX IF NOT EXISTS idx_detections_org_ts ON detections (org, ts);
+    CREATE INDEX IF NOT EXISTS idx_detections_ts ON detections (ts);
+    CREATE TABLE IF NOT EXISTS alerts (
+        id INTEGER PRIMARY KEY,
+        ts REAL NOT NULL,
+        last_ts REAL NOT NULL,
+        org TEXT NOT NULL,
+        rule TEXT NOT NULL,
+        severity TEXT NOT NULL,
+        message TEXT NOT NULL,
+        url TEXT,
+        dedupe_key TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 1
+    );
+    CREATE INDEX IF NOT EXISTS idx_alerts_org_ts ON alerts (org, last_ts);
+    CREATE INDEX IF NOT EXISTS idx_alerts_dedupe ON alerts (dedupe_key, last_ts);
+    CREATE TABLE IF NOT EXISTS org_stats (
+        org TEXT PRIMARY KEY,
+        total INTEGER NOT NULL DEFAULT 0,
+        critical INTEGER NOT NULL DEFAULT 0,
+        last_ts REAL
+    );
+    CREATE TABLE IF NOT EXISTS org_type_counts (
+        org TEXT NOT NULL,
+        threat_type TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (org, threat_type)
+    );
+    CREATE TABLE IF NOT EXISTS rate_state (
+        org TEXT PRIMARY KEY,
+        since INTEGER NOT NULL,
+        minute INTEGER NOT NULL,
+        count INTEGER NOT NULL,
+        ewma REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS seen_hosts (
+        host TEXT PRIMARY KEY,
+        first_seen REAL NOT NULL
+    );
+"""
+
+
+def connect(path=STORE_PATH):
+    conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    conn.executescript(rollups.SCHEMA)
+    return conn
+
+
+def load_watchlists(path=WATCHLIST_PATH) -> dict:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return dict(DEFAULT_WATCHLISTS)
+
+
+def at_least(severity: str, threshold: str) -> bool:
+    return detector.SEVERITY_RANK.get(severity, 0) >= detector.SEVERITY_RANK.get(threshold, 0)
+
+
+class AlertEngine:
+    def __init__(self, path=STORE_PATH, watchlists=None, dispatcher=None):
+        self.conn = connect(path)
+        self.dispatcher = dispatcher  # sinks.Dispatcher, forwards detections and alerts
+        self._lock = threading.Lock()
+        self._pruned_hour = None
+        self.watchlists = load_watchlists() if watchlists is None else watchlists
+        self.org_patterns = {
+            org: re.compile(r"\b(" + "|".join(re.escape(t) for t in sorted(cfg["terms"], key=len, reverse=True))
+                            + r")\b", re.IGNORECASE)
+            for org, cfg in self.watchlists.items() if cfg.get("terms")
+        }
+
+    # --- Entry point ---
+    def process(self, record: dict, text: str = "", now: float = None):
+        """Evaluate every rule for one stored page. Returns the alerts raised."""
+        now = now or time.time()
+        url = record.get("url", "")
+        entry = detector.entry_text(record)
+        keyword_hits = detector.classify(entry)  # same fields preprc.py scans
+        text = " ".join([entry, text])  # watchlists also see the full page
+        found = record.get("indicators", {})
+
+        detections = []  # (org, threat_type, severity, description)
+        for keyword, threat_type, severity in keyword_hits:
+            detections.append((GLOBAL_ORG, threat_type, severity, f"Keyword '{keyword}' on {record.get('title') or url}"))
+        for kind, values in found.items():
+            if kind in detector.INDICATOR_THREATS:
+                threat_type, severity = detector.INDICATOR_THREATS[kind]
+                detections.append((GLOBAL_ORG, threat_type, severity, f"{len(values)} {kind} indicator(s)"))
+
+        matched_orgs = {}
+        for org, pattern in self.org_patterns.items():
+            terms = {m.lower() for m in pattern.findall(text)}
+            terms |= {v for vs in found.values() for v in vs if pattern.search(v)}
+            if terms:
+                matched_orgs[org] = sorted(terms)
+
+        # An org mention inherits the worst threat on the page
+        if detections:
+            _, threat_type, severity, _ = max(detections, key=lambda d: detector.SEVERITY_RANK[d[2]])
+            severity = max(severity, "MEDIUM", key=detector.SEVERITY_RANK.get)
+        else:
+            threat_type, severity = "Brand Mention", "MEDIUM"
+
+        raised = []
+        with self._lock:
+            cur = self.conn.cursor()
+            rollups.add_page(cur, now, record)
+            if self._pruned_hour != int(now // 3600):
+                rollups.prune(cur, now)
+                self._pruned_hour = int(now // 3600)
+            for org, terms in matched_orgs.items():
+                detections.append((org, threat_type, severity, f"Watchlist terms {', '.join(terms)} on {url}"))
+                raised += self._alert(cur, now, org, "watchlist", severity,
+                                      f"{threat_type} mentioning {', '.join(terms)} at {url}", url,
+                                      dedupe_key=f"watchlist|{org}|{urlparse(url).hostname}|{threat_type}")
+
+            for org, threat_type, severity, description in detections:
+                self._record_detection(cur, now, org, threat_type, severity, description, url)
+                if org == GLOBAL_ORG and at_least(severity, ALERT_MIN_SEVERITY):
+                    raised += self._alert(cur, now, org, "severity", severity,
+                                          f"{threat_type}: {description}", url,
+                                          dedupe_key=f"severity|{urlparse(url).hostname}|{threat_type}")
+
+            for org in {d[0] for d in detections}:
+                raised += self._rate_spike(cur, now, org, sum(1 for d in detections if d[0] == org))
+
+            host = urlparse(url).hostname
+            if host and cur.execute("INSERT OR IGNORE INTO seen_hosts (host, first_seen) VALUES (?, ?)",
+                                    (host, now)).rowcount:
+                raised += self._alert(cur, now, GLOBAL_ORG, "first_seen", "INFO",
+                                      f"New onion service seen: {host}", url, dedupe_key=f"first_seen|{host}")
+            self.conn.commit()
+
+        if self.dispatcher is not None:
+            for org, threat_type, severity, description in detections:
+                self.dispatcher.emit("detection", {"ts": now, "org": org, "threat_type": threat_type,
+                                                   "severity": severity, "description": description, "url": url})
+            for alert in raised:
+                self.dispatcher.emit("alert", alert)
+        return raised
+
+    # --- Rules / aggregates ---
+    def _record_detection(self, cur, now, org, threat_type, severity, description, url):
+        cur.execute("INSERT INTO detections (ts, org, threat_type, severity, description, url) "
+                    "VALUES (?, ?, ?, ?, ?, ?)", (now, org, threat_type, severity, description, url))
+        cur.execute("INSERT INTO org_stats (org, total, critical, last_ts) VALUES (?, 1, ?, ?) "
+                    "ON CONFLICT(org) DO UPDATE SET total = total + 1, critical = critical + excluded.critical, "
+                    "last_ts = excluded.last_ts", (org, int(severity == "CRITICAL"), now))
+        cur.execute("INSERT INTO org_type_counts (org, threat_type, count) VALUES (?, ?, 1) "
+                    "ON CONFLICT(org, threat_type) DO UPDATE SET count = count + 1", (org, threat_type))
+        rollups.add_detection(cur, now, org, threat_type, severity, url)
+
+    def _rate_spike(self, cur, now, org, count):
+        minute = int(now // 60)
+        row = cur.execute("SELECT since, minute, count, ewma FROM rate_state WHERE org = ?", (org,)).fetchone()
+        if row is None:
+            since, current, ewma = minute, count, 0.0
+        else:
+            since, last_minute, current, ewma = row
+            if minute != last_minute:
+                # Fold the finished minute into the baseline, then decay over empty minutes
+                ewma = SPIKE_ALPHA * current + (1 - SPIKE_ALPHA) * ewma
+                ewma *= (1 - SPIKE_ALPHA) ** max(0, minute - last_minute - 1)
+                current = 0
+            current += count
+        cur.execute("INSERT OR REPLACE INTO rate_state (org, since, minute, count, ewma) VALUES (?, ?, ?, ?, ?)",
+                    (org, since, minute, current, ewma))
+        # No baseline to compare against until a few minutes have been folded in
+        if minute - since < SPIKE_WARMUP_MINUTES:
+            return []
+        if current >= SPIKE_MIN_COUNT and current > SPIKE_FACTOR * max(ewma, 1.0):
+            return self._alert(cur, now, org, "rate_spike", "HIGH",
+                               f"Detection spike: {current}/min vs baseline {ewma:.1f}/min", None,
+                               dedupe_key=f"rate_spike|{org}")
+        return []
+
+    def _alert(self, cur, now, org, rule, severity, message, url, dedupe_key):
+        row = cur.execute("SELECT id FROM alerts WHERE dedupe_key = ? AND last_ts >= ? ORDER BY last_ts DESC LIMIT 1",
+                          (dedupe_key, now - ALERT_DEDUPE_SECONDS)).fetchone()
+        if row:
+            cur.execute("UPDATE alerts SET count = count + 1, last_ts = ? WHERE id = ?", (now, row[0]))
+            return []
+        cur.execute("INSERT INTO alerts (ts, last_ts, org, rule, severity, message, url, dedupe_key) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?)", (now, now, org, rule, severity, message, url, dedupe_key))
+        alert = {"id": cur.lastrowid, "ts": now, "org": org, "rule": rule, "severity": severity,
+                 "message": message, "url": url}
+        print(f"🚨 [{severity}] {org}: {message}")
+        return [alert]
+
+    def close(self):
+        self.conn.close()
+
+
+# --- Readers (dashboards) ---
+def get_key_metrics(org, conn=None, now=None):
+    """(total threats, new in last 24h, critical) for org."""
+    conn = conn or connect()
+    now = now or time.time()
+    row = conn.execute("SELECT total, critical FROM org_stats WHERE org = ?", (org,)).fetchone() or (0, 0)
+    new_24h = rollups.window_total("detections", 24 * 3600, "org", org, now=now, conn=conn)
+    return row[0], new_24h, row[1]
+
+
+def get_threat_counts(org, conn=None):
+    """[(threat type, count)] for org, largest first."""
+    conn = conn or connect()
+    return conn.execute("SELECT threat_type, count FROM org_type_counts WHERE org = ? ORDER BY count DESC",
+                        (org,)).fetchall()
+
+
+def get_alerts(org, limit=10, conn=None, rule=None):
+    """Most recent alerts for org, plus global ones at or above ALERT_MIN_SEVERITY, as dicts.
+
+    With rule, only that rule's alerts for org (e.g. GLOBAL_ORG, "first_seen").
+    """
+    conn = conn or connect()
+    if rule:
+        where, args = "org = ? AND rule = ?", (org, rule)
+    else:
+        severe = [s for s in detector.SEVERITIES if at_least(s, ALERT_MIN_SEVERITY)]
+        where = f"org = ? OR (org = ? AND severity IN ({','.join('?' * len(severe))}))"
+        args = (org, GLOBAL_ORG, *severe)
+    rows = conn.execute(
+        f"SELECT ts, last_ts, org, rule, severity, message, url, count FROM alerts "
+        f"WHERE {where} ORDER BY last_ts DESC LIMIT ?", (*args, limit)).fetchall()
+    keys = ["ts", "last_ts", "org", "rule", "severity", "message", "url", "count"]
+    return [dict(zip(keys, r)) for r in rows]
+
+
+def get_log(org, limit=200, conn=None):
+    """Most recent detections for org as (ts, threat_type, severity, description, url)."""
+    conn = conn or connect()
+    return conn.execute("SELECT ts, threat_type, severity, description, url FROM detections "
+                        "WHERE org = ? ORDER BY ts DESC LIMIT ?", (org, limit)).fetchall()
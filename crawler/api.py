@@ -0,0 +1,541 @@
+"""
+Read-only query API over the crawl store
+ - One process tails data/crawler_data.json incrementally (only bytes appended
+   since the last request are parsed) and reads the shared SQLite store, so
+   dashboards no longer re-parse the whole dataset on every rerun
+ - Only line offsets, hosts and link counts stay in memory; a query reads the
+   records it returns back from the file
+ - GET endpoints (JSON):
+     /pages        offset, limit, q (title/url substring), domain
+     /links        offset, limit, source, domain
+     /detections   org, since, until, min_severity, order (asc|desc), cursor, limit
+     /indicators   kind, value, page_url, offset, limit
+     /aggregates/total | /aggregates/window | /aggregates/series | /aggregates/breakdown
+                   metric, dim, key, grain, periods, seconds, limit (see rollups.py)
+     /alerts       org, rule, limit  (org=* with rule=first_seen: newly seen onions)
+     /orgs         watchlisted organizations;  /org  org -> key metrics + threat counts
+     /health
+ - Responses carry an ETag derived from the store version (JSONL offset +
+   SQLite data_version); a matching If-None-Match costs a stat of the JSONL
+   and one PRAGMA, then returns 304 without running the query
+ - Results are kept in an in-process LRU cache keyed by query and dropped as
+   soon as the store version moves (a new page or detection was written)
+ - Client: GET with ETag revalidation; when the service is not running it
+   answers the same queries from the files in-process (file fallback)
+
+Usage:
+    python crawler/api.py                       # 127.0.0.1:8765
+    THREAT_API_HOST=0.0.0.0 python crawler/api.py --port 8765
+"""
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+from array import array
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qsl, urlencode, urlsplit
+
+import requests
+
+from settings import DATA_DIR, STORE_PATH, env_int, env_str
+import alerts
+import detector
+import export
+import rollups
+
+# --- CONFIG ---
+DB_PATH = env_str("CRAWLER_DB_PATH", str(DATA_DIR / "crawler_data.json"))
+API_HOST = env_str("THREAT_API_HOST", "127.0.0.1")
+API_PORT = env_int("THREAT_API_PORT", 8765)
+API_URL = env_str("THREAT_API_URL", f"http://127.0.0.1:{API_PORT}")
+API_TIMEOUT = 5
+API_RETRY_SECONDS = 30  # how long the client stays on the file fallback before trying the API again
+CACHE_ENTRIES = env_int("THREAT_API_CACHE_ENTRIES", 256)
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 1000
+HEAD_BYTES = 256  # a changed file head means the JSONL was rewritten, not appended to
+
+
+class BadRequest(ValueError):
+    pass
+
+
+def _int(params, name, default, low=0, high=None):
+    try:
+        value = int(params.get(name, default))
+    except ValueError:
+        raise BadRequest(f"{name} must be an integer")
+    if value < low or (high is not None and value > high):
+        raise BadRequest(f"{name} must be between {low} and {high}")
+    return value
+
+
+def _ts(params, name):
+    """Epoch seconds or an ISO date (YYYY-MM-DD, UTC)."""
+    value = params.get(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        pass
+    try:
+        return export.parse_date(value)
+    except ValueError:
+        raise BadRequest(f"{name} must be epoch seconds or YYYY-MM-DD")
+
+
+def _page(items, offset, limit, total):
+    return {"total": total, "offset": offset, "limit": limit, "items": items}
+
+
+def _host(url) -> str:
+    try:
+        return urlsplit(url or "").hostname or ""
+    except ValueError:
+        return ""
+
+
+# --- Incremental JSONL reader ---
+class PageLog:
+    """The crawl output, indexed once and then tailed: each refresh parses only appended lines.
+
+    Records are not kept: the index holds each page's line offset, host and running
+    link count, and read() fetches the records a query actually returns.
+    """
+
+    def __init__(self, path=DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        # Fresh arrays rather than clearing, so a query holding the old index stays consistent
+        self.inode = None
+        self.head = b""
+        self.offset = 0
+        self.starts = array("Q")     # byte offset of each page's line
+        self.link_ends = array("Q")  # links on this page and every page before it
+        self.hosts = []
+
+    @property
+    def links(self) -> int:
+        return self.link_ends[-1] if self.link_ends else 0
+
+    def refresh(self):
+        """Pick up appended lines; start over if the file was replaced or truncated. Returns the version."""
+        with self._lock:
+            try:
+                st = os.stat(self.path)
+            except FileNotFoundError:
+                if self.offset:
+                    self._reset()
+                return (None, 0)
+            if st.st_size == self.offset and st.st_ino == self.inode:
+                return (self.inode, self.offset)
+            with open(self.path, "rb") as f:
+                head = f.read(HEAD_BYTES)
+                if st.st_ino != self.inode or st.st_size < self.offset or head[:len(self.head)] != self.head:
+                    self._reset()
+                self.inode, self.head = st.st_ino, head
+                f.seek(self.offset)
+                chunk = f.read(st.st_size - self.offset)
+            # A writer may be mid-line: stop at the last complete one
+            end = chunk.rfind(b"\n") + 1
+            pos = self.offset
+            for line in chunk[:end].split(b"\n")[:-1]:
+                start, pos = pos, pos + len(line) + 1
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                self.starts.append(start)
+                self.link_ends.append(self.links + len(record.get("links", [])))
+                self.hosts.append(sys.intern(_host(record.get("url"))))
+            self.offset += end
+            return (self.inode, self.offset)
+
+    def snapshot(self):
+        """(line starts, link ends, hosts, page count) as of now; nothing is copied."""
+        with self._lock:
+            return self.starts, self.link_ends, self.hosts, len(self.starts)
+
+    def read(self, starts, indexes):
+        """Yield the records at the given page indexes, read back from the file."""
+        try:
+            f = open(self.path, "rb")
+        except FileNotFoundError:
+            return
+        with f:
+            for i in indexes:
+                f.seek(starts[i])
+                try:
+                    yield json.loads(f.readline())
+                except json.JSONDecodeError:  # rewritten since the snapshot
+                    return
+
+
+# --- Queries ---
+class QueryService:
+    """The API's data layer; used by the HTTP server and by Client's file fallback."""
+
+    def __init__(self, db_path=DB_PATH, store_path=STORE_PATH, cache_entries=CACHE_ENTRIES):
+        self.log = PageLog(db_path)
+        self.store_path = store_path
+        self.cache_entries = cache_entries
+        self._cache = OrderedDict()  # (route, query) -> (version, etag, body)
+        self._cache_lock = threading.Lock()
+        self._local = threading.local()
+        self._version_conn = None
+        self._version_lock = threading.Lock()
+        self.hits = self.misses = 0
+        self.routes = {
+            "/health": self.health,
+            "/pages": self.pages,
+            "/links": self.links,
+            "/detections": self.detections,
+            "/indicators": self.indicators,
+            "/aggregates/total": self.aggregate_total,
+            "/aggregates/window": self.aggregate_window,
+            "/aggregates/series": self.aggregate_series,
+            "/aggregates/breakdown": self.aggregate_breakdown,
+            "/alerts": self.alerts,
+            "/orgs": self.orgs,
+            "/org": self.org,
+        }
+        # Answers that also depend on the clock (rolling windows, zero-filled series)
+        self.time_dependent = {"/aggregates/window", "/aggregates/series", "/org"}
+
+    def conn(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = self._local.conn = alerts.connect(self.store_path)
+        return conn
+
+    def store_version(self) -> int:
+        # data_version changes whenever another connection commits to the database
+        with self._version_lock:
+            if self._version_conn is None:
+                self.conn()  # creates the store and its schema on first use
+                self._version_conn = sqlite3.connect(str(self.store_path), check_same_thread=False)
+            return self._version_conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def version(self, route: str):
+        v = (*self.log.refresh(), self.store_version())
+        return v + (int(time.time() // 60),) if route in self.time_dependent else v
+
+    def query(self, route: str, params: dict, if_none_match=None):
+        """(etag, body bytes) for a GET, body None when if_none_match still holds the etag.
+
+        Raises KeyError for an unknown route, BadRequest for bad params.
+        """
+        handler = self.routes[route]
+        version = self.version(route)
+        key = (route, urlencode(sorted(params.items())))
+        etag = '"' + hashlib.sha1(repr((key, version)).encode("utf-8")).hexdigest()[:20] + '"'
+        if if_none_match and etag in if_none_match:
+            return etag, None
+        with self._cache_lock:
+            cached = self._cache.get(key)
+            if cached is not None and cached[0] == version:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return cached[1], cached[2]
+        self.misses += 1
+        body = json.dumps(handler(params), ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        with self._cache_lock:
+            self._cache[key] = (version, etag, body)
+            self._cache.move_to_end(key)
+            while len(self._cache) > self.cache_entries:
+                self._cache.popitem(last=False)
+        return etag, body
+
+    # --- Handlers ---
+    def health(self, params):
+        _starts, link_ends, _hosts, count = self.log.snapshot()
+        return {"status": "ok", "pages": count, "links": link_ends[count - 1] if count else 0,
+                "cache": {"entries": len(self._cache), "hits": self.hits, "misses": self.misses}}
+
+    def pages(self, params):
+        offset = _int(params, "offset", 0)
+        limit = _int(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+        starts, _link_ends, hosts, count = self.log.snapshot()
+        q, domain = params.get("q", "").lower(), params.get("domain", "").lower()
+        indexes = range(count)
+        if domain:
+            indexes = [i for i in indexes if hosts[i] == domain]
+        if not q:
+            return _page(list(self.log.read(starts, indexes[offset:offset + limit])), offset, limit, len(indexes))
+        # Substring search has to read every candidate record
+        items, total = [], 0
+        for p in self.log.read(starts, indexes):
+            if q in p.get("title", "").lower() or q in p.get("url", "").lower():
+                if offset <= total < offset + limit:
+                    items.append(p)
+                total += 1
+        return _page(items, offset, limit, total)
+
+    def links(self, params):
+        offset = _int(params, "offset", 0)
+        limit = _int(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+        source, domain = params.get("source"), params.get("domain", "").lower()
+        starts, link_ends, hosts, count = self.log.snapshot()
+
+        def size(i):
+            return link_ends[i] - (link_ends[i - 1] if i else 0)
+
+        skip = offset
+        if source:
+            host = _host(source)
+            indexes = [i for i in range(count) if hosts[i] == host] if domain in ("", host) else []
+            pages = [p for p in self.log.read(starts, indexes) if p.get("url") == source]
+            total = sum(len(p.get("links", [])) for p in pages)
+        else:
+            if domain:
+                indexes = [i for i in range(count) if hosts[i] == domain]
+                total = sum(size(i) for i in indexes)
+                first = 0
+                while first < len(indexes) and size(indexes[first]) <= skip:
+                    skip -= size(indexes[first])
+                    first += 1
+            else:
+                indexes = range(count)
+                total = link_ends[count - 1] if count else 0
+                first = bisect.bisect_right(link_ends, offset, 0, count)
+                skip -= link_ends[first - 1] if first else 0
+            # Whole pages before the offset are skipped on the index, without reading them
+            pages = self.log.read(starts, indexes[first:])
+        items = []
+        for page in pages:
+            targets = page.get("links", [])
+            if skip >= len(targets):
+                skip -= len(targets)
+                continue
+            items += [{"source": page.get("url"), "target": t} for t in targets[skip:skip + limit - len(items)]]
+            skip = 0
+            if len(items) >= limit:
+                break
+        return _page(items, offset, limit, total)
+
+    def detections(self, params):
+        limit = _int(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+        order = params.get("order", "asc")
+        if order not in ("asc", "desc"):
+            raise BadRequest("order must be asc or desc")
+        min_severity = params.get("min_severity")
+        if min_severity and min_severity not in detector.SEVERITIES:
+            raise BadRequest(f"min_severity must be one of {', '.join(detector.SEVERITIES)}")
+        where, args = export._where(org=params.get("org"), since=_ts(params, "since"),
+                                    until=_ts(params, "until"), min_severity=min_severity)
+        # Keyset pagination on (ts, id): stable while new detections arrive
+        if params.get("cursor"):
+            try:
+                ts, _id = params["cursor"].split(":")
+                args += [float(ts), int(_id)]
+            except ValueError:
+                raise BadRequest("cursor must be ts:id")
+            where += " AND (ts, id) > (?, ?)" if order == "asc" else " AND (ts, id) < (?, ?)"
+        direction = "ASC" if order == "asc" else "DESC"
+        rows = self.conn().execute(
+            f"SELECT id, ts, org, threat_type, severity, description, url FROM detections WHERE {where} "
+            f"ORDER BY ts {direction}, id {direction} LIMIT ?", (*args, limit)).fetchall()
+        keys = ["id", "ts", "org", "threat_type", "severity", "description", "url"]
+        items = [dict(zip(keys, r)) for r in rows]
+        cursor = f"{rows[-1][1]!r}:{rows[-1][0]}" if len(rows) == limit else None
+        return {"limit": limit, "order": order, "next_cursor": cursor, "items": items}
+
+    def indicators(self, params):
+        offset = _int(params, "offset", 0)
+        limit = _int(params, "limit", DEFAULT_LIMIT, 1, MAX_LIMIT)
+        clauses, args = [], []
+        for name in ("kind", "value", "page_url"):
+            if params.get(name):
+                clauses.append(f"{name} = ?")
+                args.append(params[name])
+        where = " AND ".join(clauses) or "1"
+        try:
+            total = self.conn().execute(f"SELECT COUNT(*) FROM indicators WHERE {where}", args).fetchone()[0]
+            rows = self.conn().execute(
+                f"SELECT kind, value, page_url, first_seen, last_seen, hits FROM indicators WHERE {where} "
+                f"ORDER BY last_seen DESC, id DESC LIMIT ? OFFSET ?", (*args, limit, offset)).fetchall()
+        except sqlite3.OperationalError:  # no crawl has extracted indicators into this store yet
+            total, rows = 0, []
+        keys = ["kind", "value", "page_url", "first_seen", "last_seen", "hits"]
+        return _page([dict(zip(keys, r)) for r in rows], offset, limit, total)
+
+    def _metric(self, params):
+        if not params.get("metric"):
+            raise BadRequest("metric is required")
+        return params["metric"], params.get("dim", rollups.TOTAL), params.get("key", rollups.TOTAL)
+
+    def _grain(self, params, default):
+        grain = params.get("grain", default)
+        if grain not in rollups.GRAINS or grain == "all":
+            raise BadRequest(f"grain must be one of {', '.join(g for g in rollups.GRAINS if g != 'all')}")
+        return grain
+
+    def aggregate_total(self, params):
+        metric, dim, key = self._metric(params)
+        count = rollups.total(metric, dim, key, conn=self.conn())
+        if not count and metric in ("pages", "links") and dim == rollups.TOTAL:
+            # Crawl predates the rollup store: count the JSONL instead
+            _starts, link_ends, _hosts, pages = self.log.snapshot()
+            count = pages if metric == "pages" else (link_ends[pages - 1] if pages else 0)
+        return {"metric": metric, "dim": dim, "key": key, "count": count}
+
+    def aggregate_window(self, params):
+        metric, dim, key = self._metric(params)
+        seconds = _int(params, "seconds", 24 * 3600, 1)
+        grain = self._grain(params, "hour")
+        return {"metric": metric, "dim": dim, "key": key, "seconds": seconds,
+                "count": rollups.window_total(metric, seconds, dim, key, grain, conn=self.conn())}
+
+    def aggregate_series(self, params):
+        metric, dim, key = self._metric(params)
+        grain = self._grain(params, "day")
+        periods = _int(params, "periods", 30, 1, 10000)
+        return {"metric": metric, "dim": dim, "key": key, "grain": grain,
+                "items": [[b, c] for b, c in rollups.series(metric, grain, periods, dim, key, conn=self.conn())]}
+
+    def aggregate_breakdown(self, params):
+        metric = self._metric(params)[0]
+        if not params.get("dim"):
+            raise BadRequest("dim is required")
+        limit = _int(params, "limit", 20, 1, MAX_LIMIT)
+        return {"metric": metric, "dim": params["dim"],
+                "items": [[k, c] for k, c in rollups.breakdown(metric, params["dim"], limit, conn=self.conn())]}
+
+    def alerts(self, params):
+        if not params.get("org"):
+            raise BadRequest("org is required")
+        limit = _int(params, "limit", 10, 1, MAX_LIMIT)
+        return {"org": params["org"],
+                "items": alerts.get_alerts(params["org"], limit, conn=self.conn(), rule=params.get("rule"))}
+
+    def orgs(self, params):
+        return {"items": list(alerts.load_watchlists())}
+
+    def org(self, params):
+        if not params.get("org"):
+            raise BadRequest("org is required")
+        total, new_24h, critical = alerts.get_key_metrics(params["org"], conn=self.conn())
+        return {"org": params["org"], "total": total, "new_24h": new_24h, "critical": critical,
+                "threat_counts": [[t, c] for t, c in alerts.get_threat_counts(params["org"], conn=self.conn())]}
+
+
+# --- HTTP server ---
+class Handler(BaseHTTPRequestHandler):
+    service = None  # set by serve()
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True  # keep-alive: headers and body go out in separate writes
+
+    def do_GET(self):
+        parts = urlsplit(self.path)
+        params = dict(parse_qsl(parts.query))
+        try:
+            etag, body = self.service.query(parts.path.rstrip("/") or "/health", params,
+                                            self.headers.get("If-None-Match"))
+        except KeyError:
+            return self._send(404, json.dumps({"error": f"unknown endpoint {parts.path}"}).encode("utf-8"))
+        except BadRequest as e:
+            return self._send(400, json.dumps({"error": str(e)}).encode("utf-8"))
+        if body is None:
+            return self._send(304, b"", etag)
+        self._send(200, body, etag)
+
+    def _send(self, status, body, etag=None):
+        self.send_response(status)
+        if status != 304:
+            self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-cache")  # always revalidate; 304s are cheap
+        if etag:
+            self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, fmt, *args):
+        pass
+
+
+def serve(host=API_HOST, port=API_PORT, service=None) -> ThreadingHTTPServer:
+    """Start the API on a background thread and return the server."""
+    handler = type("BoundHandler", (Handler,), {"service": service or QueryService()})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# --- Client (dashboards) ---
+class Client:
+    """GETs from the API with ETag revalidation; falls back to reading the files in-process."""
+
+    def __init__(self, base_url=API_URL, timeout=API_TIMEOUT):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.session = requests.Session()
+        self.session.trust_env = False  # never route localhost queries through a proxy
+        self._etags = {}  # url -> (etag, data)
+        self._local = None
+        self._retry_at = 0.0
+
+    def get(self, route: str, **params) -> dict:
+        params = {k: v for k, v in params.items() if v not in (None, "")}
+        if time.monotonic() >= self._retry_at:
+            url = f"{self.base_url}{route}?{urlencode(sorted(params.items()))}"
+            cached = self._etags.get(url)
+            headers = {"If-None-Match": cached[0]} if cached else {}
+            try:
+                resp = self.session.get(url, headers=headers, timeout=self.timeout)
+            except requests.RequestException:
+                print(f"⚠️ Query API not reachable at {self.base_url}; reading the data files directly")
+                self._retry_at = time.monotonic() + API_RETRY_SECONDS
+            else:
+                if resp.status_code == 304 and cached:
+                    return cached[1]
+                if resp.status_code != 200:
+                    raise ValueError(resp.json().get("error", f"HTTP {resp.status_code}"))
+                data = resp.json()
+                if resp.headers.get("ETag"):
+                    self._etags[url] = (resp.headers["ETag"], data)
+                return data
+        if self._local is None:
+            self._local = QueryService()
+        try:
+            _etag, body = self._local.query(route, {k: str(v) for k, v in params.items()})
+        except KeyError:
+            raise ValueError(f"unknown endpoint {route}")
+        return json.loads(body)
+
+    def all(self, route: str, page_size=MAX_LIMIT, **params):
+        """Every item of an offset-paginated endpoint."""
+        offset, items = 0, []
+        while True:
+            page = self.get(route, offset=offset, limit=page_size, **params)
+            items += page["items"]
+            offset += page_size
+            if offset >= page["total"] or not page["items"]:
+                return items
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Read-only JSON query API over the crawl store")
+    parser.add_argument("--host", default=API_HOST)
+    parser.add_argument("--port", type=int, default=API_PORT)
+    args = parser.parse_args()
+
+    server = serve(args.host, args.port)
+    print(f"🛰️ Query API on http://{args.host}:{args.port} (pages from {DB_PATH}, store {STORE_PATH})")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        server.shutdown()
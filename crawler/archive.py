@@ -0,0 +1,316 @@
+"""
+Content-addressed archive of raw page bodies
+ - Bodies are keyed by SHA-256 and stored once, however many URLs serve them
+ - Stored compressed in append-only segment files (data/archive/seg-NNNNNN.pack)
+ - zstd with a dictionary trained on the first pages when `zstandard` is
+   installed (onion pages share a lot of boilerplate); zlib otherwise
+ - index.sqlite maps hash -> segment/offset and URL -> hash with fetch times
+ - Bodies are compressed outside the index lock, with one compressor per
+   thread; the writer keeps its segment open and moves on when it is full
+
+Usage:
+    python crawler/archive.py stats
+    python crawler/archive.py get <url>        # latest body for a URL
+    python crawler/archive.py history <url>
+"""
+
+import argparse
+import hashlib
+import sqlite3
+import struct
+import sys
+import threading
+import time
+import zlib
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import fcntl  # POSIX only; serialises segment appends across workers
+except ImportError:
+    fcntl = None
+
+from settings import DATA_DIR, env_str, env_int, env_bool
+
+# --- CONFIG ---
+ARCHIVE_ENABLED = env_bool("CRAWLER_ARCHIVE", True)
+ARCHIVE_DIR = Path(env_str("CRAWLER_ARCHIVE_DIR", str(DATA_DIR / "archive")))
+SEGMENT_BYTES = env_int("CRAWLER_ARCHIVE_SEGMENT_BYTES", 64 * 1024 * 1024)
+COMPRESSION_LEVEL = env_int("CRAWLER_ARCHIVE_LEVEL", 9)
+DICT_TRAIN_SAMPLES = env_int("CRAWLER_ARCHIVE_DICT_SAMPLES", 200)
+DICT_SIZE = 112 * 1024
+
+MAGIC = b"DWA1"
+# magic, codec, dict_id, raw_len, stored_len, sha256
+HEADER = struct.Struct(">4sBIII32s")
+
+CODEC_RAW, CODEC_ZLIB, CODEC_ZSTD, CODEC_ZSTD_DICT = 0, 1, 2, 3
+
+
+class Archive:
+    def __init__(self, root=ARCHIVE_DIR, level=COMPRESSION_LEVEL):
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self.level = level
+        self._lock = threading.Lock()
+        self._local = threading.local()  # per-thread zstd contexts (not safe to share)
+        self._dicts = {}
+        self._samples = []
+        self._segment = None  # current segment number and its open file, once the first body is written
+        self._segment_file = None
+        self.db = sqlite3.connect(str(self.root / "index.sqlite"), timeout=30, check_same_thread=False)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.executescript("""
+            CREATE TABLE IF NOT EXISTS blobs (
+                hash TEXT PRIMARY KEY,
+                segment INTEGER NOT NULL,
+                offset INTEGER NOT NULL,
+                stored_size INTEGER NOT NULL,
+                raw_size INTEGER NOT NULL,
+                codec INTEGER NOT NULL,
+                dict_id INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS fetches (
+                id INTEGER PRIMARY KEY,
+                url TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                status INTEGER,
+                fetched_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS idx_fetches_url ON fetches (url, fetched_at);
+            CREATE INDEX IF NOT EXISTS idx_fetches_hash ON fetches (hash);
+        """)
+        self.dict_id = self._latest_dict_id()
+
+    # --- Compression ---
+    def _dict_path(self, dict_id: int) -> Path:
+        return self.root / f"dict-{dict_id:08x}.zdict"
+
+    def _latest_dict_id(self) -> int:
+        dicts = sorted(self.root.glob("dict-*.zdict"), key=lambda p: p.stat().st_mtime)
+        return int(dicts[-1].stem.split("-")[1], 16) if dicts and zstandard else 0
+
+    def _dictionary(self, dict_id: int):
+        if dict_id not in self._dicts:
+            data = self._dict_path(dict_id).read_bytes()
+            self._dicts[dict_id] = zstandard.ZstdCompressionDict(data)
+        return self._dicts[dict_id]
+
+    def _context(self, kind: str, dict_id: int):
+        """This thread's zstd compressor or decompressor for a dictionary (0: none)."""
+        contexts = getattr(self._local, "contexts", None)
+        if contexts is None:
+            contexts = self._local.contexts = {}
+        ctx = contexts.get((kind, dict_id))
+        if ctx is None:
+            dict_data = self._dictionary(dict_id) if dict_id else None
+            if kind == "c":
+                ctx = zstandard.ZstdCompressor(level=self.level, dict_data=dict_data)
+            else:
+                ctx = zstandard.ZstdDecompressor(dict_data=dict_data)
+            contexts[(kind, dict_id)] = ctx
+        return ctx
+
+    def _maybe_train(self, body: bytes):
+        """Collect samples until there are enough to train the first dictionary."""
+        if not zstandard or self.dict_id:
+            return
+        self._samples.append(body)
+        if len(self._samples) < DICT_TRAIN_SAMPLES:
+            return
+        try:
+            trained = zstandard.train_dictionary(DICT_SIZE, self._samples)
+        except zstandard.ZstdError as e:
+            print("⚠️ Archive dictionary training failed:", e)
+        else:
+            data = trained.as_bytes()
+            # Named by content so concurrent workers never overwrite each other's dictionary
+            dict_id = int.from_bytes(hashlib.sha256(data).digest()[:4], "big") or 1
+            if not self._dict_path(dict_id).exists():
+                self._dict_path(dict_id).write_bytes(data)
+            self.dict_id = dict_id
+            print(f"📚 Trained archive dictionary from {len(self._samples)} pages.")
+        self._samples = []
+
+    def _compress(self, body: bytes, dict_id: int):
+        if zstandard and dict_id:
+            return CODEC_ZSTD_DICT, dict_id, self._context("c", dict_id).compress(body)
+        if zstandard:
+            return CODEC_ZSTD, 0, self._context("c", 0).compress(body)
+        return CODEC_ZLIB, 0, zlib.compress(body, min(self.level, 9))
+
+    def _decompress(self, codec: int, dict_id: int, data: bytes, raw_size: int) -> bytes:
+        if codec == CODEC_RAW:
+            return data
+        if codec == CODEC_ZLIB:
+            return zlib.decompress(data)
+        if not zstandard:
+            raise RuntimeError("zstandard is required to read zstd-compressed archive records")
+        dctx = self._context("d", dict_id if codec == CODEC_ZSTD_DICT else 0)
+        return dctx.decompress(data, max_output_size=raw_size)
+
+    # --- Segments ---
+    def _segment_path(self, segment: int) -> Path:
+        return self.root / f"seg-{segment:06d}.pack"
+
+    def _last_segment(self) -> int:
+        segments = sorted(self.root.glob("seg-*.pack"))
+        return int(segments[-1].stem.split("-")[1]) if segments else 1
+
+    def _append(self, record: bytes):
+        """Append to the current segment, moving on once it is full. Returns (segment, offset)."""
+        if self._segment is None:
+            self._segment = self._last_segment()  # the only directory scan, on the first write
+        while True:
+            if self._segment_file is None:
+                self._segment_file = open(self._segment_path(self._segment), "ab")
+            f = self._segment_file
+            if fcntl:
+                fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                offset = f.seek(0, 2)  # other workers may have appended since our last write
+                if offset < SEGMENT_BYTES:
+                    f.write(record)
+                    f.flush()
+                    return self._segment, offset
+            finally:
+                if fcntl:
+                    fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+            self._segment_file = None
+            self._segment += 1
+
+    # --- Public API ---
+    def put(self, url: str, body: bytes, status: int = 200, fetched_at: float = None) -> str:
+        """Store body (deduplicated) and record that url served it. Returns the hash."""
+        raw_hash = hashlib.sha256(body).digest()
+        digest = raw_hash.hex()
+        fetched_at = fetched_at or time.time()
+
+        with self._lock:
+            known = self.db.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone()
+            if not known:
+                self._maybe_train(body)
+                dict_id = self.dict_id
+        if not known:
+            codec, dict_id, stored = self._compress(body, dict_id)
+            if len(stored) >= len(body):
+                codec, dict_id, stored = CODEC_RAW, 0, body
+            header = HEADER.pack(MAGIC, codec, dict_id, len(body), len(stored), raw_hash)
+
+        with self._lock:
+            # Another thread may have stored the same body while this one compressed it
+            if not known and not self.db.execute("SELECT 1 FROM blobs WHERE hash = ?", (digest,)).fetchone():
+                segment, offset = self._append(header + stored)
+                self.db.execute(
+                    "INSERT OR IGNORE INTO blobs (hash, segment, offset, stored_size, raw_size, codec, dict_id) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (digest, segment, offset, len(stored), len(body), codec, dict_id))
+            self.db.execute("INSERT INTO fetches (url, hash, status, fetched_at) VALUES (?, ?, ?, ?)",
+                            (url, digest, status, fetched_at))
+            self.db.commit()
+        return digest
+
+    def get(self, digest: str) -> bytes:
+        with self._lock:
+            row = self.db.execute("SELECT segment, offset FROM blobs WHERE hash = ?", (digest,)).fetchone()
+        if row is None:
+            raise KeyError(digest)
+        segment, offset = row
+        with open(self._segment_path(segment), "rb") as f:
+            f.seek(offset)
+            magic, codec, dict_id, raw_size, stored_size, raw_hash = HEADER.unpack(f.read(HEADER.size))
+            if magic != MAGIC:
+                raise ValueError(f"Corrupt archive record at {self._segment_path(segment)}:{offset}")
+            body = self._decompress(codec, dict_id, f.read(stored_size), raw_size)
+        if hashlib.sha256(body).digest() != raw_hash:
+            raise ValueError(f"Archive checksum mismatch for {digest}")
+        return body
+
+    def latest(self, url: str):
+        """(hash, fetched_at) of the most recent fetch of url, or None."""
+        with self._lock:
+            return self.db.execute(
+                "SELECT hash, fetched_at FROM fetches WHERE url = ? ORDER BY fetched_at DESC LIMIT 1",
+                (url,)).fetchone()
+
+    def history(self, url: str):
+        with self._lock:
+            return self.db.execute(
+                "SELECT hash, status, fetched_at FROM fetches WHERE url = ? ORDER BY fetched_at",
+                (url,)).fetchall()
+
+    def max_fetch_id(self) -> int:
+        with self._lock:
+            return self.db.execute("SELECT COALESCE(MAX(id), 0) FROM fetches").fetchone()[0]
+
+    def iter_latest(self, max_id: int = None):
+        """Yield (url, hash, fetched_at) for the latest fetch of every URL.
+
+        max_id pins the view to fetches recorded up to that id, so a long
+        job sees the same input even while the crawler keeps archiving.
+        """
+        max_id = self.max_fetch_id() if max_id is None else max_id
+        cur = self.db.cursor()
+        cur.execute("""
+            SELECT f.url, f.hash, f.fetched_at FROM fetches f
+            JOIN (SELECT url, MAX(id) AS id FROM fetches WHERE id <= ? GROUP BY url) latest
+              ON latest.id = f.id
+            ORDER BY f.url
+        """, (max_id,))
+        while True:
+            rows = cur.fetchmany(500)
+            if not rows:
+                return
+            yield from rows
+
+    def stats(self) -> dict:
+        with self._lock:
+            blobs, raw, stored = self.db.execute(
+                "SELECT COUNT(*), COALESCE(SUM(raw_size), 0), COALESCE(SUM(stored_size), 0) FROM blobs").fetchone()
+            fetches, urls = self.db.execute("SELECT COUNT(*), COUNT(DISTINCT url) FROM fetches").fetchone()
+        return {
+            "blobs": blobs, "fetches": fetches, "urls": urls,
+            "raw_bytes": raw, "stored_bytes": stored,
+            "ratio": round(raw / stored, 2) if stored else 0.0,
+            "codec": "zstd+dict" if self.dict_id else ("zstd" if zstandard else "zlib"),
+        }
+
+    def close(self):
+        with self._lock:
+            if self._segment_file is not None:
+                self._segment_file.close()
+                self._segment_file = None
+        self.db.close()
+
+
+def open_archive(root=ARCHIVE_DIR):
+    """Archive used by the crawler, or None when CRAWLER_ARCHIVE is off."""
+    return Archive(root) if ARCHIVE_ENABLED else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Raw page archive")
+    parser.add_argument("command", choices=["stats", "get", "history"])
+    parser.add_argument("url", nargs="?")
+    parser.add_argument("--root", default=str(ARCHIVE_DIR))
+    args = parser.parse_args()
+
+    archive = Archive(args.root)
+    if args.command == "stats":
+        for key, value in archive.stats().items():
+            print(f"{key:>12}: {value}")
+    elif not args.url:
+        parser.error(f"{args.command} needs a URL")
+    elif args.command == "get":
+        found = archive.latest(args.url)
+        if not found:
+            sys.exit(f"❌ Not archived: {args.url}")
+        sys.stdout.buffer.write(archive.get(found[0]))
+    else:
+        for digest, status, fetched_at in archive.history(args.url):
+            print(f"{time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(fetched_at))}  {status}  {digest}")
@@ -0,0 +1,401 @@
+"""
+Shared crawl frontier for domain-sharded workers
+ - Onion domains are sharded across live workers with a consistent-hash ring
+ - Workers claim URLs under a time-limited lease and heartbeat while alive;
+   a crashed worker drops out of the ring and its expired leases are reclaimed
+ - One global URL table, so no two workers ever crawl the same page
+ - Backends (CRAWLER_FRONTIER):
+     sqlite:////app/data/frontier.sqlite  file-locked SQLite on the shared volume (absolute path)
+     memory://                            in-process stand-in (benchmarks, tests)
+"""
+
+import bisect
+from abc import ABC, abstractmethod
+import hashlib
+import sqlite3
+import threading
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+from settings import DATA_DIR, env_str, env_int, env_float
+
+# --- CONFIG ---
+FRONTIER_URI = env_str("CRAWLER_FRONTIER", f"sqlite:///{DATA_DIR / 'frontier.sqlite'}")
+LEASE_SECONDS = env_float("CRAWLER_LEASE_SECONDS", 120)
+WORKER_TTL_SECONDS = env_float("CRAWLER_WORKER_TTL_SECONDS", 60)
+MAX_ATTEMPTS = env_int("CRAWLER_MAX_ATTEMPTS", 3)
+# Heartbeats also renew leases, so beat well inside both the worker TTL and the lease
+HEARTBEAT_SECONDS = env_float("CRAWLER_HEARTBEAT_SECONDS", min(WORKER_TTL_SECONDS, LEASE_SECONDS) / 3)
+VNODES = 64
+
+MAX_SHARD = 2 ** 63 - 1
+
+
+def shard_of(key: str) -> int:
+    """Stable 63-bit hash (fits a signed SQLite INTEGER)."""
+    return int.from_bytes(hashlib.blake2b(key.encode("utf-8"), digest_size=8).digest(), "big") >> 1
+
+
+class HashRing:
+    """Consistent-hash ring of worker ids with virtual nodes."""
+
+    def __init__(self, workers, vnodes=VNODES):
+        points = sorted((shard_of(f"{w}#{i}"), w) for w in set(workers) for i in range(vnodes))
+        self.points = [p for p, _ in points]
+        self.owners = [w for _, w in points]
+
+    def owner(self, key: str):
+        if not self.points:
+            return None
+        idx = bisect.bisect_left(self.points, shard_of(key))
+        return self.owners[idx % len(self.points)]
+
+    def ranges(self, worker: str):
+        """Shard ranges (lo, hi] owned by worker."""
+        out = []
+        for i, owner in enumerate(self.owners):
+            if owner != worker:
+                continue
+            if i == 0:
+                out.append((-1, self.points[0]))
+                out.append((self.points[-1], MAX_SHARD))
+            else:
+                out.append((self.points[i - 1], self.points[i]))
+        return out
+
+
+class Frontier(ABC):
+    """Interface every frontier backend implements."""
+
+    max_pages_per_domain = None
+
+    @abstractmethod
+    def register(self, worker_id: str): ...
+
+    @abstractmethod
+    def heartbeat(self, worker_id: str):
+        """Mark the worker alive and renew its leases."""
+
+    @abstractmethod
+    def unregister(self, worker_id: str): ...
+
+    @abstractmethod
+    def live_workers(self) -> list: ...
+
+    @abstractmethod
+    def add_urls(self, urls, source: str = None) -> int: ...
+
+    @abstractmethod
+    def claim(self, worker_id: str, limit: int) -> list:
+        """Lease up to limit (url, domain, source) rows, never more per domain than its budget has left."""
+
+    @abstractmethod
+    def complete(self, url: str, worker_id: str, ok: bool = True): ...
+
+    @abstractmethod
+    def outstanding(self) -> int:
+        """URLs still to crawl: pending ones with attempts left and live leases."""
+
+    @abstractmethod
+    def stats(self) -> dict: ...
+
+    def close(self):
+        pass
+
+    def ring(self) -> HashRing:
+        return HashRing(self.live_workers())
+
+
+class SQLiteFrontier(Frontier):
+    """Frontier in a SQLite file; SQLite's file locking serialises workers."""
+
+    def __init__(self, path, max_pages_per_domain=None):
+        self.path = str(path)
+        self.max_pages_per_domain = max_pages_per_domain
+        self.conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = threading.Lock()
+        if self.path != ":memory:":
+            self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS urls (
+                url TEXT PRIMARY KEY,
+                domain TEXT NOT NULL,
+                shard INTEGER NOT NULL,
+                status TEXT NOT NULL DEFAULT 'pending',
+                owner TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                source TEXT,
+                added_at REAL
+            );
+            CREATE INDEX IF NOT EXISTS idx_urls_claim ON urls (status, shard);
+            CREATE INDEX IF NOT EXISTS idx_urls_domain ON urls (domain, status);
+            CREATE TABLE IF NOT EXISTS domains (
+                domain TEXT PRIMARY KEY,
+                pages INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS workers (
+                worker_id TEXT PRIMARY KEY,
+                started_at REAL,
+                last_seen REAL
+            );
+        """)
+
+    def _write(self, fn):
+        """Run fn(cursor) inside a write transaction (BEGIN IMMEDIATE)."""
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn(cur)
+                cur.execute("COMMIT")
+                return result
+            except BaseException:
+                cur.execute("ROLLBACK")
+                raise
+
+    # --- Workers ---
+    def register(self, worker_id):
+        now = time.time()
+        self._write(lambda cur: cur.execute(
+            "INSERT INTO workers (worker_id, started_at, last_seen) VALUES (?, ?, ?) "
+            "ON CONFLICT(worker_id) DO UPDATE SET last_seen = excluded.last_seen",
+            (worker_id, now, now)))
+
+    def heartbeat(self, worker_id):
+        now = time.time()
+
+        def beat(cur):
+            cur.execute("UPDATE workers SET last_seen = ? WHERE worker_id = ?", (now, worker_id))
+            cur.execute("UPDATE urls SET lease_expires = ? WHERE status = 'leased' AND owner = ?",
+                        (now + LEASE_SECONDS, worker_id))
+        self._write(beat)
+
+    def unregister(self, worker_id):
+        def leave(cur):
+            cur.execute("UPDATE urls SET status = 'pending', owner = NULL, lease_expires = NULL "
+                        "WHERE status = 'leased' AND owner = ?", (worker_id,))
+            cur.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+        self._write(leave)
+
+    def live_workers(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT worker_id FROM workers WHERE last_seen >= ?",
+                                     (time.time() - WORKER_TTL_SECONDS,)).fetchall()
+        return [r[0] for r in rows]
+
+    # --- URLs ---
+    def add_urls(self, urls, source=None):
+        now = time.time()
+        rows = []
+        for url in urls:
+            domain = urlparse(url).hostname or ""
+            rows.append((url, domain, shard_of(domain), source, now))
+        if not rows:
+            return 0
+
+        def insert(cur):
+            before = self.conn.total_changes
+            if self.max_pages_per_domain:
+                cur.executemany(
+                    "INSERT OR IGNORE INTO urls (url, domain, shard, source, added_at) "
+                    "SELECT ?, ?, ?, ?, ? WHERE COALESCE((SELECT pages FROM domains WHERE domain = ?), 0) < ?",
+                    [r + (r[1], self.max_pages_per_domain) for r in rows])
+            else:
+                cur.executemany("INSERT OR IGNORE INTO urls (url, domain, shard, source, added_at) "
+                                "VALUES (?, ?, ?, ?, ?)", rows)
+            return self.conn.total_changes - before
+        return self._write(insert)
+
+    def claim(self, worker_id, limit):
+        ranges = self.ring().ranges(worker_id)
+        if not ranges:
+            return []
+        now = time.time()
+        shard_clause = " OR ".join("(shard > ? AND shard <= ?)" for _ in ranges)
+        claimable = ("(status = 'pending' OR (status = 'leased' AND lease_expires < ?)) "
+                     f"AND attempts < ? AND ({shard_clause})")
+        params = [now, MAX_ATTEMPTS] + [v for r in ranges for v in r]
+        if self.max_pages_per_domain:
+            # Each domain gets at most its budget minus pages done and leases still live
+            query = (
+                "SELECT url, domain, source FROM ("
+                "  SELECT url, domain, source, rowid AS seq,"
+                "         ROW_NUMBER() OVER (PARTITION BY domain ORDER BY rowid) AS n"
+                f" FROM urls WHERE {claimable}) AS c "
+                "WHERE n <= ? - COALESCE((SELECT pages FROM domains d WHERE d.domain = c.domain), 0)"
+                "  - (SELECT COUNT(*) FROM urls l WHERE l.domain = c.domain"
+                "     AND l.status = 'leased' AND l.lease_expires >= ?) "
+                "ORDER BY seq LIMIT ?")
+            params += [self.max_pages_per_domain, now, limit]
+        else:
+            query = f"SELECT url, domain, source FROM urls WHERE {claimable} LIMIT ?"
+            params.append(limit)
+
+        def take(cur):
+            # Leases that ran out on their last attempt (worker crashed) will never be retried
+            cur.execute("UPDATE urls SET status = 'failed', owner = NULL, lease_expires = NULL "
+                        "WHERE status = 'leased' AND lease_expires < ? AND attempts >= ?", (now, MAX_ATTEMPTS))
+            rows = cur.execute(query, params).fetchall()
+            cur.executemany(
+                "UPDATE urls SET status = 'leased', owner = ?, lease_expires = ?, attempts = attempts + 1 "
+                "WHERE url = ?", [(worker_id, now + LEASE_SECONDS, url) for url, _, _ in rows])
+            return rows
+        return self._write(take)
+
+    def complete(self, url, worker_id, ok=True):
+        def finish(cur):
+            row = cur.execute("SELECT domain FROM urls WHERE url = ?", (url,)).fetchone()
+            if row is None:
+                return
+            domain = row[0]
+            # fetch_url already retried; attempts only caps re-leases after a crash
+            status = "done" if ok else "failed"
+            cur.execute("UPDATE urls SET status = ?, owner = NULL, lease_expires = NULL WHERE url = ?",
+                        (status, url))
+            if ok:
+                cur.execute("INSERT INTO domains (domain, pages) VALUES (?, 1) "
+                            "ON CONFLICT(domain) DO UPDATE SET pages = pages + 1", (domain,))
+                pages = cur.execute("SELECT pages FROM domains WHERE domain = ?", (domain,)).fetchone()[0]
+                if self.max_pages_per_domain and pages >= self.max_pages_per_domain:
+                    cur.execute("UPDATE urls SET status = 'skipped' WHERE domain = ? AND status = 'pending'",
+                                (domain,))
+        self._write(finish)
+
+    def outstanding(self):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM urls WHERE (status = 'pending' AND attempts < ?) "
+                "OR (status = 'leased' AND (attempts < ? OR lease_expires >= ?))",
+                (MAX_ATTEMPTS, MAX_ATTEMPTS, time.time())).fetchone()[0]
+
+    def stats(self):
+        with self._lock:
+            rows = self.conn.execute("SELECT status, COUNT(*) FROM urls GROUP BY status").fetchall()
+        return {"workers": self.live_workers(), **dict(rows)}
+
+    def close(self):
+        self.conn.close()
+
+
+class MemoryFrontier(Frontier):
+    """In-process stand-in with the same lease/shard semantics."""
+
+    def __init__(self, max_pages_per_domain=None):
+        self.max_pages_per_domain = max_pages_per_domain
+        self._lock = threading.RLock()
+        self.urls = {}       # url -> dict(domain, status, owner, lease_expires, attempts, source)
+        self.domains = {}    # domain -> pages fetched
+        self.workers = {}    # worker_id -> last_seen
+
+    def register(self, worker_id):
+        with self._lock:
+            self.workers[worker_id] = time.time()
+
+    def heartbeat(self, worker_id):
+        now = time.time()
+        with self._lock:
+            self.workers[worker_id] = now
+            for entry in self.urls.values():
+                if entry["status"] == "leased" and entry["owner"] == worker_id:
+                    entry["lease_expires"] = now + LEASE_SECONDS
+
+    def unregister(self, worker_id):
+        with self._lock:
+            for entry in self.urls.values():
+                if entry["status"] == "leased" and entry["owner"] == worker_id:
+                    entry.update(status="pending", owner=None, lease_expires=None)
+            self.workers.pop(worker_id, None)
+
+    def live_workers(self):
+        cutoff = time.time() - WORKER_TTL_SECONDS
+        with self._lock:
+            return [w for w, seen in self.workers.items() if seen >= cutoff]
+
+    def add_urls(self, urls, source=None):
+        added = 0
+        with self._lock:
+            for url in urls:
+                if url in self.urls:
+                    continue
+                domain = urlparse(url).hostname or ""
+                if self.max_pages_per_domain and self.domains.get(domain, 0) >= self.max_pages_per_domain:
+                    continue
+                self.urls[url] = {"domain": domain, "status": "pending", "owner": None,
+                                  "lease_expires": None, "attempts": 0, "source": source}
+                added += 1
+        return added
+
+    def claim(self, worker_id, limit):
+        ring = self.ring()
+        now = time.time()
+        claimed = []
+        with self._lock:
+            used = Counter(self.domains)  # pages done + live leases, per domain
+            for entry in self.urls.values():
+                if entry["status"] != "leased":
+                    continue
+                if entry["lease_expires"] >= now:
+                    used[entry["domain"]] += 1
+                elif entry["attempts"] >= MAX_ATTEMPTS:
+                    entry.update(status="failed", owner=None, lease_expires=None)
+            for url, entry in self.urls.items():
+                if len(claimed) >= limit:
+                    break
+                claimable = entry["status"] == "pending" or (
+                    entry["status"] == "leased" and entry["lease_expires"] < now)
+                if not claimable or entry["attempts"] >= MAX_ATTEMPTS:
+                    continue
+                if ring.owner(entry["domain"]) != worker_id:
+                    continue
+                if self.max_pages_per_domain and used[entry["domain"]] >= self.max_pages_per_domain:
+                    continue
+                used[entry["domain"]] += 1
+                entry.update(status="leased", owner=worker_id, lease_expires=now + LEASE_SECONDS,
+                             attempts=entry["attempts"] + 1)
+                claimed.append((url, entry["domain"], entry["source"]))
+        return claimed
+
+    def complete(self, url, worker_id, ok=True):
+        with self._lock:
+            entry = self.urls.get(url)
+            if entry is None:
+                return
+            status = "done" if ok else "failed"
+            entry.update(status=status, owner=None, lease_expires=None)
+            if ok:
+                domain = entry["domain"]
+                self.domains[domain] = self.domains.get(domain, 0) + 1
+                if self.max_pages_per_domain and self.domains[domain] >= self.max_pages_per_domain:
+                    for other in self.urls.values():
+                        if other["domain"] == domain and other["status"] == "pending":
+                            other["status"] = "skipped"
+
+    def outstanding(self):
+        now = time.time()
+        with self._lock:
+            return sum(1 for e in self.urls.values()
+                       if (e["status"] == "pending" and e["attempts"] < MAX_ATTEMPTS)
+                       or (e["status"] == "leased" and (e["attempts"] < MAX_ATTEMPTS or e["lease_expires"] >= now)))
+
+    def stats(self):
+        counts = {}
+        with self._lock:
+            for entry in self.urls.values():
+                counts[entry["status"]] = counts.get(entry["status"], 0) + 1
+        return {"workers": self.live_workers(), **counts}
+
+
+BACKENDS = {
+    "sqlite": lambda uri, **kw: SQLiteFrontier(uri[len("sqlite:///"):] or ":memory:", **kw),
+    "memory": lambda uri, **kw: MemoryFrontier(**kw),
+}
+
+
+def open_frontier(uri: str = FRONTIER_URI, **kwargs) -> Frontier:
+    """Open a frontier backend from a URI: sqlite:///relative/path, sqlite:////absolute/path or memory://."""
+    scheme = uri.split(":", 1)[0]
+    if scheme not in BACKENDS:
+        raise ValueError(f"Unknown frontier backend: {scheme} (expected one of {', '.join(BACKENDS)})")
+    return BACKENDS[scheme](uri, **kwargs)
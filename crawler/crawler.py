@@ -1,34 +1,56 @@
 """
 Enhanced Tor .onion crawler
  - Uses Tor SOCKS5 proxy at 127.0.0.1:9050
- - Fetches .onion pages recursively (limited)
+ - Fetches .onion pages recursively (limited), several at a time over
+   isolated circuits, paced by the AIMD controller in ratecontrol.py
  - Extracts title, snippet, and discovered URLs
  - Saves all results to JSON file
 """
 
-import time, random, json, socket
-from urllib.parse import urljoin, urlparse
+import time, random, json, socket, sys, argparse, os, threading, contextlib
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from urllib.parse import urlparse
 from typing import Optional
 import requests
 from bs4 import BeautifulSoup
 from requests.exceptions import RequestException
 
+try:
+    import fcntl  # POSIX only; used to serialise appends from several workers
+except ImportError:
+    fcntl = None
+
+from settings import (DATA_DIR, METRICS_DIR, SOCKS_HOST, SOCKS_PORT, REQUEST_TIMEOUT, MAX_PAGES_PER_DOMAIN,
+                      RATE_LIMIT_SECONDS, JITTER_SECONDS, MAX_RETRIES, env_str, env_int, env_float, socks_proxies)
+import profiling
+import coordinator
+import archive as page_archive
+import indicators
+import alerts
+import sinks
+import urlnorm
+import seen
+import ratecontrol
+import telemetry
+import discovery
+
 # --- CONFIG ---
-SOCKS_HOST = "127.0.0.1"
-SOCKS_PORT = 9050
-DB_PATH = "/app/data/crawler_data.json"
+DB_PATH = env_str("CRAWLER_DB_PATH", str(DATA_DIR / "crawler_data.json"))
 
 USER_AGENT = "Mozilla/5.0 (compatible; TorCrawler/0.3)"
-REQUEST_TIMEOUT = 30
-MAX_PAGES_PER_DOMAIN = 5
-RATE_LIMIT_SECONDS = 5
-JITTER_SECONDS = 3
-MAX_RETRIES = 3
-
-PROXIES = {
-    "http": f"socks5h://{SOCKS_HOST}:{SOCKS_PORT}",
-    "https": f"socks5h://{SOCKS_HOST}:{SOCKS_PORT}",
-}
+HTML_PARSER = env_str("CRAWLER_HTML_PARSER", "html.parser")  # or "lxml"
+WORKER_ID = env_str("CRAWLER_WORKER_ID", f"{socket.gethostname()}-{os.getpid()}")
+CLAIM_BATCH = env_int("CRAWLER_CLAIM_BATCH", 10)
+IDLE_POLL_SECONDS = env_float("CRAWLER_IDLE_POLL_SECONDS", 5)
+MAX_IN_FLIGHT = env_int("CRAWLER_MAX_IN_FLIGHT", 16)  # fetch threads; the controller sets the real limit
+
+PROXIES = socks_proxies()
+
+SEED_URLS = [
+    "http://duckduckgogg42xjoc72x3sjasowoarfbgcmvfimaftt6twagswzczad.onion",  # DuckDuckGo
+    "http://sanityunhavm6aolhyye4h6kbdlxjmc7zw2y7nadbni6vd43agm7xvid.onion",  # Tor mirror
+]
 
 
 # --- UTILITIES ---
@@ -47,33 +69,64 @@ def wait_for_socks(host=SOCKS_HOST, port=SOCKS_PORT, timeout=90):
 
 
 def random_delay():
+    if RATE_LIMIT_SECONDS <= 0:
+        return
     delay = max(0.5, RATE_LIMIT_SECONDS + random.uniform(-JITTER_SECONDS, JITTER_SECONDS))
     print(f"⏱ Sleeping {delay:.1f}s before next request...")
     time.sleep(delay)
 
 
-def session_with_headers():
+def session_with_headers(circuit: str = None):
     s = requests.Session()
-    s.proxies.update(PROXIES)
+    s.proxies.update(socks_proxies(circuit) if circuit else PROXIES)
     s.headers.update({"User-Agent": USER_AGENT})
     return s
 
 
+_sessions = threading.local()
+
+
+def circuit_session(circuit: str) -> requests.Session:
+    """This thread's session on one isolated circuit (SOCKS username)."""
+    by_circuit = _sessions.__dict__.setdefault("by_circuit", {})
+    if circuit not in by_circuit:
+        by_circuit[circuit] = session_with_headers(circuit)
+    return by_circuit[circuit]
+
+
+@contextlib.contextmanager
+def request_slot(session, url, controller):
+    """(session, slot) to use for one request: the caller's session, or a circuit picked by the controller."""
+    if controller is None:
+        yield session, None
+        return
+    with controller.slot(urlparse(url).hostname) as slot:
+        yield circuit_session(slot.circuit), slot
+
+
 def save_to_json(data, path=DB_PATH):
-    """Append JSON record."""
+    """Append JSON record (one locked write, safe with several workers)."""
+    line = json.dumps(data, ensure_ascii=False) + "\n"
     with open(path, "a", encoding="utf-8") as f:
-        json.dump(data, f, ensure_ascii=False)
-        f.write("\n")
+        if fcntl:
+            fcntl.flock(f, fcntl.LOCK_EX)
+        f.write(line)
 
 
 # --- FETCH + PARSE ---
-def fetch_url(session: requests.Session, url: str) -> Optional[str]:
+def fetch_response(session: requests.Session, url: str, archive=None, controller=None):
+    """The 200 text response for url (after retries), or None."""
     for attempt in range(1, MAX_RETRIES + 1):
         try:
             print(f"➡️ Fetching ({attempt}/{MAX_RETRIES}): {url}")
-            resp = session.get(url, timeout=REQUEST_TIMEOUT)
+            with request_slot(session, url, controller) as (s, slot):
+                resp = s.get(url, timeout=REQUEST_TIMEOUT)
+                if slot is not None and (resp.status_code == 429 or resp.status_code >= 500):
+                    slot.ok = False  # overloaded: back off this host and circuit
             if resp.status_code == 200 and "text" in resp.headers.get("Content-Type", ""):
-                return resp.text
+                if archive is not None:
+                    archive.put(url, resp.content, resp.status_code)
+                return resp
         except RequestException as e:
             backoff = 2 ** attempt
             print(f"⚠️ Error: {e}. Retrying in {backoff}s...")
@@ -82,9 +135,14 @@ def fetch_url(session: requests.Session, url: str) -> Optional[str]:
     return None
 
 
-def parse_page(base_url: str, html: str):
+def fetch_url(session: requests.Session, url: str, archive=None, controller=None) -> Optional[str]:
+    resp = fetch_response(session, url, archive, controller)
+    return resp.text if resp is not None else None
+
+
+def parse_page(base_url: str, html: str, features: str = HTML_PARSER):
     """Extract title, snippet, and links."""
-    soup = BeautifulSoup(html, "html.parser")
+    soup = BeautifulSoup(html, features)
     title = soup.title.string.strip() if soup.title and soup.title.string else "[No Title]"
     text_block = None
     for tag in soup.find_all(["p", "div", "article"]):
@@ -94,53 +152,261 @@ def parse_page(base_url: str, html: str):
             break
     snippet = text_block or "[No visible text found]"
 
-    # Extract internal links
+    # Extract .onion links in canonical form, minus assets that are never worth a fetch
     found_links = set()
     for a in soup.find_all("a", href=True):
-        href = a["href"]
-        abs_url = urljoin(base_url, href)
-        if abs_url.endswith(".onion/") or ".onion/" in abs_url:
-            found_links.add(abs_url.split("#")[0])
+        link = urlnorm.canonicalize(a["href"], base_url)
+        if link and urlnorm.classify(link) != urlnorm.SKIP:
+            found_links.add(link)
     return {"title": title, "passage": snippet, "links": list(found_links)}
 
 
+def worth_fetching(session: requests.Session, url: str, controller=None) -> bool:
+    """Pre-fetch gate: assets are skipped, unclear paths get a HEAD probe first."""
+    kind = urlnorm.classify(url)
+    if kind == urlnorm.PROBE:
+        with request_slot(session, url, controller) as (s, _slot):
+            return urlnorm.probe(s, url, REQUEST_TIMEOUT)
+    return kind == urlnorm.FETCH
+
+
+def fetch_page(session, url: str, archive=None, controller=None) -> Optional[tuple]:
+    """Gate + fetch for one URL; runs on the fetch pool. (final URL after redirects, html) or None."""
+    if not worth_fetching(session, url, controller):
+        print(f"⏭ Skipping non-HTML: {url}")
+        return None
+    resp = fetch_response(session, url, archive, controller)
+    if controller is None:
+        random_delay()  # static pacing; a controller paces inside its slots
+    return (resp.url or url, resp.text) if resp is not None else None
+
+
+def extract_indicators(html: str):
+    return indicators.extract(html)
+
+
+def process_page(url: str, html: str, db_path=DB_PATH, indicator_store=None, alert_engine=None,
+                 source: str = None, base_url: str = None) -> dict:
+    """Parse one fetched page, extract indicators, store the record and raise alerts.
+
+    Links resolve against base_url, the URL the page was actually served from (after redirects).
+    """
+    parsed = parse_page(base_url or url, html)
+    parsed["url"] = url
+    if source:
+        parsed["source"] = source  # provenance: "seed", "search:<engine>:<query>" or the linking page
+    found = extract_indicators(html)
+    if found:
+        parsed["indicators"] = indicators.group(found)
+    save_to_json(parsed, db_path)
+    if indicator_store is not None:
+        indicator_store.add(url, found)
+    if alert_engine is not None:
+        alert_engine.process(parsed, html)
+    return parsed
+
+
+def log_tor_breakdown(tor_telemetry, url: str):
+    """After a failed fetch, show where Tor spent the time (descriptor, rendezvous, connect)."""
+    if tor_telemetry is None:
+        return
+    stages = tor_telemetry.request_breakdown(urlparse(url).hostname)
+    if stages:
+        print(f"🧅 Tor stages for {url}: " + ", ".join(f"{k}={v}" for k, v in stages.items()))
+
+
 # --- MAIN CRAWLER ---
-def crawl(seed_urls):
+def crawl(seed_urls, db_path=DB_PATH, sources=None):
+    """Crawl each seed's domain, up to MAX_PAGES_PER_DOMAIN pages per domain.
+
+    sources maps a seed URL to its provenance (default "seed"); links carry their parent page.
+    """
+    sources = {urlnorm.canonicalize(url): source for url, source in (sources or {}).items()}
     wait_for_socks()
     session = session_with_headers()
-    visited = set()
+    controller = ratecontrol.AIMDController(pause=random_delay)
+    workers = min(MAX_IN_FLIGHT, controller.max_in_flight)
+    pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="fetch")
+    archive = page_archive.open_archive()
+    indicator_store = indicators.IndicatorStore()
+    dispatcher = sinks.open_dispatcher()
+    alert_engine = alerts.AlertEngine(dispatcher=dispatcher)
+    tor_telemetry = telemetry.start()
+    # visited (file-backed with CRAWLER_SEEN_PATH) only records pages actually fetched, so
+    # links still queued when a crawl stops are crawled next time; queued dedupes to_visit
+    visited = seen.open_seen()
+    queued = seen.SeenSet()
+    budget_used = Counter()  # pages fetched per domain
 
-    for seed in seed_urls:
+    for seed in filter(None, map(urlnorm.canonicalize, seed_urls)):
         domain = urlparse(seed).hostname
-        to_visit = {seed}
+        if seed in visited or not queued.add(seed):
+            continue
+        to_visit = [(seed, sources.get(seed, "seed"))]
+        in_flight = {}
 
-        while to_visit and len(visited) < MAX_PAGES_PER_DOMAIN:
-            url = to_visit.pop()
-            if url in visited:
-                continue
-            visited.add(url)
+        while to_visit or in_flight:
+            # Keep the pool fed; the controller decides how many actually run
+            while to_visit and budget_used[domain] < MAX_PAGES_PER_DOMAIN and len(in_flight) < workers:
+                url, source = to_visit.pop()
+                budget_used[domain] += 1
+                in_flight[pool.submit(fetch_page, session, url, archive, controller)] = (url, source)
+            if not in_flight:
+                break
 
-            html = fetch_url(session, url)
-            if not html:
+            done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+            for future in done:
+                url, source = in_flight.pop(future)
+                fetched = future.result()
+                if not fetched:
+                    log_tor_breakdown(tor_telemetry, url)
+                    continue
+
+                final_url, html = fetched
+                parsed = process_page(url, html, db_path, indicator_store, alert_engine, source, final_url)
+                visited.add(url)
+                print(f"✅ Saved: {url} | Title: {parsed['title']}")
+
+                # Add new links from same domain
+                for link in parsed["links"]:
+                    if urlparse(link).hostname == domain and link not in visited and queued.add(link):
+                        to_visit.append((link, url))
+
+    pool.shutdown()
+    controller.write_metrics()
+    visited.close()
+    queued.close()
+    if tor_telemetry is not None:
+        tor_telemetry.close()
+    if dispatcher is not None:
+        dispatcher.close()
+    print("🎯 Crawl finished. Data saved to:", db_path)
+
+
+def crawl_worker(seed_urls, frontier, worker_id=WORKER_ID, db_path=DB_PATH):
+    """Distributed mode: crawl the domains this worker owns on the shared frontier."""
+    wait_for_socks()
+    session = session_with_headers()
+    controller = ratecontrol.AIMDController(metrics_path=METRICS_DIR / f"ratecontrol-{worker_id}.json",
+                                            pause=random_delay)
+    pool = ThreadPoolExecutor(max_workers=min(MAX_IN_FLIGHT, controller.max_in_flight), thread_name_prefix="fetch")
+    archive = page_archive.open_archive()
+    indicator_store = indicators.IndicatorStore()
+    dispatcher = sinks.open_dispatcher()
+    alert_engine = alerts.AlertEngine(dispatcher=dispatcher)
+    tor_telemetry = telemetry.start(metrics_path=METRICS_DIR / f"tor_telemetry-{worker_id}.json")
+    frontier.register(worker_id)
+    added = frontier.add_urls(list(filter(None, map(urlnorm.canonicalize, seed_urls))), source="seed")
+    print(f"👷 Worker {worker_id} joined ({added} new seed URLs)")
+
+    last_beat = 0.0
+
+    def heartbeat(force=False):
+        # Renews this worker's leases; slow onion fetches must not let them expire mid-batch
+        nonlocal last_beat
+        if force or time.monotonic() - last_beat >= coordinator.HEARTBEAT_SECONDS:
+            frontier.heartbeat(worker_id)
+            last_beat = time.monotonic()
+
+    try:
+        while True:
+            heartbeat(force=True)
+            batch = frontier.claim(worker_id, CLAIM_BATCH)
+            if not batch:
+                if frontier.outstanding() == 0:
+                    break
+                time.sleep(IDLE_POLL_SECONDS)
                 continue
 
-            parsed = parse_page(url, html)
-            parsed["url"] = url
-            save_to_json(parsed)
-            print(f"✅ Saved: {url} | Title: {parsed['title']}")
-            random_delay()
+            in_flight = {pool.submit(fetch_page, session, url, archive, controller): (url, domain, source)
+                         for url, domain, source in batch}
+            while in_flight:
+                done, _ = wait(in_flight, timeout=coordinator.HEARTBEAT_SECONDS, return_when=FIRST_COMPLETED)
+                for future in done:
+                    url, domain, source = in_flight.pop(future)
+                    fetched = future.result()
+                    if not fetched:
+                        log_tor_breakdown(tor_telemetry, url)
+                        frontier.complete(url, worker_id, ok=False)
+                        continue
+
+                    final_url, html = fetched
+                    parsed = process_page(url, html, db_path, indicator_store, alert_engine, source, final_url)
+                    print(f"✅ [{worker_id}] Saved: {url} | Title: {parsed['title']}")
+
+                    # Same-domain links only, like crawl(); the frontier dedupes globally
+                    frontier.add_urls([link for link in parsed["links"] if urlparse(link).hostname == domain],
+                                      source=url)
+                    frontier.complete(url, worker_id, ok=True)
+                heartbeat()
+    finally:
+        pool.shutdown()
+        controller.write_metrics()
+        frontier.unregister(worker_id)
+        if tor_telemetry is not None:
+            tor_telemetry.close()
+        if dispatcher is not None:
+            dispatcher.close()
+
+    print(f"🎯 Worker {worker_id} finished. Data saved to:", db_path)
+
+
+def discover_seeds(limit=discovery.DISCOVERY_MAX_SEEDS) -> dict:
+    """Query the onion search engines for the threat keywords and watchlist terms."""
+    wait_for_socks()
+    session = session_with_headers()
+    # Same AIMD pacing and circuits as the crawl; the metrics file is left to the crawl itself
+    controller = ratecontrol.AIMDController(metrics_path=None, pause=random_delay)
+    found = discovery.discover(lambda url: fetch_url(session, url, controller=controller))
+    return OrderedDict(list(found.items())[:limit])
+
+
+# Stage functions wrapped in timing spans when profiling is enabled
+PROFILE_STAGES = {
+    "worth_fetching": "probe", "fetch_response": "fetch", "parse_page": "parse", "extract_indicators": "indicators",
+    "save_to_json": "store",
+}
+
+
+def instrument_stages():
+    profiling.instrument(sys.modules[__name__], PROFILE_STAGES)
+    profiling.instrument(page_archive.Archive, {"put": "archive"})
+    profiling.instrument(indicators.IndicatorStore, {"add": "store"})
+    profiling.instrument(alerts.AlertEngine, {"process": "alerts"})
+
+
+if profiling.PROFILE and profiling.enable() is not None:
+    instrument_stages()
+
 
-            # Add new links from same domain
-            for link in parsed["links"]:
-                if urlparse(link).hostname == domain and link not in visited:
-                    to_visit.add(link)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Tor .onion crawler")
+    parser.add_argument("--profile", nargs="?", const="spans", metavar="MODES",
+                        help="profile stages: spans,cprofile,sample,tracemalloc or all")
+    parser.add_argument("--worker", action="store_true",
+                        help="distributed mode: share a frontier with other workers")
+    parser.add_argument("--frontier", default=coordinator.FRONTIER_URI,
+                        help="frontier backend URI (sqlite:////absolute/path or memory://)")
+    parser.add_argument("--worker-id", default=WORKER_ID)
+    parser.add_argument("--discover", action="store_true",
+                        help="seed from onion search engine results for the threat keywords and watchlists")
+    parser.add_argument("--discover-limit", type=int, default=discovery.DISCOVERY_MAX_SEEDS)
+    args = parser.parse_args(argv)
+    if args.profile and profiling.enable(args.profile) is not None:
+        instrument_stages()
 
-    print("🎯 Crawl finished. Data saved to:", DB_PATH)
+    seeds = list(SEED_URLS)
+    found = discover_seeds(args.discover_limit) if args.discover else {}
+    sources = {url: hits[0] for url, hits in found.items()}  # first engine/query that found each URL
+    if args.worker:
+        frontier = coordinator.open_frontier(args.frontier, max_pages_per_domain=MAX_PAGES_PER_DOMAIN)
+        if found:
+            print(f"🔎 {discovery.seed_frontier(frontier, found)} discovered URLs added to the frontier")
+        crawl_worker(seeds, frontier, worker_id=args.worker_id)
+    else:
+        # Discovered onions first (most-hit first); every domain gets its own page budget
+        crawl(list(found) + seeds, sources=sources)
 
 
 if __name__ == "__main__":
-    seeds = [
-        "http://duckduckgogg42xjoc72x3sjasowoarfbgcmvfimaftt6twagswzczad.onion",  # DuckDuckGo
-        "http://sanityunhavm6aolhyye4h6kbdlxjmc7zw2y7nadbni6vd43agm7xvid.onion",  # Tor mirror
-    ]
-    crawl(seeds)
+    main()
@@ -9,18 +9,12 @@ from bs4 import BeautifulSoup
 from stem.control import Controller
 from requests.exceptions import RequestException
 
-# CONFIGURATION
-SOCKS_HOST = "127.0.0.1"
-SOCKS_PORT = 9050
-CONTROL_PORT = 9051
+# CONFIGURATION (shared knobs live in settings.py)
+from settings import (SOCKS_HOST, SOCKS_PORT, CONTROL_PORT, REQUEST_TIMEOUT, MAX_CONTENT_BYTES,
+                      RATE_LIMIT_SECONDS, JITTER_SECONDS, MAX_RETRIES, env_int, socks_proxies)
 USER_AGENT = "Mozilla/5.0 (compatible; OnionCrawler/0.1; +https://example.org)"
-REQUEST_TIMEOUT = 30  # seconds
-MAX_CONTENT_BYTES = 200 * 1024  # 200 KB max read
-RATE_LIMIT_SECONDS = 5  # base delay between requests
-JITTER_SECONDS = 3      # add up to +/- jitter
-MAX_RETRIES = 3
 RENEW_AFTER_REQUESTS = 50  # send NEWNYM after this many requests (optional)
-MAX_PAGES_PER_DOMAIN = 20  # conservative per-domain limit
+MAX_PAGES_PER_DOMAIN = env_int("CRAWLER_MAX_PAGES_PER_DOMAIN", 20)  # conservative per-domain limit
 
 # Whitelist (start with known safe targets or onion check site)
 WHITELIST = {
@@ -28,10 +22,7 @@ WHITELIST = {
     "expyuzz4wqqyqhjn.onion",  # example onion check service
 }
 
-PROXIES = {
-    "http": f"socks5h://{SOCKS_HOST}:{SOCKS_PORT}",
-    "https": f"socks5h://{SOCKS_HOST}:{SOCKS_PORT}"
-}
+PROXIES = socks_proxies()
 
 DB_PATH = "/app/data/crawler_data.sqlite"  # persisted in container if you mount a volume
 
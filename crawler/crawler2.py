@@ -17,25 +17,15 @@ import requests
 from bs4 import BeautifulSoup
 from requests.exceptions import RequestException
 
-# CONFIG
-SOCKS_HOST = "127.0.0.1"
-SOCKS_PORT = 9050
-CONTROL_PORT = 9051
+# CONFIG (shared knobs live in settings.py)
+from settings import (SOCKS_HOST, SOCKS_PORT, CONTROL_PORT, REQUEST_TIMEOUT, MAX_CONTENT_BYTES,
+                      RATE_LIMIT_SECONDS, JITTER_SECONDS, MAX_RETRIES, MAX_PAGES_PER_DOMAIN, socks_proxies)
 
 USER_AGENT = "Mozilla/5.0 (compatible; TorCrawler/0.2; +https://example.org)"
-REQUEST_TIMEOUT = 30
-MAX_CONTENT_BYTES = 200 * 1024  # 200 KB max read
-RATE_LIMIT_SECONDS = 5
-JITTER_SECONDS = 3
-MAX_RETRIES = 3
-MAX_PAGES_PER_DOMAIN = 5
 
 DB_PATH = "/app/data/crawler_data.json"
 
-PROXIES = {
-    "http": f"socks5h://{SOCKS_HOST}:{SOCKS_PORT}",
-    "https": f"socks5h://{SOCKS_HOST}:{SOCKS_PORT}",
-}
+PROXIES = socks_proxies()
 
 
 ### Utilities ###
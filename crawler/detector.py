@@ -0,0 +1,96 @@
+"""
+Keyword threat detector
+ - Shared by preprc.py, the benchmarks and any in-crawl detection
+ - One compiled regex over title + passage + links per entry
+"""
+
+import re
+
+# === Threat-related keywords ===
+THREAT_KEYWORDS = [
+    "hack", "exploit", "malware", "ransomware", "ddos", "botnet", "breach",
+    "leak", "passwords", "credentials", "carding", "drugs", "weapons",
+    "counterfeit", "fraud", "scam", "phishing", "illegal", "darkmarket",
+    "spyware", "keylogger", "zero-day", "attack", "exploit", "porn", "child",
+    "terror", "murder", "assassination", "sell data", "buy data"
+]
+
+# Compile regex for efficient search
+THREAT_PATTERN = re.compile(r"\b(" + "|".join(THREAT_KEYWORDS) + r")\b", re.IGNORECASE)
+
+
+def entry_text(entry: dict) -> str:
+    return " ".join([
+        entry.get("title") or "",
+        entry.get("passage") or "",
+        " ".join(entry.get("links") or []),
+    ])
+
+
+def is_threat(entry: dict) -> bool:
+    return THREAT_PATTERN.search(entry_text(entry)) is not None
+
+
+def find_threats(entries):
+    """Return the entries that contain at least one threat keyword."""
+    return [entry for entry in entries if is_threat(entry)]
+
+
+def format_report(threat_entries) -> str:
+    output_text = "Potential Threat Indicators Extracted from Dark Web Crawler\n"
+    output_text += "------------------------------------------------------------\n\n"
+
+    if threat_entries:
+        for i, item in enumerate(threat_entries, 1):
+            output_text += f"Result {i}:\n"
+            output_text += f"Title: {item.get('title', '[No Title]')}\n"
+            output_text += f"URL: {item.get('url', '')}\n"
+            output_text += f"Passage: {item.get('passage', '')}\n"
+            output_text += f"Links: {', '.join(item.get('links', []))}\n\n"
+    else:
+        output_text += "No threat-related keywords detected in the dataset.\n"
+    return output_text
+
+
+# === Threat types and severities (used by the alert engine) ===
+SEVERITIES = ["INFO", "LOW", "MEDIUM", "HIGH", "CRITICAL"]
+SEVERITY_RANK = {s: i for i, s in enumerate(SEVERITIES)}
+
+KEYWORD_THREATS = {
+    "passwords": ("Credential Leak", "HIGH"),
+    "credentials": ("Credential Leak", "HIGH"),
+    "leak": ("Data Leak", "HIGH"),
+    "breach": ("Data Leak", "HIGH"),
+    "sell data": ("Data Sale", "HIGH"),
+    "buy data": ("Data Sale", "HIGH"),
+    "ransomware": ("Malware", "CRITICAL"),
+    "malware": ("Malware", "HIGH"),
+    "spyware": ("Malware", "HIGH"),
+    "keylogger": ("Malware", "HIGH"),
+    "botnet": ("Malware", "HIGH"),
+    "exploit": ("Exploit", "HIGH"),
+    "zero-day": ("Exploit", "CRITICAL"),
+    "phishing": ("Phishing Kit", "MEDIUM"),
+    "hack": ("Attack", "MEDIUM"),
+    "attack": ("Attack", "MEDIUM"),
+    "ddos": ("Attack", "MEDIUM"),
+    "carding": ("Fraud", "MEDIUM"),
+    "fraud": ("Fraud", "MEDIUM"),
+    "scam": ("Fraud", "MEDIUM"),
+    "counterfeit": ("Fraud", "MEDIUM"),
+}
+DEFAULT_THREAT = ("Illicit Content", "LOW")
+
+# Indicator kind -> (threat type, severity)
+INDICATOR_THREATS = {
+    "credential": ("Credential Leak", "CRITICAL"),
+    "email": ("Exposed Email", "MEDIUM"),
+    "btc": ("Crypto Wallet", "LOW"),
+    "xmr": ("Crypto Wallet", "LOW"),
+}
+
+
+def classify(text: str):
+    """[(keyword, threat type, severity)] for every distinct keyword in text."""
+    keywords = {m.lower() for m in THREAT_PATTERN.findall(text)}
+    return [(k,) + KEYWORD_THREATS.get(k, DEFAULT_THREAT) for k in sorted(keywords)]
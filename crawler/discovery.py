@@ -0,0 +1,210 @@
+"""
+Keyword-driven discovery through onion search engines
+ - Builds queries from the threat keywords (detector.py) and every watchlist
+   term (alerts.py) and runs them against the configured search engines'
+   result pages concurrently
+ - Result links are unwrapped from the engines' redirectors, canonicalized
+   (urlnorm.py) and deduplicated across engines and queries; onions hit by
+   more queries come first
+ - Each result keeps its provenance ("search:<engine>:<query>") in the
+   frontier and in the discoveries table of the shared store
+ - Parsed results are cached per (engine, query) for DISCOVERY_TTL_SECONDS,
+   so a rerun only re-queries what has expired
+
+Engines are configurable as comma-separated name=template pairs:
+    DISCOVERY_ENGINES="ahmia=http://juhanu...onion/search/?q={query},haystak=http://haystak...onion/?q={query}"
+
+Usage:
+    python crawler/crawler.py --discover               # discover, then crawl the results
+    python crawler/discovery.py --limit 50             # only list what would be seeded
+"""
+
+import argparse
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qsl, quote_plus, urlsplit
+
+import requests
+from bs4 import BeautifulSoup
+
+from settings import REQUEST_TIMEOUT, STORE_PATH, env_float, env_int, env_str, socks_proxies
+import alerts
+import detector
+import urlnorm
+
+# --- CONFIG ---
+DEFAULT_ENGINES = {
+    "ahmia": "http://juhanurmihxlp77nkq76byazcldy2hlmovfu2epvl5ankdibsot4csyd.onion/search/?q={query}",
+    "haystak": "http://haystak5njsmn2hqkewecpaxetahtwhsbsa64jom2k22z5afxhnpxfid.onion/?q={query}",
+}
+ENGINES = dict(pair.split("=", 1) for pair in env_str("DISCOVERY_ENGINES", "").split(",") if "=" in pair) \
+    or DEFAULT_ENGINES
+DISCOVERY_CONCURRENCY = env_int("DISCOVERY_CONCURRENCY", 8)
+DISCOVERY_TTL_SECONDS = env_float("DISCOVERY_TTL_SECONDS", 6 * 3600)
+DISCOVERY_MAX_SEEDS = env_int("DISCOVERY_MAX_SEEDS", 100)
+# Keywords the crawler flags but never searches for: the results are abuse material, not org threats
+EXCLUDED_QUERIES = {"porn", "child"}
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS search_cache (
+        engine TEXT NOT NULL,
+        query TEXT NOT NULL,
+        fetched_at REAL NOT NULL,
+        urls TEXT NOT NULL,
+        PRIMARY KEY (engine, query)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS discoveries (
+        url TEXT PRIMARY KEY,
+        source TEXT NOT NULL,
+        first_seen REAL NOT NULL,
+        last_seen REAL NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 1
+    );
+"""
+
+
+def build_queries(keywords=None, watchlists=None) -> list:
+    """Threat keywords, then every watchlist term; deduplicated, multi-word terms quoted."""
+    keywords = detector.THREAT_KEYWORDS if keywords is None else keywords
+    watchlists = alerts.load_watchlists() if watchlists is None else watchlists
+    terms = list(keywords) + [t for cfg in watchlists.values() for t in cfg.get("terms", [])]
+    queries = OrderedDict()
+    for term in terms:
+        term = term.strip().lower()
+        if term and term not in EXCLUDED_QUERIES:
+            queries.setdefault(f'"{term}"' if " " in term else term, None)
+    return list(queries)
+
+
+def result_urls(html: str, page_url: str) -> list:
+    """Canonical onion URLs linked from a result page, engine-internal links excluded."""
+    own_host = urlsplit(page_url).hostname
+    found = OrderedDict()
+    for a in BeautifulSoup(html, "html.parser").find_all("a", href=True):
+        href = a["href"]
+        # Engines wrap results in redirectors (/search/redirect?redirect_url=...): look inside the query too
+        candidates = [href] + [v for _k, v in parse_qsl(urlsplit(href).query) if ".onion" in v]
+        for candidate in candidates:
+            url = urlnorm.canonicalize(candidate, page_url)
+            if url and urlsplit(url).hostname != own_host and urlnorm.classify(url) != urlnorm.SKIP:
+                found.setdefault(url, None)
+    return list(found)
+
+
+class ResultCache:
+    """Parsed result lists per (engine, query) with a TTL, plus the discoveries provenance log."""
+
+    def __init__(self, path=STORE_PATH, ttl=DISCOVERY_TTL_SECONDS):
+        self.ttl = ttl
+        self.conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def get(self, engine: str, query: str, now: float):
+        with self._lock:
+            row = self.conn.execute("SELECT fetched_at, urls FROM search_cache WHERE engine = ? AND query = ?",
+                                    (engine, query)).fetchone()
+        if row is None or now - row[0] > self.ttl:
+            return None
+        return json.loads(row[1])
+
+    def put(self, engine: str, query: str, urls: list, now: float):
+        with self._lock:
+            self.conn.execute("INSERT OR REPLACE INTO search_cache (engine, query, fetched_at, urls) "
+                              "VALUES (?, ?, ?, ?)", (engine, query, now, json.dumps(urls)))
+            self.conn.commit()
+
+    def record(self, results: dict, now: float):
+        """Keep the first source that led to each URL; count how often it turns up again."""
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO discoveries (url, source, first_seen, last_seen) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (url) DO UPDATE SET last_seen = excluded.last_seen, hits = hits + 1",
+                [(url, sources[0], now, now) for url, sources in results.items()])
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+
+def discover(fetch, queries=None, engines=None, cache=None, concurrency=DISCOVERY_CONCURRENCY, now=None):
+    """Run every query on every engine; {canonical url: [sources]} with the most-hit URLs first.
+
+    fetch(url) returns the page HTML or None (crawler.fetch_url, bound to a session).
+    """
+    queries = build_queries() if queries is None else queries
+    engines = ENGINES if engines is None else engines
+    now = now or time.time()
+    own_cache = cache is None
+    cache = ResultCache() if own_cache else cache
+
+    hits, misses = {}, []
+    for engine, template in engines.items():
+        for query in queries:
+            cached = cache.get(engine, query, now)
+            if cached is None:
+                misses.append((engine, query, template.format(query=quote_plus(query))))
+            else:
+                hits[(engine, query)] = cached
+
+    def run(job):
+        engine, query, url = job
+        html = fetch(url)
+        return job, (result_urls(html, url) if html else None)
+
+    fetched = failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, concurrency), thread_name_prefix="discover") as pool:
+        for (engine, query, _url), urls in pool.map(run, misses):
+            if urls is None:
+                failed += 1  # not cached: retried on the next run
+                continue
+            fetched += 1
+            cache.put(engine, query, urls, now)
+            hits[(engine, query)] = urls
+
+    results = OrderedDict()
+    for (engine, query), urls in hits.items():
+        for url in urls:
+            results.setdefault(url, []).append(f"search:{engine}:{query}")
+    ranked = OrderedDict(sorted(results.items(), key=lambda item: len(item[1]), reverse=True))
+    cache.record(ranked, now)
+    if own_cache:
+        cache.close()
+
+    print(f"🔎 Discovery: {len(queries)} queries x {len(engines)} engines, {fetched} fetched, "
+          f"{len(hits) - fetched} from cache, {failed} failed -> {len(ranked)} onion URLs")
+    return ranked
+
+
+def seed_frontier(frontier, results: dict) -> int:
+    """Add discovered URLs to the frontier, each tagged with the first source that found it."""
+    by_source = OrderedDict()
+    for url, sources in results.items():
+        by_source.setdefault(sources[0], []).append(url)
+    return sum(frontier.add_urls(urls, source=source) for source, urls in by_source.items())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find onion services for the threat keywords and watchlists")
+    parser.add_argument("--limit", type=int, default=DISCOVERY_MAX_SEEDS)
+    parser.add_argument("--query", action="append", help="search for these instead of keywords + watchlists")
+    args = parser.parse_args()
+
+    session = requests.Session()
+    session.proxies.update(socks_proxies("discovery"))
+
+    def fetch(url):
+        try:
+            resp = session.get(url, timeout=REQUEST_TIMEOUT)
+            return resp.text if resp.status_code == 200 else None
+        except requests.RequestException:
+            return None
+
+    for url, sources in list(discover(fetch, queries=args.query).items())[:args.limit]:
+        print(f"{url}  ({len(sources)} hits; first via {sources[0]})")
@@ -0,0 +1,181 @@
+"""
+Threat log export
+ - CSV, JSONL and a text summary report, generated from the detections table
+ - Rows are read in keyset-paginated chunks and written straight to disk, so
+   memory stays flat whatever the date range
+ - Filters: org, date range and minimum severity
+ - Finished files are cached under data/exports/ by a key derived from the
+   query and the newest matching detection; a repeat request is a file open
+
+Usage:
+    python crawler/export.py --org "Example Corp" --format csv --since 2025-01-01
+    python crawler/export.py --format summary --min-severity HIGH
+"""
+
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+from collections import Counter
+from datetime import datetime, timezone
+from pathlib import Path
+
+from settings import DATA_DIR, env_int, env_str
+import alerts
+import detector
+
+# --- CONFIG ---
+EXPORT_DIR = Path(env_str("THREAT_EXPORT_DIR", str(DATA_DIR / "exports")))
+EXPORT_CHUNK_ROWS = env_int("THREAT_EXPORT_CHUNK_ROWS", 5000)
+EXPORT_CACHE_FILES = env_int("THREAT_EXPORT_CACHE_FILES", 50)
+SUMMARY_SAMPLE_ROWS = 20
+FORMATS = {"csv": ".csv", "jsonl": ".jsonl", "summary": ".txt"}
+COLUMNS = ["Timestamp", "Threat Type", "Severity", "Description", "Source URL"]
+
+
+def _where(org=None, since=None, until=None, min_severity=None):
+    clauses, params = [], []
+    if org:
+        clauses.append("org = ?")
+        params.append(org)
+    if since is not None:
+        clauses.append("ts >= ?")
+        params.append(since)
+    if until is not None:
+        clauses.append("ts < ?")
+        params.append(until)
+    if min_severity:
+        severe = [s for s in detector.SEVERITIES if alerts.at_least(s, min_severity)]
+        clauses.append(f"severity IN ({','.join('?' * len(severe))})")
+        params += severe
+    return " AND ".join(clauses) or "1", params
+
+
+def iter_detections(conn, chunk_rows=EXPORT_CHUNK_ROWS, **filters):
+    """Yield matching rows oldest first, one chunk in memory at a time."""
+    where, params = _where(**filters)
+    last = (float("-inf"), 0)
+    while True:
+        rows = conn.execute(
+            f"SELECT ts, id, threat_type, severity, description, url FROM detections "
+            f"WHERE {where} AND (ts, id) > (?, ?) ORDER BY ts, id LIMIT ?",
+            (*params, *last, chunk_rows)).fetchall()
+        if not rows:
+            return
+        for ts, _id, *rest in rows:
+            yield (ts, *rest)
+        last = rows[-1][:2]
+
+
+def cache_key(conn, fmt, **filters) -> str:
+    """Changes whenever a new matching detection lands."""
+    where, params = _where(**filters)
+    count, newest = conn.execute(f"SELECT COUNT(*), MAX(id) FROM detections WHERE {where}", params).fetchone()
+    query = json.dumps({"fmt": fmt, **filters, "count": count, "newest": newest}, sort_keys=True)
+    return hashlib.sha1(query.encode("utf-8")).hexdigest()[:16]
+
+
+def _fmt_ts(ts):
+    return datetime.fromtimestamp(ts, timezone.utc).strftime("%Y-%m-%d %H:%M")
+
+
+# --- Writers ---
+def write_csv(rows, f):
+    writer = csv.writer(f)
+    writer.writerow(COLUMNS)
+    for ts, *rest in rows:
+        writer.writerow([_fmt_ts(ts), *rest])
+
+
+def write_jsonl(rows, f):
+    for ts, threat_type, severity, description, url in rows:
+        f.write(json.dumps({"ts": ts, "threat_type": threat_type, "severity": severity,
+                            "description": description, "url": url}, ensure_ascii=False) + "\n")
+
+
+def write_summary(rows, f, title="all organizations"):
+    """One pass: counters plus the first few rows, never the whole log."""
+    by_type, by_severity, by_domain = Counter(), Counter(), Counter()
+    sample, total, first, last = [], 0, None, None
+    for row in rows:
+        ts, threat_type, severity, _description, url = row
+        total += 1
+        first = first if first is not None else ts
+        last = ts
+        by_type[threat_type] += 1
+        by_severity[severity] += 1
+        by_domain[(url or "").split("/")[2] if "://" in (url or "") else url] += 1
+        if len(sample) < SUMMARY_SAMPLE_ROWS:
+            sample.append(row)
+
+    f.write(f"--- Dark Web Threat Monitoring Report for {title} ---\n\n")
+    f.write("Summary:\n")
+    f.write(f"Total Threats: {total}\n")
+    f.write(f"Critical Alerts: {by_severity.get('CRITICAL', 0)}\n")
+    if total:
+        f.write(f"Period: {_fmt_ts(first)} .. {_fmt_ts(last)} UTC\n")
+    for heading, counter in (("By severity", by_severity), ("By threat type", by_type),
+                             ("Top domains", by_domain)):
+        f.write(f"\n{heading}:\n")
+        for key, count in counter.most_common(10):
+            f.write(f"  {key}: {count}\n")
+    f.write(f"\nDetailed Log Snippet (first {len(sample)} of {total}):\n")
+    for ts, threat_type, severity, description, url in sample:
+        f.write(f"  {_fmt_ts(ts)} [{severity}] {threat_type}: {description} ({url})\n")
+
+
+WRITERS = {"csv": write_csv, "jsonl": write_jsonl, "summary": write_summary}
+
+
+# --- Entry point ---
+def export(fmt="csv", org=None, since=None, until=None, min_severity=None, conn=None, out_dir=EXPORT_DIR) -> Path:
+    """Return the path of the finished export, generating it only on a cache miss."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    conn = conn or alerts.connect()
+    filters = {"org": org, "since": since, "until": until, "min_severity": min_severity}
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    path = out_dir / f"{fmt}-{cache_key(conn, fmt, **filters)}{FORMATS[fmt]}"
+    if path.exists():
+        os.utime(path)
+        return path
+
+    # Per writer: concurrent requests for the same export must not share a temp file
+    tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    rows = iter_detections(conn, **filters)
+    with open(tmp, "w", encoding="utf-8", newline="") as f:
+        if fmt == "summary":
+            write_summary(rows, f, title=org or "all organizations")
+        else:
+            WRITERS[fmt](rows, f)
+    os.replace(tmp, path)
+    evict(out_dir)
+    return path
+
+
+def evict(out_dir=EXPORT_DIR, keep=EXPORT_CACHE_FILES):
+    """Drop the least recently used exports beyond `keep`."""
+    files = sorted((p for p in Path(out_dir).iterdir() if p.suffix in FORMATS.values()),
+                   key=lambda p: p.stat().st_mtime, reverse=True)
+    for stale in files[keep:]:
+        stale.unlink(missing_ok=True)
+
+
+def parse_date(value):
+    return datetime.strptime(value, "%Y-%m-%d").replace(tzinfo=timezone.utc).timestamp() if value else None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export the threat log")
+    parser.add_argument("--format", choices=list(FORMATS), default="csv")
+    parser.add_argument("--org", default=None)
+    parser.add_argument("--since", default=None, help="YYYY-MM-DD (UTC, inclusive)")
+    parser.add_argument("--until", default=None, help="YYYY-MM-DD (UTC, exclusive)")
+    parser.add_argument("--min-severity", choices=detector.SEVERITIES, default=None)
+    args = parser.parse_args()
+
+    path = export(args.format, args.org, parse_date(args.since), parse_date(args.until), args.min_severity)
+    print(f"✅ Export ready: {path} ({path.stat().st_size} bytes)")
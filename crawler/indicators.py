@@ -0,0 +1,275 @@
+"""
+Single-pass indicator extraction
+ - One combined regex finds every indicator kind in a single scan per page:
+   credential lines (user:pass), v3 onion addresses, emails, BTC addresses
+   (Base58Check and bech32/bech32m), XMR addresses and MD5/SHA-1/SHA-256 hashes
+ - Checksums are verified before an indicator is accepted (Base58Check,
+   bech32, v3 onion checksum; Monero keccak when pycryptodome is installed);
+   credential lines must look like a dump entry and come from visible text,
+   not script/style blocks
+ - IndicatorStore keeps them in an indexed SQLite table keyed to the page
+"""
+
+import base64
+import hashlib
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    from Crypto.Hash import keccak  # pycryptodome, optional
+except ImportError:
+    keccak = None
+
+from settings import STORE_PATH
+
+B58_ALPHABET = "123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
+B58_INDEX = {c: i for i, c in enumerate(B58_ALPHABET)}
+BECH32_CHARSET = "qpzry9x8gf2tvdw0s3jn54khce6mua7l"
+
+# Order matters: at a given position the first alternative that matches wins,
+# so credential lines come before the email pattern they contain. The leading
+# lookbehind only lets a match start at a token boundary, which halves scan time.
+# A dot counts as a boundary so subdomain onions (www.<v3>.onion) match; an
+# email's local part is already consumed by the match that starts before it.
+INDICATOR_PATTERN = re.compile(r"""
+  (?<![\w%+-])
+  (?:
+    (?P<credential>^(?!https?:)[^\s:<>"']{2,64}:[^\s:<>"']{4,128}$)
+  | (?P<onion>\b[a-z2-7]{56}\.onion\b)
+  | (?P<email>\b[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,24}\b)
+  | (?P<btc_bech32>\bbc1[ac-hj-np-z02-9]{11,71}\b)
+  | (?P<btc>\b[13][1-9A-HJ-NP-Za-km-z]{25,34}\b)
+  | (?P<xmr>\b[48][1-9A-HJ-NP-Za-km-z]{94}(?:[1-9A-HJ-NP-Za-km-z]{11})?\b)
+  | (?P<sha256>\b[0-9a-fA-F]{64}\b)
+  | (?P<sha1>\b[0-9a-fA-F]{40}\b)
+  | (?P<md5>\b[0-9a-fA-F]{32}\b)
+  )
+""", re.VERBOSE | re.MULTILINE | re.IGNORECASE)
+
+# Tags become line breaks so text nodes sit on their own lines (for
+# credential dumps) while attribute values (hrefs, mailto:) stay scannable.
+_TAG_BREAKS = str.maketrans({"<": "\n", ">": "\n"})
+# Script/style bodies and comments are not page text: `color:red;` or `key:value1,` are not leaks
+_INVISIBLE = re.compile(r"<(script|style|noscript|template)\b[^>]*>.*?</\1\s*>|<!--.*?-->",
+                        re.DOTALL | re.IGNORECASE)
+
+
+# --- Checksums ---
+def b58decode(s: str) -> bytes:
+    num = 0
+    for c in s:
+        num = num * 58 + B58_INDEX[c]
+    body = num.to_bytes((num.bit_length() + 7) // 8, "big")
+    return b"\x00" * (len(s) - len(s.lstrip("1"))) + body
+
+
+def valid_base58check(address: str) -> bool:
+    try:
+        raw = b58decode(address)
+    except KeyError:
+        return False
+    if len(raw) != 25 or raw[0] not in (0x00, 0x05):
+        return False
+    payload, checksum = raw[:-4], raw[-4:]
+    return hashlib.sha256(hashlib.sha256(payload).digest()).digest()[:4] == checksum
+
+
+def _bech32_polymod(values) -> int:
+    generator = [0x3B6A57B2, 0x26508E6D, 0x1EA119FA, 0x3D4233DD, 0x2A1462B3]
+    chk = 1
+    for value in values:
+        top = chk >> 25
+        chk = (chk & 0x1FFFFFF) << 5 ^ value
+        for i in range(5):
+            chk ^= generator[i] if (top >> i) & 1 else 0
+    return chk
+
+
+def valid_bech32(address: str) -> bool:
+    address = address.lower()
+    hrp, _, data = address.rpartition("1")
+    if hrp != "bc" or len(data) < 6:
+        return False
+    values = [ord(x) >> 5 for x in hrp] + [0] + [ord(x) & 31 for x in hrp]
+    values += [BECH32_CHARSET.index(c) for c in data]
+    return _bech32_polymod(values) in (1, 0x2BC830A3)  # bech32, bech32m
+
+
+def onion_v3_pubkey(host: str):
+    """Return the ed25519 pubkey of a valid v3 onion hostname, else None."""
+    label = host.lower()
+    if label.endswith(".onion"):
+        label = label[:-len(".onion")]
+    label = label.rsplit(".", 1)[-1]  # allow subdomains
+    if len(label) != 56:
+        return None
+    try:
+        raw = base64.b32decode(label.upper())
+    except ValueError:
+        return None
+    pubkey, checksum, version = raw[:32], raw[32:34], raw[34:]
+    if version != b"\x03":
+        return None
+    expected = hashlib.sha3_256(b".onion checksum" + pubkey + version).digest()[:2]
+    return pubkey if checksum == expected else None
+
+
+def valid_onion_v3(host: str) -> bool:
+    return onion_v3_pubkey(host) is not None
+
+
+def _monero_b58decode(address: str) -> bytes:
+    """Monero base58: 11-char blocks encode 8 bytes; the tail block is shorter."""
+    block_sizes = {0: 0, 2: 1, 3: 2, 5: 3, 6: 4, 7: 5, 9: 6, 10: 7, 11: 8}
+    out = b""
+    for start in range(0, len(address), 11):
+        block = address[start:start + 11]
+        num = 0
+        for c in block:
+            num = num * 58 + B58_INDEX[c]
+        out += num.to_bytes(block_sizes[len(block)], "big")
+    return out
+
+
+def valid_monero(address: str) -> bool:
+    try:
+        raw = _monero_b58decode(address)
+    except (KeyError, OverflowError):
+        return False
+    # network byte: 18 standard, 19 integrated, 42 subaddress (mainnet)
+    if len(raw) not in (69, 77) or raw[0] not in (18, 19, 42):
+        return False
+    if keccak is None:
+        return True
+    digest = keccak.new(digest_bits=256, data=raw[:-4]).digest()
+    return digest[:4] == raw[-4:]
+
+
+# --- Credential shape ---
+_CREDENTIAL_USER = re.compile(r"[A-Za-z0-9._-]{2,64}|[A-Za-z0-9._%+-]{1,64}@[A-Za-z0-9-]+(?:\.[A-Za-z0-9-]+)*\.[A-Za-z]{2,24}")
+_CODE_PUNCTUATION = set(";,{}()[]`\\")
+_AMOUNT = re.compile(r"[$€£¥]?[\d.,]+%?")
+# Values of "Label:Value" lines: dates, times, sizes (1920x1080), versions, hex ids
+_NOT_PASSWORDS = re.compile(r"[\d\s./x×+-]+|v?\d+(?:\.\d+)+[a-z]*|(?:0x)?[0-9a-f]+", re.IGNORECASE)
+_NOT_USERS = {"http", "https", "ftp", "file", "mailto", "tel", "sms", "javascript", "data", "magnet", "bitcoin",
+              "monero", "irc", "xmpp", "urn", "about"}
+
+
+def valid_credential(line: str) -> bool:
+    """user:password lines that look like a dump, not prose, prices or code.
+
+    The left side must be an email or a plain username. The password may not
+    contain code punctuation or be a bare amount or indicator. Without an
+    email, a forum or market "Label:Value" line is the likelier reading, so the
+    password needs 6+ characters with a letter and a digit or symbol, and may
+    not be a date, size, version or hex id (`Status:Online`, `Date:2024-05-01`
+    and `Ratio:1920x1080` do not count).
+    """
+    user, _, password = line.partition(":")
+    if user.lower() in _NOT_USERS or not _CREDENTIAL_USER.fullmatch(user):
+        return False
+    if _CODE_PUNCTUATION.intersection(password) or _AMOUNT.fullmatch(password):
+        return False
+    if INDICATOR_PATTERN.fullmatch(password):
+        return False  # `BTC:1A1z...`, `Contact:ops@...` are labelled indicators, reported on their own
+    if "@" in user:
+        return True
+    if len(password) < 6 or password.isalpha() or _NOT_PASSWORDS.fullmatch(password):
+        return False
+    return any(c.isalpha() for c in password)
+
+
+VALIDATORS = {
+    "credential": valid_credential,
+    "btc": valid_base58check,
+    "btc_bech32": valid_bech32,
+    "onion": valid_onion_v3,
+    "xmr": valid_monero,
+}
+
+
+# --- Extraction ---
+def extract(html: str):
+    """Return a set of (kind, value) indicators found in one page."""
+    found = set()
+    text = _INVISIBLE.sub("\n", html).translate(_TAG_BREAKS)
+    scans = [INDICATOR_PATTERN.finditer(text)]  # a rejected credential line pushes a rescan of itself
+    while scans:
+        match = next(scans[-1], None)
+        if match is None:
+            scans.pop()
+            continue
+        kind = match.lastgroup
+        value = match.group(kind)
+        validator = VALIDATORS.get(kind)
+        if validator is not None and not validator(value):
+            if kind == "credential":
+                # `BTC:1A1z...` is no credential but may hold one; ^ never matches past pos
+                scans.append(INDICATOR_PATTERN.finditer(text, match.start() + 1, match.end()))
+            continue
+        if kind == "btc_bech32":
+            kind, value = "btc", value.lower()
+        elif kind in ("onion", "email", "md5", "sha1", "sha256"):
+            value = value.lower()
+        found.add((kind, value))
+    return found
+
+
+def group(found) -> dict:
+    """{kind: sorted values} for embedding in a crawl record."""
+    grouped = {}
+    for kind, value in found:
+        grouped.setdefault(kind, []).append(value)
+    return {kind: sorted(values) for kind, values in sorted(grouped.items())}
+
+
+# --- Storage ---
+class IndicatorStore:
+    def __init__(self, path=STORE_PATH):
+        self.conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS indicators (
+                id INTEGER PRIMARY KEY,
+                page_url TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                value TEXT NOT NULL,
+                first_seen REAL NOT NULL,
+                last_seen REAL NOT NULL,
+                hits INTEGER NOT NULL DEFAULT 1,
+                UNIQUE (page_url, kind, value)
+            );
+            CREATE INDEX IF NOT EXISTS idx_indicators_value ON indicators (kind, value);
+            CREATE INDEX IF NOT EXISTS idx_indicators_seen ON indicators (last_seen);
+        """)
+
+    def add(self, page_url: str, found, seen_at: float = None):
+        if not found:
+            return
+        seen_at = seen_at or time.time()
+        with self._lock:
+            self.conn.executemany(
+                "INSERT INTO indicators (page_url, kind, value, first_seen, last_seen) VALUES (?, ?, ?, ?, ?) "
+                "ON CONFLICT (page_url, kind, value) DO UPDATE SET last_seen = excluded.last_seen, hits = hits + 1",
+                [(page_url, kind, value, seen_at, seen_at) for kind, value in found])
+            self.conn.commit()
+
+    def pages_for(self, kind: str, value: str):
+        """Pages an indicator was seen on (pivot)."""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT page_url, first_seen, last_seen FROM indicators WHERE kind = ? AND value = ?",
+                (kind, value)).fetchall()
+
+    def for_page(self, page_url: str):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT kind, value FROM indicators WHERE page_url = ? ORDER BY kind, value",
+                (page_url,)).fetchall()
+
+    def close(self):
+        self.conn.close()
@@ -0,0 +1,258 @@
+"""
+Opt-in profiling and tracing for pipeline stages
+ - Off by default; enabled with CRAWLER_PROFILE=<modes> or crawler.py --profile
+ - Modes (comma separated): spans, cprofile, sample, tracemalloc, or "all"
+ - Stage functions are only wrapped when profiling is enabled, so the
+   disabled path runs the original functions untouched
+ - --profile on the command line takes precedence over CRAWLER_PROFILE
+ - cProfile keeps one profiler per stage and thread (a profiler only sees the
+   thread that enabled it); they are merged into one .prof per stage
+ - Each run writes to data/profiles/<run_id>/:
+     trace.json            Chrome trace events (chrome://tracing, Perfetto, speedscope)
+     summary.json          per-stage call count / total / mean / max
+     <stage>.prof          cProfile stats per stage (snakeviz, gprof2dot, flameprof)
+     samples.folded        collapsed stacks from the sampler (flamegraph.pl, speedscope)
+     <stage>.tracemalloc   last tracemalloc snapshot taken at the end of the stage
+"""
+
+import atexit
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter, defaultdict
+from pathlib import Path
+
+from settings import DATA_DIR, env_str, env_float, env_int
+
+# --- CONFIG ---
+MODES = ("spans", "cprofile", "sample", "tracemalloc")
+PROFILE = env_str("CRAWLER_PROFILE", "")
+PROFILE_DIR = Path(env_str("CRAWLER_PROFILE_DIR", str(DATA_DIR / "profiles")))
+SAMPLE_INTERVAL = env_float("CRAWLER_PROFILE_SAMPLE_INTERVAL", 0.005)  # seconds
+SNAPSHOT_EVERY = env_int("CRAWLER_PROFILE_SNAPSHOT_EVERY", 50)  # calls per stage
+
+_run = None
+
+
+def parse_modes(value: str) -> set:
+    modes = {m.strip().lower() for m in (value or "").split(",") if m.strip()}
+    if modes & {"1", "true", "yes", "on", "all"}:
+        return set(MODES)
+    unknown = modes - set(MODES)
+    if unknown:
+        raise ValueError(f"Unknown profiling mode(s): {', '.join(sorted(unknown))}")
+    # spans are the backbone of every other mode
+    return modes | {"spans"} if modes else set()
+
+
+class Run:
+    """One profiling session: collects spans, profiles, samples and snapshots."""
+
+    def __init__(self, modes: set, out_dir: Path):
+        self.modes = modes
+        self.run_id = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self.out_dir = Path(out_dir) / self.run_id
+        self.pid = os.getpid()
+        self.t0 = time.perf_counter_ns()
+        self.events = []
+        self.stats = defaultdict(lambda: {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+        self.profilers = defaultdict(list)  # stage -> one cProfile.Profile per thread
+        self.snapshots = {}
+        self.samples = Counter()
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._active_stage = {}
+        self._stop = threading.Event()
+        self._sampler = None
+        self._finished = False
+        self._started_tracemalloc = False
+
+        if "tracemalloc" in modes and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        if "sample" in modes:
+            self._sampler = threading.Thread(target=self._sample_loop, name="profiling-sampler", daemon=True)
+            self._sampler.start()
+
+    # --- Spans ---
+    @contextlib.contextmanager
+    def span(self, stage: str, **args):
+        local = self._local
+        depth = getattr(local, "depth", 0)
+        local.depth = depth + 1
+        tid = threading.get_ident()
+        previous_stage = self._active_stage.get(tid)
+        self._active_stage[tid] = stage
+
+        profiler = None
+        if "cprofile" in self.modes and depth == 0:
+            profilers = getattr(local, "profilers", None)
+            if profilers is None:
+                profilers = local.profilers = {}
+            profiler = profilers.get(stage)
+            if profiler is None:
+                profiler = profilers[stage] = cProfile.Profile()
+                with self._lock:
+                    self.profilers[stage].append(profiler)
+            try:
+                profiler.enable()
+            except ValueError:  # Python 3.12+: only one profiler may be active per process
+                profiler = None
+        track_mem = "tracemalloc" in self.modes and tracemalloc.is_tracing()
+        mem_before = tracemalloc.get_traced_memory()[0] if track_mem else None
+
+        start = time.perf_counter_ns()
+        try:
+            yield
+        finally:
+            end = time.perf_counter_ns()
+            if profiler is not None:
+                profiler.disable()
+            local.depth = depth
+            self._active_stage[tid] = previous_stage
+
+            dur_ms = (end - start) / 1e6
+            event = {
+                "name": stage, "cat": "stage", "ph": "X", "pid": self.pid, "tid": tid,
+                "ts": (start - self.t0) / 1e3, "dur": (end - start) / 1e3,
+            }
+            if args:
+                event["args"] = args
+            if mem_before is not None:
+                event.setdefault("args", {})["mem_delta_bytes"] = tracemalloc.get_traced_memory()[0] - mem_before
+
+            with self._lock:
+                self.events.append(event)
+                stat = self.stats[stage]
+                stat["calls"] += 1
+                stat["total_ms"] += dur_ms
+                stat["max_ms"] = max(stat["max_ms"], dur_ms)
+                take_snapshot = mem_before is not None and (stat["calls"] - 1) % max(1, SNAPSHOT_EVERY) == 0
+            if take_snapshot:
+                self.snapshots[stage] = tracemalloc.take_snapshot()
+
+    # --- Sampling profiler ---
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while not self._stop.wait(SAMPLE_INTERVAL):
+            for tid, frame in sys._current_frames().items():
+                if tid == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{Path(code.co_filename).name}:{code.co_name}")
+                    frame = frame.f_back
+                stage = self._active_stage.get(tid) or "idle"
+                self.samples[";".join([stage] + stack[::-1])] += 1
+
+    # --- Output ---
+    def stop(self):
+        """Stop collecting without writing anything. Returns False if the run had already stopped."""
+        if self._finished:
+            return False
+        self._finished = True
+        self._stop.set()
+        if self._sampler is not None:
+            self._sampler.join(timeout=1)
+        return True
+
+    def discard(self):
+        """Drop the run (replaced by another); nothing is written."""
+        if self.stop() and self._started_tracemalloc:
+            tracemalloc.stop()
+
+    def finish(self):
+        if not self.stop():
+            return
+
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            trace = {"traceEvents": self.events, "displayTimeUnit": "ms",
+                     "otherData": {"run_id": self.run_id, "modes": sorted(self.modes)}}
+            summary = {
+                stage: {**s, "mean_ms": s["total_ms"] / s["calls"] if s["calls"] else 0.0}
+                for stage, s in self.stats.items()
+            }
+        (self.out_dir / "trace.json").write_text(json.dumps(trace), encoding="utf-8")
+        (self.out_dir / "summary.json").write_text(json.dumps(summary, indent=2), encoding="utf-8")
+
+        for stage, profilers in self.profilers.items():
+            stats = None
+            for profiler in profilers:
+                try:
+                    stats = pstats.Stats(profiler) if stats is None else stats.add(profiler)
+                except TypeError:  # this thread's profiler never recorded a call
+                    continue
+            if stats is not None:
+                stats.dump_stats(str(self.out_dir / f"{stage}.prof"))
+        for stage, snapshot in self.snapshots.items():
+            snapshot.dump(str(self.out_dir / f"{stage}.tracemalloc"))
+        if self.samples:
+            with open(self.out_dir / "samples.folded", "w", encoding="utf-8") as f:
+                for stack, count in self.samples.most_common():
+                    f.write(f"{stack} {count}\n")
+
+        print(f"📈 Profile written to: {self.out_dir}")
+        for stage, s in sorted(summary.items(), key=lambda kv: -kv[1]["total_ms"]):
+            print(f"   {stage:<12} calls={s['calls']:<6} total={s['total_ms']:.1f}ms "
+                  f"mean={s['mean_ms']:.2f}ms max={s['max_ms']:.1f}ms")
+
+
+# --- Public API ---
+def enable(modes=None, out_dir=PROFILE_DIR):
+    """Start a profiling run. Returns the Run, or None when no mode is requested.
+
+    Explicit modes (crawler.py --profile) replace a run CRAWLER_PROFILE started with other modes.
+    """
+    global _run
+    explicit = modes is not None
+    modes = parse_modes(PROFILE if modes is None else modes)
+    if not modes:
+        return None
+    if _run is not None and explicit and _run.modes != modes:
+        _run.discard()
+        _run = None
+    if _run is None:
+        _run = Run(modes, out_dir)
+        atexit.unregister(finish)
+        atexit.register(finish)
+    return _run
+
+
+def finish():
+    if _run is not None:
+        _run.finish()
+
+
+def traced(fn, stage: str):
+    """Wrap fn so each call is recorded as a span of the given stage."""
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        with _run.span(stage):
+            return fn(*args, **kwargs)
+    wrapper.__wrapped_stage__ = stage
+    return wrapper
+
+
+def instrument(module, stages: dict):
+    """Replace module attributes {function_name: stage} with traced versions."""
+    if _run is None:
+        return
+    for name, stage in stages.items():
+        fn = getattr(module, name, None)
+        if fn is not None and not hasattr(fn, "__wrapped_stage__"):
+            setattr(module, name, traced(fn, stage))
+
+
+def instrument_from_env(module, stages: dict):
+    """Enable from CRAWLER_PROFILE and instrument; a no-op when it is unset."""
+    if PROFILE and enable() is not None:
+        instrument(module, stages)
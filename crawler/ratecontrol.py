@@ -0,0 +1,193 @@
+"""
+Adaptive request concurrency (AIMD) per Tor circuit and per host
+ - Every request takes a slot on its target host and on one circuit; each
+   has its own in-flight limit instead of a fixed sleep between requests
+ - Additive increase: a fast success grows the limit by 1/limit, i.e. about
+   +1 per round trip's worth of completions
+ - Multiplicative decrease: an error, timeout, 429/5xx, or a latency well
+   above the best seen so far cuts the limit (at most once per round trip)
+ - A request goes to the circuit with the most headroom, so a slow or
+   failing circuit gets less traffic until it recovers
+ - Current limits, latency and error counts are written to
+   data/metrics/ratecontrol.json for dashboards
+ - CRAWLER_ADAPTIVE=0 keeps the old static pacing: a single slot on one
+   circuit, and the pause (crawler.random_delay) is taken while holding it,
+   so requests stay one at a time with the delay between them
+
+Circuits are isolated by SOCKS username (Tor's IsolateSOCKSAuth default).
+"""
+
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from settings import METRICS_DIR, env_bool, env_float, env_int
+
+# --- CONFIG ---
+ADAPTIVE = env_bool("CRAWLER_ADAPTIVE", True)
+CIRCUITS = env_int("CRAWLER_CIRCUITS", 4)
+CIRCUIT_MAX_CONCURRENCY = env_int("CRAWLER_CIRCUIT_MAX_CONCURRENCY", 8)
+HOST_MAX_CONCURRENCY = env_int("CRAWLER_HOST_MAX_CONCURRENCY", 6)
+INITIAL_LIMIT = env_float("CRAWLER_INITIAL_CONCURRENCY", 1)
+DECREASE_FACTOR = 0.5
+LATENCY_TOLERANCE = env_float("CRAWLER_LATENCY_TOLERANCE", 2.5)  # x best latency before backing off
+EWMA_ALPHA = 0.2
+MAX_TRACKED_HOSTS = 10000
+METRICS_PATH = METRICS_DIR / "ratecontrol.json"
+METRICS_INTERVAL = env_float("CRAWLER_METRICS_INTERVAL", 5)
+
+
+class AIMDLimit:
+    def __init__(self, name, max_limit, min_limit=1.0, initial=INITIAL_LIMIT, adaptive=ADAPTIVE):
+        self.name = name
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.adaptive = adaptive
+        self.limit = float(min(max_limit, max(min_limit, initial)))
+        self.inflight = 0
+        self.successes = 0
+        self.failures = 0
+        self.decreases = 0
+        self.ewma_latency = None
+        self.best_latency = None
+        self.last_decrease = 0.0
+
+    def has_room(self) -> bool:
+        return self.inflight < int(self.limit)
+
+    def headroom(self) -> float:
+        return 1 - self.inflight / self.limit
+
+    def _decrease(self, now):
+        # One cut per round trip: completions from the same congested window don't compound
+        if now - self.last_decrease >= (self.ewma_latency or 0):
+            self.limit = max(self.min_limit, self.limit * DECREASE_FACTOR)
+            self.decreases += 1
+            self.last_decrease = now
+
+    def record(self, ok: bool, latency: float, now: float):
+        self.inflight -= 1
+        if not ok:
+            self.failures += 1
+            if self.adaptive:
+                self._decrease(now)
+            return
+        self.successes += 1
+        self.ewma_latency = latency if self.ewma_latency is None else \
+            EWMA_ALPHA * latency + (1 - EWMA_ALPHA) * self.ewma_latency
+        # Best latency drifts up slowly so a permanent path change is eventually accepted
+        self.best_latency = latency if self.best_latency is None else min(latency, self.best_latency * 1.01)
+        if not self.adaptive:
+            return
+        if latency > self.best_latency * LATENCY_TOLERANCE:
+            self._decrease(now)
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def snapshot(self) -> dict:
+        return {
+            "limit": round(self.limit, 2),
+            "inflight": self.inflight,
+            "successes": self.successes,
+            "failures": self.failures,
+            "decreases": self.decreases,
+            "ewma_latency_ms": round(self.ewma_latency * 1000, 1) if self.ewma_latency is not None else None,
+            "best_latency_ms": round(self.best_latency * 1000, 1) if self.best_latency is not None else None,
+        }
+
+
+class Slot:
+    """Handed to the caller of AIMDController.slot(); set ok=False on a failed request."""
+
+    def __init__(self, circuit: str, host: str):
+        self.circuit = circuit
+        self.host = host
+        self.ok = True
+
+
+class AIMDController:
+    def __init__(self, circuits=CIRCUITS, adaptive=ADAPTIVE, circuit_max=CIRCUIT_MAX_CONCURRENCY,
+                 host_max=HOST_MAX_CONCURRENCY, metrics_path=METRICS_PATH, pause=None):
+        self.adaptive = adaptive
+        self.host_max = host_max if adaptive else 1
+        self.circuits = [AIMDLimit(f"circuit-{i}", circuit_max if adaptive else 1, adaptive=adaptive)
+                         for i in range(max(1, circuits) if adaptive else 1)]
+        self.pause = None if adaptive else pause  # static pacing, slept inside the slot
+        self.hosts = OrderedDict()
+        self.metrics_path = metrics_path
+        self._cond = threading.Condition()
+        self._last_metrics = 0.0
+
+    @property
+    def max_in_flight(self) -> int:
+        return sum(int(c.max_limit) for c in self.circuits)
+
+    def _host(self, host) -> AIMDLimit:
+        limit = self.hosts.get(host)
+        if limit is None:
+            limit = self.hosts[host] = AIMDLimit(host, self.host_max, adaptive=self.adaptive)
+            # Forget idle hosts beyond the cap (oldest first)
+            while len(self.hosts) > MAX_TRACKED_HOSTS:
+                oldest = next(iter(self.hosts))
+                if self.hosts[oldest].inflight:
+                    break
+                del self.hosts[oldest]
+        else:
+            self.hosts.move_to_end(host)
+        return limit
+
+    @contextlib.contextmanager
+    def slot(self, host: str):
+        """Wait for room on the host and on some circuit, then time the request."""
+        with self._cond:
+            while True:
+                host_limit = self._host(host)
+                open_circuits = [c for c in self.circuits if c.has_room()]
+                if host_limit.has_room() and open_circuits:
+                    break
+                self._cond.wait(0.5)
+            circuit = max(open_circuits, key=AIMDLimit.headroom)
+            host_limit.inflight += 1
+            circuit.inflight += 1
+
+        slot = Slot(circuit.name, host)
+        start = time.monotonic()
+        try:
+            yield slot
+        except BaseException:
+            slot.ok = False
+            raise
+        finally:
+            now = time.monotonic()
+            if self.pause is not None:
+                self.pause()
+            with self._cond:
+                host_limit.record(slot.ok, now - start, now)
+                circuit.record(slot.ok, now - start, now)
+                self._cond.notify_all()
+                due = now - self._last_metrics >= METRICS_INTERVAL
+                if due:
+                    self._last_metrics = now
+            if due:
+                self.write_metrics()
+
+    def snapshot(self) -> dict:
+        with self._cond:
+            return {
+                "ts": time.time(),
+                "adaptive": self.adaptive,
+                "circuits": {c.name: c.snapshot() for c in self.circuits},
+                "hosts": {name: h.snapshot() for name, h in self.hosts.items()},
+            }
+
+    def write_metrics(self, path=None):
+        path = path or self.metrics_path
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_text(json.dumps(self.snapshot(), indent=2), encoding="utf-8")
+        os.replace(tmp, path)
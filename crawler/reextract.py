@@ -0,0 +1,201 @@
+"""
+Re-extract archived pages with the current extraction code
+ - Streams the latest archived body of every URL through parse_page(), the
+   indicator extractor and the keyword detector on a process pool
+ - Writes a versioned dataset: data/extracted/<extractor_version>/part-NNNNNN.jsonl
+ - Every record carries the extractor_version that produced it
+ - Resumable: the input is pinned to an archive snapshot and finished chunks
+   are listed in _manifest.json, so a rerun only does what is left
+
+Usage:
+    python crawler/reextract.py                    # all cores
+    python crawler/reextract.py --workers 4 --chunk-size 500
+    python crawler/reextract.py --restart          # ignore a previous partial run
+"""
+
+import argparse
+import hashlib
+import inspect
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from pathlib import Path
+
+from settings import DATA_DIR, env_str, env_int
+import archive as page_archive
+import crawler as engine
+import detector
+import indicators
+import urlnorm
+
+# --- CONFIG ---
+EXTRACT_DIR = Path(env_str("CRAWLER_EXTRACT_DIR", str(DATA_DIR / "extracted")))
+CHUNK_SIZE = env_int("CRAWLER_EXTRACT_CHUNK_SIZE", 200)
+
+
+def extractor_version() -> str:
+    """Fingerprint of the code, keyword lists and HTML parser that shape an extracted record.
+
+    Whole modules, not single functions: validators, helpers and patterns
+    change records too. html.parser and lxml build different trees from the
+    same page, so the parser is part of the version.
+    """
+    parts = [
+        f"parser={engine.HTML_PARSER}",
+        inspect.getsource(engine.parse_page),
+        inspect.getsource(detector),
+        inspect.getsource(indicators),
+        inspect.getsource(urlnorm),
+    ]
+    digest = hashlib.sha1("\n".join(parts).encode("utf-8")).hexdigest()[:12]
+    return f"x-{digest}"
+
+
+def extract(url: str, body: bytes, version: str) -> dict:
+    html = body.decode("utf-8", errors="replace")
+    record = engine.parse_page(url, html)
+    record["url"] = url
+    found = indicators.extract(html)
+    if found:
+        record["indicators"] = indicators.group(found)
+    record["keywords"] = sorted({m.lower() for m in detector.THREAT_PATTERN.findall(detector.entry_text(record))})
+    record["threat"] = bool(record["keywords"])
+    record["extractor_version"] = version
+    return record
+
+
+# --- Process pool ---
+_worker_archive = None
+
+
+def _init_worker(root):
+    global _worker_archive
+    _worker_archive = page_archive.Archive(root)
+
+
+def _run_chunk(index, rows, out_dir, version):
+    """Extract one chunk and write it atomically. Returns (index, records, errors)."""
+    part = Path(out_dir) / f"part-{index:06d}.jsonl"
+    tmp = part.with_suffix(".tmp")
+    errors = 0
+    count = 0
+    with open(tmp, "w", encoding="utf-8") as f:
+        for url, digest, fetched_at in rows:
+            try:
+                record = extract(url, _worker_archive.get(digest), version)
+            except Exception as e:
+                errors += 1
+                print(f"⚠️ Extraction failed for {url}: {e}")
+                continue
+            record["content_hash"] = digest
+            record["fetched_at"] = fetched_at
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    os.replace(tmp, part)
+    return index, count, errors
+
+
+# --- Manifest ---
+def load_manifest(path: Path):
+    if path.exists():
+        return json.loads(path.read_text(encoding="utf-8"))
+    return None
+
+
+def save_manifest(path: Path, manifest: dict):
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def chunked(iterable, size):
+    it = iter(iterable)
+    for index in itertools.count():
+        rows = list(itertools.islice(it, size))
+        if not rows:
+            return
+        yield index, rows
+
+
+def reextract(archive_root=page_archive.ARCHIVE_DIR, out_root=EXTRACT_DIR, workers=None,
+              chunk_size=CHUNK_SIZE, restart=False):
+    version = extractor_version()
+    out_dir = Path(out_root) / version
+    out_dir.mkdir(parents=True, exist_ok=True)
+    manifest_path = out_dir / "_manifest.json"
+
+    source = page_archive.Archive(archive_root)
+    manifest = None if restart else load_manifest(manifest_path)
+    if manifest is None or manifest.get("chunk_size") != chunk_size:
+        for stale in out_dir.glob("part-*"):
+            stale.unlink()
+        manifest = {
+            "extractor_version": version,
+            "archive_snapshot": source.max_fetch_id(),
+            "chunk_size": chunk_size,
+            "started_at": time.time(),
+            "done_chunks": [],
+            "records": 0,
+            "errors": 0,
+            "finished_at": None,
+        }
+        save_manifest(manifest_path, manifest)
+    elif manifest.get("finished_at"):
+        print(f"✅ {version} already complete: {manifest['records']} records in {out_dir}")
+        return manifest
+
+    done = set(manifest["done_chunks"])
+    print(f"🔁 Re-extracting archive snapshot #{manifest['archive_snapshot']} as {version} "
+          f"({len(done)} chunks already done)")
+
+    workers = workers or os.cpu_count() or 1
+    pending = set()
+    start = time.time()
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(str(archive_root),)) as pool:
+        def drain(block_until):
+            finished, still = wait(pending, return_when=block_until)
+            for future in finished:
+                index, count, errors = future.result()
+                manifest["done_chunks"].append(index)
+                manifest["records"] += count
+                manifest["errors"] += errors
+            save_manifest(manifest_path, manifest)
+            return still
+
+        for index, rows in chunked(source.iter_latest(manifest["archive_snapshot"]), chunk_size):
+            if index in done:
+                continue
+            pending.add(pool.submit(_run_chunk, index, rows, str(out_dir), version))
+            # Keep a bounded number of chunks in flight
+            if len(pending) >= workers * 2:
+                pending = drain(FIRST_COMPLETED)
+        while pending:
+            pending = drain(FIRST_COMPLETED)
+
+    manifest["done_chunks"].sort()
+    manifest["finished_at"] = time.time()
+    save_manifest(manifest_path, manifest)
+    source.close()
+
+    elapsed = time.time() - start
+    print(f"🎯 Re-extraction finished: {manifest['records']} records, {manifest['errors']} errors, "
+          f"{elapsed:.1f}s -> {out_dir}")
+    return manifest
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-extract archived pages with the current extractor")
+    parser.add_argument("--archive", default=str(page_archive.ARCHIVE_DIR))
+    parser.add_argument("--out", default=str(EXTRACT_DIR))
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE)
+    parser.add_argument("--restart", action="store_true")
+    parser.add_argument("--version", action="store_true", help="print the extractor version and exit")
+    args = parser.parse_args()
+
+    if args.version:
+        print(extractor_version())
+    else:
+        reextract(args.archive, args.out, args.workers, args.chunk_size, args.restart)
@@ -0,0 +1,174 @@
+"""
+Pre-aggregated time-series rollups
+ - Counters per minute, hour and day (plus an all-time bucket) for pages,
+   links and detections, broken down by org, threat type, severity and domain
+ - Bumped incrementally at ingest inside the alert engine's transaction
+ - Reads touch only the buckets asked for (primary-key range), so trend
+   charts and metric cards never scan the crawl corpus
+ - Minute and hour buckets are pruned after their retention window
+
+Rebuild the all-time page/link counters from the crawl file (safe to rerun,
+e.g. for pages crawled before rollups existed):
+    python crawler/rollups.py backfill data/crawler_data.json
+"""
+
+import argparse
+import json
+import sqlite3
+import time
+from collections import Counter
+from urllib.parse import urlparse
+
+from settings import STORE_PATH, env_int
+
+# --- CONFIG ---
+GRAINS = {"minute": 60, "hour": 3600, "day": 86400, "all": None}
+RETENTION = {
+    "minute": env_int("ROLLUP_MINUTE_RETENTION_HOURS", 48) * 3600,
+    "hour": env_int("ROLLUP_HOUR_RETENTION_DAYS", 90) * 86400,
+}
+TOTAL = "*"  # dimension/key for the un-split counter
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS rollups (
+        grain TEXT NOT NULL,
+        bucket INTEGER NOT NULL,
+        metric TEXT NOT NULL,
+        dim TEXT NOT NULL,
+        key TEXT NOT NULL,
+        count INTEGER NOT NULL DEFAULT 0,
+        PRIMARY KEY (metric, dim, grain, key, bucket)
+    ) WITHOUT ROWID;
+    CREATE INDEX IF NOT EXISTS idx_rollups_bucket ON rollups (grain, bucket);
+"""
+
+
+def connect(path=STORE_PATH):
+    conn = sqlite3.connect(str(path), timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def bucket_of(ts: float, grain: str) -> int:
+    size = GRAINS[grain]
+    return 0 if size is None else int(ts // size) * size
+
+
+# --- Ingest ---
+def bump(cur, ts: float, metric: str, dims: dict, amount: int = 1):
+    """Add amount to metric at every grain, for the total and each (dim, key) in dims."""
+    if not amount:
+        return
+    pairs = [(TOTAL, TOTAL)] + [(dim, key) for dim, key in dims.items() if key]
+    cur.executemany(
+        "INSERT INTO rollups (grain, bucket, metric, dim, key, count) VALUES (?, ?, ?, ?, ?, ?) "
+        "ON CONFLICT (metric, dim, grain, key, bucket) DO UPDATE SET count = count + excluded.count",
+        [(grain, bucket_of(ts, grain), metric, dim, key, amount) for grain in GRAINS for dim, key in pairs])
+
+
+def add_page(cur, ts: float, record: dict):
+    domain = urlparse(record.get("url", "")).hostname
+    bump(cur, ts, "pages", {"domain": domain})
+    bump(cur, ts, "links", {"domain": domain}, len(record.get("links") or []))
+
+
+def add_detection(cur, ts: float, org: str, threat_type: str, severity: str, url: str):
+    bump(cur, ts, "detections", {
+        "org": org, "type": threat_type, "severity": severity, "domain": urlparse(url or "").hostname,
+    })
+
+
+def prune(cur, now: float = None):
+    """Drop minute/hour buckets older than their retention window."""
+    now = now or time.time()
+    for grain, keep in RETENTION.items():
+        cur.execute("DELETE FROM rollups WHERE grain = ? AND bucket < ?", (grain, bucket_of(now - keep, grain)))
+
+
+# --- Readers (dashboards) ---
+def total(metric: str, dim: str = TOTAL, key: str = TOTAL, conn=None) -> int:
+    conn = conn or connect()
+    row = conn.execute("SELECT count FROM rollups WHERE metric = ? AND dim = ? AND key = ? AND grain = 'all'",
+                       (metric, dim, key)).fetchone()
+    return row[0] if row else 0
+
+
+def window_total(metric: str, seconds: float, dim: str = TOTAL, key: str = TOTAL, grain: str = "hour",
+                 now: float = None, conn=None) -> int:
+    """Sum of the last `seconds` at the given grain.
+
+    Whole buckets only: the bucket holding `now - seconds` is counted in full, so the
+    result may include up to one bucket from before the window, never less than it.
+    """
+    conn = conn or connect()
+    now = now or time.time()
+    row = conn.execute("SELECT COALESCE(SUM(count), 0) FROM rollups WHERE metric = ? AND dim = ? AND key = ? "
+                       "AND grain = ? AND bucket >= ?",
+                       (metric, dim, key, grain, bucket_of(now - seconds, grain))).fetchone()
+    return row[0]
+
+
+def series(metric: str, grain: str = "day", periods: int = 30, dim: str = TOTAL, key: str = TOTAL,
+           now: float = None, conn=None):
+    """[(bucket start, count)] for the last `periods` buckets, zero-filled."""
+    conn = conn or connect()
+    size = GRAINS[grain]
+    last = bucket_of(now or time.time(), grain)
+    first = last - (periods - 1) * size
+    counts = dict(conn.execute(
+        "SELECT bucket, count FROM rollups WHERE metric = ? AND dim = ? AND key = ? AND grain = ? "
+        "AND bucket BETWEEN ? AND ?", (metric, dim, key, grain, first, last)).fetchall())
+    return [(b, counts.get(b, 0)) for b in range(first, last + 1, size)]
+
+
+def breakdown(metric: str, dim: str, limit: int = 20, conn=None):
+    """[(key, all-time count)] for one dimension, largest first."""
+    conn = conn or connect()
+    return conn.execute("SELECT key, count FROM rollups WHERE metric = ? AND dim = ? AND grain = 'all' "
+                        "ORDER BY count DESC LIMIT ?", (metric, dim, limit)).fetchall()
+
+
+def backfill(jsonl_path, conn=None):
+    """Replace the all-time pages/links counters with the counts of a crawl file.
+
+    Rebuilt, not added to: a rerun, or a run after live ingest, never double
+    counts. Records carry no crawl time, so minute/hour/day buckets are left
+    to ingest.
+    """
+    conn = conn or connect()
+    counts = Counter()
+    pages = 0
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            pages += 1
+            domain = urlparse(record.get("url", "")).hostname
+            links = len(record.get("links") or [])
+            for dim, key in [(TOTAL, TOTAL)] + ([("domain", domain)] if domain else []):
+                counts[("pages", dim, key)] += 1
+                counts[("links", dim, key)] += links
+    with conn:
+        conn.execute("DELETE FROM rollups WHERE grain = 'all' AND metric IN ('pages', 'links')")
+        conn.executemany("INSERT INTO rollups (grain, bucket, metric, dim, key, count) VALUES ('all', 0, ?, ?, ?, ?)",
+                         [(metric, dim, key, count) for (metric, dim, key), count in counts.items() if count])
+    return pages
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rollup store maintenance")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+    p = sub.add_parser("backfill", help="rebuild all-time pages/links counters from a crawl file")
+    p.add_argument("path")
+    sub.add_parser("totals")
+    args = parser.parse_args()
+
+    if args.cmd == "backfill":
+        print(f"✅ Rebuilt page/link totals from {backfill(args.path)} pages in {args.path}")
+    else:
+        for metric in ("pages", "links", "detections"):
+            print(f"{metric}: {total(metric)}")
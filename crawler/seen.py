@@ -0,0 +1,279 @@
+"""
+Compact URL-seen sets for large crawls
+ - SeenSet: 64-bit URL fingerprints in an open-addressing hash table backed
+   by mmap (anonymous, or a file so a restarted crawl keeps what it has seen);
+   ~10-20 bytes per URL against 100+ for a set of strings
+ - Exact up to fingerprint collisions: with n URLs the chance that a new URL
+   is wrongly reported as seen is about n / 2**64
+ - ScalableBloom: lossy standalone set at ~2-3 bytes per URL with a
+   configurable false-positive rate; it grows by adding filters. It can also
+   sit in front of a file-backed SeenSet (bloom_front=True) so lookups of
+   new URLs do not touch cold pages of a table larger than RAM
+ - measure(): inserts synthetic URLs and reports bytes/URL and the measured
+   false-positive rate
+
+Usage:
+    python crawler/seen.py --urls 1000000 --probes 200000
+"""
+
+import argparse
+import hashlib
+import math
+import mmap
+import os
+import struct
+import time
+from pathlib import Path
+
+from settings import env_int, env_str
+
+# --- CONFIG ---
+SEEN_PATH = env_str("CRAWLER_SEEN_PATH", "")  # empty: in-memory only
+SEEN_INITIAL_CAPACITY = env_int("CRAWLER_SEEN_CAPACITY", 1 << 16)
+MAX_LOAD = 0.8
+
+MAGIC = int.from_bytes(b"DWSEEN01", "little")
+HEADER_SLOTS = 4  # magic, capacity, count, reserved
+EMPTY = 0
+
+
+def fingerprint(url: str) -> int:
+    """Non-zero 64-bit fingerprint (zero marks an empty slot)."""
+    fp = int.from_bytes(hashlib.blake2b(url.encode("utf-8"), digest_size=8).digest(), "little")
+    return fp or 1
+
+
+class SeenSet:
+    def __init__(self, path=None, capacity=SEEN_INITIAL_CAPACITY, bloom_front=False):
+        self.path = Path(path) if path else None
+        self._file = None
+        if self.path is not None and self.path.exists():
+            self._attach(self.path)
+        else:
+            capacity = 1 << max(4, (capacity - 1).bit_length())
+            self._create(self.path, capacity)
+        self.bloom = None
+        if bloom_front:
+            self.bloom = ScalableBloom(max(1024, len(self)))
+            for fp in self._fingerprints():
+                self.bloom.add_fp(fp)
+
+    # --- Storage ---
+    def _map(self, path, capacity, create):
+        size = (HEADER_SLOTS + capacity) * 8
+        if path is None:
+            return None, mmap.mmap(-1, size)
+        f = open(path, "w+b" if create else "r+b")
+        if create:
+            f.truncate(size)
+        return f, mmap.mmap(f.fileno(), size)
+
+    def _bind(self, f, mm):
+        self._file, self._mm = f, mm
+        raw = memoryview(mm)
+        view = raw.cast("Q")
+        self._hdr = view[:HEADER_SLOTS]
+        self._slots = view[HEADER_SLOTS:]
+        self._views = [self._slots, self._hdr, view, raw]  # released in this order before unmapping
+        self._mask = len(self._slots) - 1
+
+    def _create(self, path, capacity):
+        if path is not None:
+            path.parent.mkdir(parents=True, exist_ok=True)
+        self._bind(*self._map(path, capacity, create=True))
+        self._hdr[0], self._hdr[1], self._hdr[2] = MAGIC, capacity, 0
+
+    def _attach(self, path):
+        with open(path, "rb") as f:
+            magic, capacity = struct.unpack("<QQ", f.read(16))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a seen-set file")
+        self._bind(*self._map(path, capacity, create=False))
+
+    def _release(self):
+        for view in self._views:
+            view.release()
+        self._mm.close()
+        if self._file is not None:
+            self._file.close()
+
+    def _fingerprints(self):
+        return (fp for fp in self._slots if fp != EMPTY)
+
+    def _grow(self):
+        old_fps = list(self._fingerprints())
+        capacity = len(self._slots) * 2
+        tmp = self.path.with_name(self.path.name + ".grow") if self.path is not None else None
+        self._release()
+        self._create(tmp, capacity)
+        for fp in old_fps:
+            self._insert(fp)
+        if tmp is not None:
+            self._mm.flush()
+            os.replace(tmp, self.path)
+
+    # --- Set operations ---
+    def _insert(self, fp) -> bool:
+        slots, mask = self._slots, self._mask
+        i = fp & mask
+        while True:
+            current = slots[i]
+            if current == fp:
+                return False
+            if current == EMPTY:
+                slots[i] = fp
+                self._hdr[2] += 1
+                return True
+            i = (i + 1) & mask
+
+    def _contains(self, fp) -> bool:
+        slots, mask = self._slots, self._mask
+        i = fp & mask
+        while True:
+            current = slots[i]
+            if current == fp:
+                return True
+            if current == EMPTY:
+                return False
+            i = (i + 1) & mask
+
+    def add(self, url: str) -> bool:
+        """Mark url as seen. Returns True if it was new."""
+        fp = fingerprint(url)
+        if self.bloom is not None:
+            if not self.bloom.add_fp(fp) and self._contains(fp):
+                return False
+        if self._hdr[2] + 1 > len(self._slots) * MAX_LOAD:
+            self._grow()
+        return self._insert(fp)
+
+    def __contains__(self, url: str) -> bool:
+        fp = fingerprint(url)
+        if self.bloom is not None and not self.bloom.contains_fp(fp):
+            return False
+        return self._contains(fp)
+
+    def __len__(self):
+        return self._hdr[2]
+
+    @property
+    def nbytes(self) -> int:
+        return (HEADER_SLOTS + len(self._slots)) * 8 + (self.bloom.nbytes if self.bloom else 0)
+
+    def flush(self):
+        self._mm.flush()
+
+    def close(self):
+        if self.path is not None:
+            self.flush()
+        self._release()
+
+
+# --- Bloom filters ---
+class BloomFilter:
+    def __init__(self, capacity: int, error_rate: float):
+        self.capacity = capacity
+        self.nbits = max(64, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.k = max(1, round(self.nbits / capacity * math.log(2)))
+        self.bits = bytearray((self.nbits + 7) // 8)
+        self.count = 0
+
+    def _positions(self, fp):
+        # Kirsch-Mitzenmacher double hashing over the two 32-bit halves
+        h1, h2 = fp & 0xFFFFFFFF, (fp >> 32) | 1
+        return [(h1 + i * h2) % self.nbits for i in range(self.k)]
+
+    def contains_fp(self, fp) -> bool:
+        bits = self.bits
+        return all(bits[p >> 3] & (1 << (p & 7)) for p in self._positions(fp))
+
+    def add_fp(self, fp) -> bool:
+        """Set the bits for fp. Returns True if at least one bit was newly set."""
+        bits = self.bits
+        new = False
+        for p in self._positions(fp):
+            mask = 1 << (p & 7)
+            if not bits[p >> 3] & mask:
+                bits[p >> 3] |= mask
+                new = True
+        if new:
+            self.count += 1
+        return new
+
+
+class ScalableBloom:
+    """Bloom filters that grow by stacking larger, stricter filters (Almeida et al.)."""
+
+    def __init__(self, initial_capacity=SEEN_INITIAL_CAPACITY, error_rate=0.01, growth=2, tightening=0.5):
+        self.error_rate = error_rate
+        self.growth = growth
+        self.tightening = tightening
+        self.filters = [BloomFilter(initial_capacity, error_rate * (1 - tightening))]
+
+    def contains_fp(self, fp) -> bool:
+        return any(f.contains_fp(fp) for f in reversed(self.filters))
+
+    def add_fp(self, fp) -> bool:
+        """Returns True if fp was (probably) new."""
+        if self.contains_fp(fp):
+            return False
+        current = self.filters[-1]
+        if current.count >= current.capacity:
+            rate = self.error_rate * (1 - self.tightening) * self.tightening ** len(self.filters)
+            current = BloomFilter(current.capacity * self.growth, rate)
+            self.filters.append(current)
+        current.add_fp(fp)
+        return True
+
+    def add(self, url: str) -> bool:
+        return self.add_fp(fingerprint(url))
+
+    def __contains__(self, url: str) -> bool:
+        return self.contains_fp(fingerprint(url))
+
+    def __len__(self):
+        return sum(f.count for f in self.filters)
+
+    @property
+    def nbytes(self) -> int:
+        return sum(len(f.bits) for f in self.filters)
+
+
+def open_seen(path=SEEN_PATH, **kw) -> SeenSet:
+    return SeenSet(path or None, **kw)
+
+
+# --- Measurement ---
+def synthetic_urls(n, prefix="a"):
+    host = "duckduckgogg42xjoc72x3sjasowoarfbgcmvfimaftt6twagswzczad.onion"
+    return (f"http://{host}/{prefix}/{i}/page.html?id={i * 7919}" for i in range(n))
+
+
+def measure(structure, n: int, probes: int) -> dict:
+    start = time.perf_counter()
+    for url in synthetic_urls(n):
+        structure.add(url)
+    insert_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    false_positives = sum(url in structure for url in synthetic_urls(probes, prefix="b"))
+    probe_seconds = time.perf_counter() - start
+    return {
+        "urls": n,
+        "bytes_per_url": round(structure.nbytes / n, 2),
+        "inserts_per_sec": round(n / insert_seconds),
+        "lookups_per_sec": round(probes / probe_seconds),
+        "false_positive_rate": false_positives / probes,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Measure seen-set memory and false-positive rate")
+    parser.add_argument("--urls", type=int, default=200000)
+    parser.add_argument("--probes", type=int, default=100000)
+    parser.add_argument("--error-rate", type=float, default=0.01)
+    args = parser.parse_args()
+
+    for name, structure in (("fingerprint set", SeenSet()),
+                            ("fingerprint set + bloom", SeenSet(bloom_front=True)),
+                            ("scalable bloom", ScalableBloom(error_rate=args.error_rate))):
+        print(name, measure(structure, args.urls, args.probes))
@@ -0,0 +1,57 @@
+"""
+Shared runtime settings
+ - Every knob has a default that matches the original hard-coded value
+ - Any knob can be overridden through an environment variable
+ - DATA_DIR resolves to /app/data in the container and ./data in a checkout
+"""
+
+import os
+from pathlib import Path
+
+
+def env_str(name: str, default: str) -> str:
+    return os.environ.get(name, default)
+
+
+def env_int(name: str, default: int) -> int:
+    value = os.environ.get(name)
+    return int(value) if value not in (None, "") else default
+
+
+def env_float(name: str, default: float) -> float:
+    value = os.environ.get(name)
+    return float(value) if value not in (None, "") else default
+
+
+def env_bool(name: str, default: bool = False) -> bool:
+    value = os.environ.get(name)
+    if value in (None, ""):
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+DATA_DIR = Path(env_str("CRAWLER_DATA_DIR", str(REPO_ROOT / "data")))
+# SQLite store shared by indicators, alerts and rollups
+STORE_PATH = Path(env_str("THREAT_STORE_PATH", str(DATA_DIR / "threat_store.sqlite")))
+# Dashboards/panels read JSON metrics written here
+METRICS_DIR = Path(env_str("CRAWLER_METRICS_DIR", str(DATA_DIR / "metrics")))
+
+# === Tor and crawl knobs shared by every crawler entry point ===
+SOCKS_HOST = env_str("TOR_SOCKS_HOST", "127.0.0.1")
+SOCKS_PORT = env_int("TOR_SOCKS_PORT", 9050)
+CONTROL_PORT = env_int("TOR_CONTROL_PORT", 9051)
+
+REQUEST_TIMEOUT = env_float("CRAWLER_REQUEST_TIMEOUT", 30)
+RATE_LIMIT_SECONDS = env_float("CRAWLER_RATE_LIMIT_SECONDS", 5)  # static pacing, when adaptive is off
+JITTER_SECONDS = env_float("CRAWLER_JITTER_SECONDS", 3)
+MAX_RETRIES = env_int("CRAWLER_MAX_RETRIES", 3)
+MAX_PAGES_PER_DOMAIN = env_int("CRAWLER_MAX_PAGES_PER_DOMAIN", 5)
+MAX_CONTENT_BYTES = env_int("CRAWLER_MAX_CONTENT_BYTES", 200 * 1024)
+
+
+def socks_proxies(username: str = None, host: str = None, port: int = None) -> dict:
+    """requests proxies for Tor. A distinct SOCKS username gets its own circuit (IsolateSOCKSAuth)."""
+    auth = f"{username}:x@" if username else ""
+    url = f"socks5h://{auth}{host or SOCKS_HOST}:{port or SOCKS_PORT}"
+    return {"http": url, "https": url}
@@ -0,0 +1,405 @@
+"""
+Output sinks for detections and alerts (SIEM / SOC delivery)
+ - Targets: webhook (gzip JSON POST), syslog (RFC 5424 over UDP or TCP) and
+   file-drop (gzip JSONL batches in a directory another tool picks up)
+ - emit() never blocks: each sink has a bounded queue, and when it is full
+   records spill to that sink's on-disk spool instead of waiting
+ - A batcher per sink groups records (size or age) and hands batches to a
+   small delivery pool; when every delivery slot is busy the batcher stops
+   pulling, the queue fills and new records go to the spool (backpressure)
+ - Failed batches are written to the spool and retried with exponential
+   backoff; the spool survives restarts and is replayed on the next run
+ - Workers may share a spool directory: a batch is claimed with an atomic
+   rename before delivery, so only one process sends it; claims left by a
+   worker that died are released after THREAT_SINK_CLAIM_SECONDS
+
+Configure with a comma-separated list of URIs:
+    THREAT_SINKS="https://soc.example/ingest,syslog+tcp://10.0.0.5:601,file:///app/data/outbox"
+"""
+
+import abc
+import gzip
+import json
+import os
+import queue
+import re
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from urllib.parse import urlparse
+
+import requests
+
+from settings import DATA_DIR, env_float, env_int, env_str
+
+# --- CONFIG ---
+SINKS = env_str("THREAT_SINKS", "")
+SPOOL_DIR = Path(env_str("THREAT_SINK_SPOOL_DIR", str(DATA_DIR / "spool")))
+QUEUE_SIZE = env_int("THREAT_SINK_QUEUE_SIZE", 10000)
+BATCH_SIZE = env_int("THREAT_SINK_BATCH_SIZE", 500)
+BATCH_SECONDS = env_float("THREAT_SINK_BATCH_SECONDS", 2)
+CONCURRENCY = env_int("THREAT_SINK_CONCURRENCY", 4)
+TIMEOUT = env_float("THREAT_SINK_TIMEOUT", 10)
+RETRY_BASE_SECONDS = env_float("THREAT_SINK_RETRY_SECONDS", 5)
+RETRY_MAX_SECONDS = 15 * 60
+SPOOL_MAX_BYTES = env_int("THREAT_SINK_SPOOL_MAX_MB", 512) * 1024 * 1024
+SPOOL_POLL_SECONDS = 1.0
+CLAIM_SECONDS = env_float("THREAT_SINK_CLAIM_SECONDS", 10 * 60)  # a claim this old belongs to a dead worker
+
+
+class PermanentError(Exception):
+    """Delivery can never succeed (e.g. HTTP 400); the batch is dropped, not retried."""
+
+
+# --- Sinks ---
+class Sink(abc.ABC):
+    def __init__(self, uri: str):
+        self.uri = uri
+        self.name = re.sub(r"[^A-Za-z0-9._-]+", "_", uri)[:80]
+
+    @abc.abstractmethod
+    def deliver(self, batch: list):
+        """Send one batch; raise PermanentError to drop it, anything else to retry it later."""
+
+    def close(self):
+        pass
+
+
+class WebhookSink(Sink):
+    """POST {"records": [...]} as gzip-compressed JSON."""
+
+    def __init__(self, uri: str):
+        super().__init__(uri)
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json", "Content-Encoding": "gzip"})
+
+    def deliver(self, batch):
+        body = gzip.compress(json.dumps({"records": batch}, ensure_ascii=False).encode("utf-8"), compresslevel=6)
+        resp = self.session.post(self.uri, data=body, timeout=TIMEOUT)
+        if resp.status_code == 429 or resp.status_code >= 500:
+            raise IOError(f"HTTP {resp.status_code}")
+        if resp.status_code >= 300:
+            raise PermanentError(f"HTTP {resp.status_code}")
+
+    def close(self):
+        self.session.close()
+
+
+class SyslogSink(Sink):
+    """RFC 5424 messages, one per record (syslog has no batch compression)."""
+
+    FACILITY = 16  # local0
+    SEVERITY_CODES = {"CRITICAL": 2, "HIGH": 3, "MEDIUM": 4, "LOW": 5, "INFO": 6}
+
+    def __init__(self, uri: str):
+        super().__init__(uri)
+        parsed = urlparse(uri)
+        self.tcp = parsed.scheme == "syslog+tcp"
+        self.address = (parsed.hostname, parsed.port or (601 if self.tcp else 514))
+        self.hostname = socket.gethostname()
+
+    def format(self, record) -> bytes:
+        pri = self.FACILITY * 8 + self.SEVERITY_CODES.get(record.get("severity"), 6)
+        ts = datetime.fromtimestamp(record.get("ts") or time.time(), timezone.utc).isoformat()
+        msg = json.dumps(record, ensure_ascii=False, separators=(",", ":"))
+        return f"<{pri}>1 {ts} {self.hostname} darkweb-monitor - {record.get('kind', '-')} - {msg}".encode("utf-8")
+
+    def deliver(self, batch):
+        messages = [self.format(record) for record in batch]
+        if self.tcp:
+            # Octet-counting framing (RFC 6587), one connection per batch
+            with socket.create_connection(self.address, timeout=TIMEOUT) as sock:
+                sock.sendall(b"".join(b"%d %s" % (len(m), m) for m in messages))
+        else:
+            with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+                for m in messages:
+                    sock.sendto(m[:8192], self.address)
+
+
+class FileDropSink(Sink):
+    """Each batch becomes one batch-<ns>.jsonl.gz, renamed into place when complete."""
+
+    def __init__(self, uri: str):
+        super().__init__(uri)
+        self.directory = Path(urlparse(uri).path)
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def deliver(self, batch):
+        path = self.directory / f"batch-{time.time_ns()}-{threading.get_ident()}.jsonl.gz"
+        tmp = path.with_name(path.name + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            for record in batch:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+        os.replace(tmp, path)
+
+
+SINK_TYPES = {
+    "http": WebhookSink, "https": WebhookSink,
+    "syslog": SyslogSink, "syslog+udp": SyslogSink, "syslog+tcp": SyslogSink,
+    "file": FileDropSink,
+}
+
+
+def open_sink(uri: str) -> Sink:
+    scheme = urlparse(uri).scheme
+    if scheme not in SINK_TYPES:
+        raise ValueError(f"Unknown sink {uri!r}; expected one of {', '.join(SINK_TYPES)}")
+    return SINK_TYPES[scheme](uri)
+
+
+# --- Spool ---
+class Spool:
+    """Gzip JSON batch files; a file's mtime is the earliest time it may be retried.
+
+    A batch being delivered is renamed to <name>.<token>.claimed; its mtime is then the claim time.
+    """
+
+    def __init__(self, directory: Path, max_bytes=SPOOL_MAX_BYTES):
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.token = uuid.uuid4().hex[:12]  # unique per process, even across containers sharing the volume
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def write(self, batch, attempts=0, due=None) -> Path:
+        with self._lock:
+            self._seq += 1
+            path = self.directory / f"{time.time_ns()}-{self.token}{self._seq}-{attempts}.json.gz"
+        tmp = path.with_name(path.name + ".tmp")
+        with gzip.open(tmp, "wt", encoding="utf-8") as f:
+            json.dump(batch, f, ensure_ascii=False)
+        os.replace(tmp, path)
+        if due is not None:
+            os.utime(path, (due, due))
+        return path
+
+    @staticmethod
+    def read(path: Path):
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.load(f)
+
+    @staticmethod
+    def attempts(path: Path) -> int:
+        return int(path.name.split("-")[2].split(".")[0])
+
+    def due(self, now=None):
+        now = now or time.time()
+        files = sorted(self.directory.glob("*.json.gz"))
+        due = []
+        for p in files:
+            try:
+                if p.stat().st_mtime <= now:
+                    due.append(p)
+            except FileNotFoundError:  # claimed by another worker meanwhile
+                pass
+        return due
+
+    def claim(self, path: Path):
+        """Take a batch for delivery. Returns the claimed path, or None if another worker got it first."""
+        claimed = path.with_name(f"{path.name}.{self.token}.claimed")
+        try:
+            os.rename(path, claimed)
+        except FileNotFoundError:
+            return None
+        os.utime(claimed)
+        return claimed
+
+    def release_stale(self, max_age=CLAIM_SECONDS, now=None) -> int:
+        """Put back batches whose claim is older than max_age. Returns the number released."""
+        cutoff = (now or time.time()) - max_age
+        released = 0
+        for claimed in self.directory.glob("*.claimed"):
+            try:
+                if claimed.stat().st_mtime < cutoff:
+                    os.rename(claimed, claimed.with_name(claimed.name.split(".json.gz")[0] + ".json.gz"))
+                    released += 1
+            except FileNotFoundError:
+                pass
+        return released
+
+    def enforce_limit(self) -> int:
+        """Drop the oldest files beyond max_bytes. Returns the number of records dropped."""
+        files = []
+        for p in sorted(self.directory.glob("*.json.gz")):
+            try:
+                files.append((p, p.stat().st_size))
+            except FileNotFoundError:
+                pass
+        size = sum(n for _, n in files)
+        dropped = 0
+        while files and size > self.max_bytes:
+            oldest, n = files.pop(0)
+            size -= n
+            claimed = self.claim(oldest)  # never drop a batch another worker is sending
+            if claimed is None:
+                continue
+            try:
+                dropped += len(self.read(claimed))
+            except (OSError, ValueError):
+                pass
+            claimed.unlink(missing_ok=True)
+        return dropped
+
+    def pending(self) -> int:
+        """Batches not yet delivered, including the ones being sent right now."""
+        return sum(1 for _ in self.directory.glob("*.json.gz")) + sum(1 for _ in self.directory.glob("*.claimed"))
+
+
+# --- Per-sink channel ---
+class Channel:
+    def __init__(self, sink: Sink, spool_root=SPOOL_DIR, queue_size=QUEUE_SIZE, batch_size=BATCH_SIZE,
+                 batch_seconds=BATCH_SECONDS, concurrency=CONCURRENCY):
+        self.sink = sink
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.spool = Spool(Path(spool_root) / sink.name)
+        self.batch_size = batch_size
+        self.batch_seconds = batch_seconds
+        self.slots = threading.BoundedSemaphore(concurrency)
+        self.pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix=f"sink-{sink.name[:20]}")
+        self.counts = {"queued": 0, "spilled": 0, "delivered": 0, "retried": 0, "failed": 0, "dropped": 0}
+        self._overflow = []
+        self._lock = threading.Lock()
+        self._closing = threading.Event()
+        self._batcher = threading.Thread(target=self._run_batcher, daemon=True)
+        self._retrier = threading.Thread(target=self._run_retrier, daemon=True)
+        self._batcher.start()
+        self._retrier.start()
+
+    def _count(self, key, n=1):
+        with self._lock:
+            self.counts[key] += n
+
+    def offer(self, record):
+        """Queue a record without blocking; spill to the spool when the queue is full."""
+        try:
+            self.queue.put_nowait(record)
+            self._count("queued")
+            return
+        except queue.Full:
+            pass
+        with self._lock:
+            self._overflow.append(record)
+            self.counts["spilled"] += 1
+            spill = self._overflow if len(self._overflow) >= self.batch_size else None
+            if spill is not None:
+                self._overflow = []
+        if spill:
+            self.spool.write(spill)
+
+    def _flush_overflow(self):
+        with self._lock:
+            spill, self._overflow = self._overflow, []
+        if spill:
+            self.spool.write(spill)
+
+    def _run_batcher(self):
+        while not (self._closing.is_set() and self.queue.empty()):
+            try:
+                batch = [self.queue.get(timeout=0.2)]
+            except queue.Empty:
+                continue
+            deadline = time.monotonic() + self.batch_seconds
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self.queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self.slots.acquire()  # waits while every delivery slot is busy
+            self.pool.submit(self._deliver, batch, None)
+
+    def _run_retrier(self):
+        while not self._closing.is_set():
+            self._closing.wait(SPOOL_POLL_SECONDS)
+            self._flush_overflow()
+            dropped = self.spool.enforce_limit()
+            if dropped:
+                self._count("dropped", dropped)
+                print(f"⚠️ Sink {self.sink.name}: spool over limit, dropped {dropped} oldest records")
+            released = self.spool.release_stale()
+            if released:
+                print(f"⚠️ Sink {self.sink.name}: released {released} spooled batches claimed by a dead worker")
+            for path in self.spool.due():
+                if self._closing.is_set():
+                    break
+                if not self.slots.acquire(blocking=False):
+                    break  # deliveries are busy; fresh records go first
+                claimed = self.spool.claim(path)
+                if claimed is None:  # another worker is sending it
+                    self.slots.release()
+                    continue
+                self.pool.submit(self._deliver, None, claimed)
+
+    def _deliver(self, batch, path):
+        try:
+            if path is not None:
+                try:
+                    batch = self.spool.read(path)
+                except (OSError, ValueError):
+                    return  # corrupt; stays claimed until release_stale puts it back
+            try:
+                self.sink.deliver(batch)
+            except PermanentError as e:
+                print(f"❌ Sink {self.sink.name} rejected {len(batch)} records: {e}")
+                self._count("failed", len(batch))
+                if path is not None:
+                    path.unlink(missing_ok=True)
+                return
+            except Exception as e:
+                attempts = (Spool.attempts(path) if path is not None else 0) + 1
+                backoff = min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempts - 1))
+                print(f"⚠️ Sink {self.sink.name} failed ({e}); retrying {len(batch)} records in {backoff:.0f}s")
+                self.spool.write(batch, attempts, due=time.time() + backoff)
+                if path is not None:
+                    path.unlink(missing_ok=True)
+                self._count("retried", len(batch))
+                return
+            if path is not None:
+                path.unlink(missing_ok=True)
+            self._count("delivered", len(batch))
+        finally:
+            self.slots.release()
+
+    def close(self, timeout=30):
+        """Drain the queue, wait for in-flight deliveries; anything left stays spooled."""
+        self._closing.set()
+        self._batcher.join(timeout)
+        self._retrier.join(timeout)
+        self.pool.shutdown(wait=True)
+        self._flush_overflow()
+        self.sink.close()
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts, queue=self.queue.qsize(), spooled_batches=self.spool.pending())
+
+
+# --- Dispatcher ---
+class Dispatcher:
+    def __init__(self, uris, **channel_kw):
+        self.channels = [Channel(open_sink(uri), **channel_kw) for uri in uris]
+
+    def emit(self, kind: str, record: dict):
+        payload = dict(record, kind=kind)
+        for channel in self.channels:
+            channel.offer(payload)
+
+    def stats(self):
+        return {channel.sink.name: channel.stats() for channel in self.channels}
+
+    def close(self, timeout=30):
+        for channel in self.channels:
+            channel.close(timeout)
+
+
+def open_dispatcher(uris=SINKS, **channel_kw):
+    """Dispatcher for a comma-separated URI list, or None when no sink is configured."""
+    uris = [u.strip() for u in uris.split(",") if u.strip()] if isinstance(uris, str) else list(uris)
+    return Dispatcher(uris, **channel_kw) if uris else None
@@ -0,0 +1,191 @@
+"""
+Container entry point: start Tor, wait for a real bootstrap, then crawl
+ - Launches Tor through stem (or attaches to one already listening on the
+   control port) and follows STATUS_CLIENT BOOTSTRAP events instead of a
+   fixed sleep; the crawl starts the moment Tor reports 100%
+ - Warms the first circuits in parallel: one request per ratecontrol circuit
+   (SOCKS username) to a seed, so circuits, descriptors and rendezvous are
+   ready before the crawl's first batch
+ - Keeps Tor's DataDirectory under data/tor so a restarted container reuses
+   the cached consensus and descriptors and bootstraps in seconds
+ - Writes startup timings to data/metrics/startup.json
+
+Usage:
+    python crawler/supervisor.py                    # launch Tor, then crawler.py
+    python crawler/supervisor.py --worker           # extra args go to crawler.py
+"""
+
+import argparse
+import json
+import os
+import re
+import signal
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from pathlib import Path
+
+from stem import SocketError
+from stem.control import Controller, EventType
+import stem.process
+
+from settings import CONTROL_PORT, DATA_DIR, METRICS_DIR, REPO_ROOT, SOCKS_PORT, env_float, env_int, env_str
+import crawler
+import ratecontrol
+
+# --- CONFIG ---
+TORRC_PATH = env_str("TORRC_PATH", "/etc/tor/torrc" if os.path.exists("/etc/tor/torrc") else str(REPO_ROOT / "torrc"))
+TOR_DATA_DIR = env_str("TOR_DATA_DIR", str(DATA_DIR / "tor"))
+BOOTSTRAP_TIMEOUT = env_float("TOR_BOOTSTRAP_TIMEOUT", 300)
+WARMUP_TIMEOUT = env_float("TOR_WARMUP_TIMEOUT", 45)
+WARMUP_CIRCUITS = env_int("TOR_WARMUP_CIRCUITS", ratecontrol.CIRCUITS)
+STARTUP_METRICS_PATH = METRICS_DIR / "startup.json"
+
+BOOTSTRAP_RE = re.compile(r"PROGRESS=(\d+).*?TAG=(\S+)(?:.*?SUMMARY=\"([^\"]*)\")?")
+
+
+class Startup:
+    """Bootstrap milestones and warm-up results, relative to supervisor start."""
+
+    def __init__(self, path=STARTUP_METRICS_PATH):
+        self.path = path
+        self.t0 = time.monotonic()
+        self.report = {"started_at": time.time(), "launched_tor": False, "bootstrap": [], "warmup": {}}
+        self.progress = -1
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+
+    def elapsed(self) -> float:
+        return round(time.monotonic() - self.t0, 3)
+
+    def mark(self, name: str):
+        self.report[f"{name}_s"] = self.elapsed()
+
+    def on_bootstrap(self, progress: int, tag: str, summary: str = ""):
+        with self.lock:
+            if progress <= self.progress:
+                return
+            self.progress = progress
+            self.report["bootstrap"].append({"progress": progress, "tag": tag, "summary": summary,
+                                             "at_s": self.elapsed()})
+        print(f"🧅 Tor bootstrap {progress}% ({tag}) at {self.elapsed():.1f}s")
+        if progress >= 100:
+            self.ready.set()
+
+    def on_status(self, event):
+        # STATUS_CLIENT NOTICE BOOTSTRAP PROGRESS=.. TAG=.. SUMMARY=".."
+        if event.action == "BOOTSTRAP":
+            args = event.arguments
+            self.on_bootstrap(int(args.get("PROGRESS", 0)), args.get("TAG", ""), args.get("SUMMARY", ""))
+
+    def write(self, path=None):
+        path = path or self.path
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        with self.lock:
+            body = json.dumps(self.report, indent=2)
+        tmp.write_text(body, encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def connect(port=CONTROL_PORT):
+    controller = Controller.from_port(port=port)
+    controller.authenticate()
+    return controller
+
+
+def launch_tor(startup: Startup):
+    """Start tor and return as soon as it is running; bootstrap is followed on the control port."""
+    Path(TOR_DATA_DIR).mkdir(parents=True, exist_ok=True, mode=0o700)
+    startup.report["launched_tor"] = True
+    return stem.process.launch_tor(
+        args=["-f", TORRC_PATH, "DataDirectory", TOR_DATA_DIR,
+              "SOCKSPort", str(SOCKS_PORT), "ControlPort", str(CONTROL_PORT)],
+        completion_percent=0,  # return once tor logs "Bootstrapped 0%"
+        init_msg_handler=lambda line: print(f"   tor: {line}") if "[warn]" in line or "[err]" in line else None,
+        take_ownership=True,  # tor exits when this process does
+        timeout=BOOTSTRAP_TIMEOUT,
+    )
+
+
+def wait_for_bootstrap(controller, startup: Startup, timeout=BOOTSTRAP_TIMEOUT) -> bool:
+    controller.add_event_listener(startup.on_status, EventType.STATUS_CLIENT)
+    # Events only report changes: read where bootstrap already is
+    match = BOOTSTRAP_RE.search(controller.get_info("status/bootstrap-phase", ""))
+    if match:
+        startup.on_bootstrap(int(match.group(1)), match.group(2), match.group(3) or "")
+    ready = startup.ready.wait(timeout)
+    controller.remove_event_listener(startup.on_status)
+    return ready
+
+
+def warm_circuits(startup: Startup, seeds, circuits=WARMUP_CIRCUITS, timeout=WARMUP_TIMEOUT):
+    """One HEAD per crawl circuit, all at once; the crawl starts when they finish or time out."""
+    available = ratecontrol.CIRCUITS if ratecontrol.ADAPTIVE else 1  # static pacing uses circuit-0 only
+    names = [f"circuit-{i}" for i in range(max(1, min(circuits, available)))]
+
+    def warm(i, name):
+        url = seeds[i % len(seeds)]
+        start = time.monotonic()
+        try:
+            crawler.session_with_headers(name).head(url, timeout=timeout)
+            ok = True
+        except Exception:
+            ok = False
+        with startup.lock:
+            startup.report["warmup"][name] = {"url": url, "ok": ok, "seconds": round(time.monotonic() - start, 3)}
+
+    pool = ThreadPoolExecutor(max_workers=len(names), thread_name_prefix="warm")
+    wait([pool.submit(warm, i, name) for i, name in enumerate(names)], timeout=timeout)
+    pool.shutdown(wait=False)  # a straggler finishes in the background
+    with startup.lock:
+        warmed = sum(w["ok"] for w in startup.report["warmup"].values())
+    print(f"🔥 {warmed}/{len(names)} circuits warm at {startup.elapsed():.1f}s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Start Tor, wait for bootstrap, then run the crawler")
+    parser.add_argument("--no-launch", action="store_true", help="never start tor; fail if none is running")
+    parser.add_argument("--no-warmup", action="store_true")
+    args, crawler_args = parser.parse_known_args(argv)
+
+    # Workers share data/metrics; each reports its own startup, like ratecontrol-<worker>.json
+    startup = Startup(METRICS_DIR / f"startup-{crawler.WORKER_ID}.json" if "--worker" in crawler_args
+                      else STARTUP_METRICS_PATH)
+    tor_process = None
+    # docker stop sends SIGTERM: unwind normally so tor and the metrics get cleaned up
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+
+    try:
+        try:
+            controller = connect()
+            print(f"📡 Using the Tor already running on control port {CONTROL_PORT}")
+        except SocketError:
+            if args.no_launch:
+                raise SystemExit(f"❌ No Tor on control port {CONTROL_PORT}")
+            tor_process = launch_tor(startup)
+            startup.mark("tor_started")
+            controller = connect()
+
+        if not wait_for_bootstrap(controller, startup):
+            startup.report["error"] = f"bootstrap stalled at {startup.progress}%"
+            startup.write()
+            raise SystemExit(f"❌ Tor did not finish bootstrapping within {BOOTSTRAP_TIMEOUT:.0f}s")
+        controller.close()
+        startup.mark("bootstrapped")
+
+        if not args.no_warmup:
+            warm_circuits(startup, crawler.SEED_URLS)
+        startup.mark("crawl_started")
+        startup.write()
+        print(f"🚀 Crawl starting {startup.elapsed():.1f}s after launch")
+        crawler.main(crawler_args)
+    finally:
+        if tor_process is not None:
+            tor_process.terminate()
+            tor_process.wait()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,333 @@
+"""
+Tor circuit and stream telemetry (stem event listeners)
+ - Subscribes to CIRC, STREAM, BW, CIRC_BW and HS_DESC on the control port
+ - Splits a slow onion fetch into its Tor stages: descriptor fetch
+   (HS_DESC REQUESTED -> RECEIVED), rendezvous circuit build
+   (CIRC LAUNCHED -> BUILT) and stream connect (STREAM NEW -> SUCCEEDED)
+ - Links Tor activity to crawler requests through the SOCKS username each
+   request used (ratecontrol circuit names) and the onion host it targeted
+ - Tracks per-circuit bandwidth and stream failures, and closes circuits whose
+   streams keep failing or connecting slowly so Tor builds fresh ones
+   (rotation); a circuit is only closed once none of its streams are open,
+   and build time alone never triggers it (rendezvous builds are slow)
+ - Writes data/metrics/tor_telemetry.json for the dashboard panel
+
+Usage:
+    python crawler/telemetry.py            # live summary every few seconds
+"""
+
+import argparse
+import json
+import os
+import threading
+import time
+from collections import Counter, OrderedDict, deque
+
+from settings import CONTROL_PORT, METRICS_DIR, env_bool, env_float, env_int
+
+try:
+    import stem
+    from stem.control import Controller, EventType
+except ImportError:  # telemetry is optional; the crawler runs without it
+    stem = None
+
+# --- CONFIG ---
+TELEMETRY_ENABLED = env_bool("CRAWLER_TELEMETRY", True)
+METRICS_PATH = METRICS_DIR / "tor_telemetry.json"
+METRICS_INTERVAL = env_float("CRAWLER_METRICS_INTERVAL", 5)
+SAMPLES = 1000  # latency samples kept per stage
+MAX_CIRCUITS = 2000  # closed circuits are forgotten beyond this
+BW_HISTORY_SECONDS = 300
+ROTATE_MIN_STREAMS = env_int("TOR_ROTATE_MIN_STREAMS", 3)
+ROTATE_FAILURE_RATIO = env_float("TOR_ROTATE_FAILURE_RATIO", 0.5)
+ROTATE_SLOW_CONNECT_SECONDS = env_float("TOR_ROTATE_SLOW_CONNECT_SECONDS", 30)  # counts as a bad stream
+ROTATE_ENABLED = env_bool("TOR_ROTATE_CIRCUITS", True)
+
+
+def percentiles(samples, points=(50, 90, 99)) -> dict:
+    if not samples:
+        return {}
+    ordered = sorted(samples)
+    return {f"p{p}": round(ordered[min(len(ordered) - 1, len(ordered) * p // 100)] * 1000, 1) for p in points}
+
+
+def onion_label(address: str) -> str:
+    """HS_DESC reports v3 addresses without the .onion suffix; streams include it."""
+    address = (address or "").lower()
+    return address[:-len(".onion")] if address.endswith(".onion") else address
+
+
+class TorTelemetry:
+    def __init__(self, controller=None, metrics_path=METRICS_PATH, rotate=ROTATE_ENABLED):
+        self.controller = controller
+        self.metrics_path = metrics_path
+        self.rotate = rotate
+        self._lock = threading.Lock()
+        self._last_metrics = 0.0
+        self.circuits = OrderedDict()  # circ id -> state
+        self.streams = {}  # stream id -> state, while open
+        self.desc_pending = {}  # onion label -> requested at
+        self.build_times = deque(maxlen=SAMPLES)
+        self.rend_build_times = deque(maxlen=SAMPLES)
+        self.desc_times = deque(maxlen=SAMPLES)
+        self.connect_times = deque(maxlen=SAMPLES)
+        self.counts = Counter()
+        self.desc_failures = Counter()  # reason -> count
+        self.desc_failing_hosts = Counter()  # onion label -> failures
+        self.by_username = {}  # SOCKS username -> stream/byte counters
+        self.hosts = OrderedDict()  # onion label -> last stage timings, for linking to requests
+        self.bandwidth = deque(maxlen=BW_HISTORY_SECONDS)  # (ts, read, written) per second
+        self.rotations = deque(maxlen=50)
+
+    # --- Wiring ---
+    def attach(self, controller):
+        self.controller = controller
+        controller.add_event_listener(self.on_circ, EventType.CIRC)
+        controller.add_event_listener(self.on_stream, EventType.STREAM)
+        controller.add_event_listener(self.on_bw, EventType.BW)
+        controller.add_event_listener(self.on_circ_bw, EventType.CIRC_BW)
+        controller.add_event_listener(self.on_hs_desc, EventType.HS_DESC)
+        return self
+
+    def close(self):
+        self.write_metrics()
+        if self.controller is not None:
+            self.controller.close()
+
+    def _user(self, username):
+        return self.by_username.setdefault(username or "-", Counter())
+
+    def _host(self, label):
+        state = self.hosts.get(label)
+        if state is None:
+            state = self.hosts[label] = {}
+            while len(self.hosts) > MAX_CIRCUITS:
+                self.hosts.popitem(last=False)
+        else:
+            self.hosts.move_to_end(label)
+        return state
+
+    # --- Listeners (called on stem's event thread) ---
+    def on_circ(self, event):
+        now = time.time()
+        with self._lock:
+            circ = self.circuits.get(event.id)
+            if circ is None:
+                circ = self.circuits[event.id] = {"launched": now, "read": 0, "written": 0,
+                                                  "streams": 0, "failed_streams": 0, "bad_streams": 0}
+            circ.update(status=event.status, purpose=event.purpose, hs_state=event.hs_state,
+                        socks_username=event.socks_username or circ.get("socks_username"))
+            if event.rend_query:
+                circ["rend_query"] = onion_label(event.rend_query)
+            if event.status == stem.CircStatus.BUILT and "build_s" not in circ:
+                circ["build_s"] = now - circ["launched"]
+                self.counts["circuits_built"] += 1
+                self.build_times.append(circ["build_s"])
+                if event.purpose and event.purpose.startswith("HS_CLIENT"):
+                    self.rend_build_times.append(circ["build_s"])
+                    if circ.get("rend_query"):
+                        self._host(circ["rend_query"])["rend_build_ms"] = round(circ["build_s"] * 1000, 1)
+            elif event.status == stem.CircStatus.FAILED:
+                self.counts["circuits_failed"] += 1
+                self.counts[f"circuit_fail_{event.reason or 'unknown'}"] += 1
+            elif event.status == stem.CircStatus.CLOSED:
+                circ["closed"] = now
+            self._prune_circuits()
+        self._maybe_write()
+
+    def on_stream(self, event):
+        now = time.time()
+        rotate = None
+        with self._lock:
+            stream = self.streams.setdefault(event.id, {"opened": now, "target": onion_label(event.target_address)})
+            if event.circ_id and event.circ_id != "0":
+                stream["circ_id"] = event.circ_id
+            circ = self.circuits.get(stream.get("circ_id"), {})
+            username = circ.get("socks_username")
+            if event.status == stem.StreamStatus.SUCCEEDED:
+                connect_s = now - stream["opened"]
+                self.connect_times.append(connect_s)
+                self.counts["streams_succeeded"] += 1
+                self._user(username)["streams_succeeded"] += 1
+                self._host(stream["target"])["connect_ms"] = round(connect_s * 1000, 1)
+                if circ:
+                    circ["streams"] += 1
+                    circ["bad_streams"] += connect_s > ROTATE_SLOW_CONNECT_SECONDS
+            elif event.status == stem.StreamStatus.FAILED:
+                self.counts["streams_failed"] += 1
+                self.counts[f"stream_fail_{event.reason or 'unknown'}"] += 1
+                self._user(username)["streams_failed"] += 1
+                self._host(stream["target"])["last_failure"] = event.reason or "unknown"
+                if circ:
+                    circ["streams"] += 1
+                    circ["failed_streams"] += 1
+                    circ["bad_streams"] += 1
+            if event.status in (stem.StreamStatus.FAILED, stem.StreamStatus.CLOSED):
+                self.streams.pop(event.id, None)
+                if circ and self._should_rotate(stream["circ_id"], circ):
+                    circ["rotated"] = True
+                    rotate = (stream["circ_id"], f"{circ['bad_streams']}/{circ['streams']} streams failed or slow")
+        if rotate:
+            self._rotate(*rotate)
+
+    def on_bw(self, event):
+        with self._lock:
+            self.bandwidth.append((time.time(), event.read, event.written))
+        self._maybe_write()
+
+    def on_circ_bw(self, event):
+        with self._lock:
+            circ = self.circuits.get(event.id)
+            if circ is None:
+                return
+            circ["read"] += event.read
+            circ["written"] += event.written
+            user = self._user(circ.get("socks_username"))
+            user["read"] += event.read
+            user["written"] += event.written
+
+    def on_hs_desc(self, event):
+        now = time.time()
+        label = onion_label(event.address)
+        with self._lock:
+            if event.action == stem.HSDescAction.REQUESTED:
+                self.desc_pending.setdefault(label, now)
+                self.counts["desc_requested"] += 1
+            elif event.action == stem.HSDescAction.RECEIVED:
+                self.counts["desc_received"] += 1
+                started = self.desc_pending.pop(label, None)
+                if started is not None:
+                    self.desc_times.append(now - started)
+                    self._host(label)["desc_ms"] = round((now - started) * 1000, 1)
+            elif event.action == stem.HSDescAction.FAILED:
+                # Tor asks several HSDirs; a failure only counts per directory tried
+                self.counts["desc_failed"] += 1
+                self.desc_failures[event.reason or "UNKNOWN"] += 1
+                self.desc_failing_hosts[label] += 1
+                self._host(label)["last_failure"] = f"desc {event.reason or 'UNKNOWN'}"
+
+    # --- Rotation ---
+    def _should_rotate(self, circ_id, circ) -> bool:
+        """Enough failed/slow streams, and idle: closing never cuts a fetch in flight."""
+        return (self.rotate and circ["streams"] >= ROTATE_MIN_STREAMS
+                and circ["bad_streams"] / circ["streams"] >= ROTATE_FAILURE_RATIO
+                and circ.get("status") == stem.CircStatus.BUILT and not circ.get("rotated")
+                and not any(s.get("circ_id") == circ_id for s in self.streams.values()))
+
+    def _rotate(self, circ_id, why):
+        """Close a circuit; the next request with the same SOCKS username gets a new one."""
+        with self._lock:
+            circ = self.circuits.get(circ_id, {})
+            decision = {"ts": time.time(), "circuit": circ_id, "socks_username": circ.get("socks_username"),
+                        "purpose": circ.get("purpose"), "reason": why, "closed": False}
+            self.rotations.append(decision)
+        if self.controller is None:
+            return
+        # The control-port call stays outside the lock; the bookkeeping does not
+        try:
+            self.controller.close_circuit(circ_id)
+        except Exception as e:  # already gone, or controller disconnected
+            with self._lock:
+                decision["error"] = str(e)
+            return
+        with self._lock:
+            decision["closed"] = True
+            self.counts["rotations"] += 1
+        print(f"🔄 Closed Tor circuit {circ_id} ({why})")
+
+    def _prune_circuits(self):
+        while len(self.circuits) > MAX_CIRCUITS:
+            oldest_id, oldest = next(iter(self.circuits.items()))
+            if "closed" not in oldest and oldest.get("status") != stem.CircStatus.FAILED:
+                self.circuits.move_to_end(oldest_id)
+                break
+            self.circuits.popitem(last=False)
+
+    # --- Readers ---
+    def request_breakdown(self, host: str) -> dict:
+        """Last Tor-stage timings for an onion host (desc_ms, rend_build_ms, connect_ms, last_failure)."""
+        with self._lock:
+            return dict(self.hosts.get(onion_label(host), {}))
+
+    def summary(self) -> dict:
+        with self._lock:
+            live = [c for c in self.circuits.values() if c.get("status") == stem.CircStatus.BUILT]
+            recent = list(self.bandwidth)[-60:]
+            return {
+                "ts": time.time(),
+                "counts": dict(self.counts),
+                "circuit_build_ms": percentiles(self.build_times),
+                "rend_circuit_build_ms": percentiles(self.rend_build_times),
+                "desc_fetch_ms": percentiles(self.desc_times),
+                "stream_connect_ms": percentiles(self.connect_times),
+                "desc_failures": dict(self.desc_failures.most_common(10)),
+                "desc_failing_hosts": dict(self.desc_failing_hosts.most_common(10)),
+                "live_circuits": len(live),
+                "top_circuits": sorted(
+                    ({"id": cid, "purpose": c.get("purpose"), "socks_username": c.get("socks_username"),
+                      "read": c["read"], "written": c["written"], "streams": c["streams"],
+                      "failed_streams": c["failed_streams"]}
+                     for cid, c in self.circuits.items() if c.get("status") == stem.CircStatus.BUILT),
+                    key=lambda c: c["read"] + c["written"], reverse=True)[:20],
+                "by_socks_username": {u: dict(c) for u, c in self.by_username.items()},
+                "bandwidth_last_60s": {
+                    "read": sum(r for _, r, _w in recent),
+                    "written": sum(w for _, _r, w in recent),
+                    "series": [[round(ts), r, w] for ts, r, w in recent],
+                },
+                "hosts": dict(list(self.hosts.items())[-50:]),
+                "rotations": [dict(r) for r in self.rotations],
+            }
+
+    def _maybe_write(self):
+        now = time.monotonic()
+        with self._lock:
+            if now - self._last_metrics < METRICS_INTERVAL:
+                return
+            self._last_metrics = now
+        self.write_metrics()
+
+    def write_metrics(self, path=None):
+        path = path or self.metrics_path
+        if path is None:
+            return
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+        tmp.write_text(json.dumps(self.summary(), indent=2), encoding="utf-8")
+        os.replace(tmp, path)
+
+
+def start(port=CONTROL_PORT, **kw):
+    """Connect to the control port and subscribe. Returns None (with a warning) when unavailable."""
+    if not TELEMETRY_ENABLED or stem is None:
+        return None
+    try:
+        controller = Controller.from_port(port=port)
+        controller.authenticate()
+    except Exception as e:
+        print(f"⚠️ Tor telemetry disabled (control port {port}): {e}")
+        return None
+    print(f"📡 Tor telemetry listening on control port {port}")
+    return TorTelemetry(**kw).attach(controller)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Live Tor circuit/stream telemetry")
+    parser.add_argument("--port", type=int, default=CONTROL_PORT)
+    parser.add_argument("--interval", type=float, default=METRICS_INTERVAL)
+    args = parser.parse_args()
+
+    telemetry = start(args.port)
+    if telemetry is None:
+        raise SystemExit(1)
+    try:
+        while True:
+            time.sleep(args.interval)
+            s = telemetry.summary()
+            print(f"circuits built={s['counts'].get('circuits_built', 0)} "
+                  f"failed={s['counts'].get('circuits_failed', 0)} build={s['circuit_build_ms']} | "
+                  f"desc={s['desc_fetch_ms']} failed={s['counts'].get('desc_failed', 0)} | "
+                  f"connect={s['stream_connect_ms']} | bw 60s r={s['bandwidth_last_60s']['read']}")
+            telemetry.write_metrics()
+    except KeyboardInterrupt:
+        telemetry.close()
@@ -4,13 +4,12 @@ import requests
 from stem import Signal
 from stem.control import Controller
 
+from settings import SOCKS_HOST, SOCKS_PORT, CONTROL_PORT, socks_proxies
+
 # Tor proxy config
-proxies = {
-    "http": "socks5h://127.0.0.1:9050",
-    "https": "socks5h://127.0.0.1:9050"
-}
+proxies = socks_proxies()
 
-def wait_for_tor(host="127.0.0.1", port=9050, timeout=90):
+def wait_for_tor(host=SOCKS_HOST, port=SOCKS_PORT, timeout=90):
     """Wait for Tor SOCKS port to become available."""
     start = time.time()
     while time.time() - start < timeout:
@@ -37,7 +36,7 @@ def test_tor_connection():
 def check_bootstrap():
     """Check if Tor has finished bootstrapping via Stem."""
     try:
-        with Controller.from_port(port=9051) as controller:
+        with Controller.from_port(port=CONTROL_PORT) as controller:
             controller.authenticate()  # no password needed since CookieAuth is disabled
             status = controller.get_info("status/bootstrap-phase")
             print("📡 Tor bootstrap status:\n", status)
@@ -0,0 +1,122 @@
+"""
+URL canonicalization and pre-fetch classification
+ - canonicalize(): one spelling per page, so http/https twins, host case,
+   default ports, dot segments, escapes of unreserved characters, fragments
+   and query order no longer count as different URLs (or burn the per-domain
+   budget); a trailing slash is kept (/forum/ and /forum resolve relative
+   links differently) and escaped reserved characters (%2F, %3F) stay escaped
+ - Only v3 .onion hosts with a valid checksum survive; typos and v2 names
+   are dropped before they cost a Tor circuit
+ - classify(): "skip" for assets (images, fonts, scripts, feeds, archives),
+   "fetch" for paths that look like HTML, "probe" for anything unclear; a
+   probe is a HEAD request that only lets text/html through to the GET
+"""
+
+import functools
+import posixpath
+import re
+from urllib.parse import parse_qsl, quote, urlencode, urljoin, urlsplit, urlunsplit
+
+import indicators
+
+SKIP, PROBE, FETCH = "skip", "probe", "fetch"
+
+SKIP_EXTENSIONS = {
+    # images
+    ".avif", ".bmp", ".gif", ".ico", ".jpeg", ".jpg", ".png", ".svg", ".tif", ".tiff", ".webp",
+    # styles, scripts, fonts
+    ".css", ".js", ".mjs", ".map", ".eot", ".otf", ".ttf", ".woff", ".woff2",
+    # feeds and data
+    ".xml", ".rss", ".atom", ".json", ".webmanifest",
+    # media
+    ".mp3", ".mp4", ".m4a", ".ogg", ".wav", ".webm", ".avi", ".mkv", ".mov", ".flv",
+    # archives, binaries, documents
+    ".7z", ".bz2", ".gz", ".rar", ".tar", ".tgz", ".xz", ".zip", ".apk", ".bin", ".deb", ".dmg",
+    ".exe", ".iso", ".msi", ".rpm", ".torrent", ".pdf", ".doc", ".docx", ".xls", ".xlsx", ".ppt", ".pptx",
+    ".asc", ".sig", ".gpg",
+}
+FETCH_EXTENSIONS = {"", ".htm", ".html", ".xhtml", ".shtml", ".php", ".asp", ".aspx", ".jsp", ".cgi", ".pl"}
+SKIP_PATH_PREFIXES = ("/static/", "/assets/", "/images/", "/img/", "/fonts/", "/css/", "/js/", "/cdn-cgi/",
+                      "/wp-content/uploads/", "/wp-includes/")
+DROP_QUERY_PARAMS = re.compile(r"^(utm_\w+|fbclid|gclid|ref|sessionid|phpsessid|sid)$", re.IGNORECASE)
+DEFAULT_PORTS = {"http": 80, "https": 443}
+HTML_TYPES = ("text/html", "application/xhtml+xml")
+
+# Onion services are end-to-end encrypted by Tor; http is the canonical spelling
+ONION_SCHEME = "http"
+
+
+@functools.lru_cache(maxsize=65536)
+def valid_host(host: str) -> bool:
+    # A page links to the same few hosts over and over; the checksum is sha3
+    return host.endswith(".onion") and indicators.valid_onion_v3(host)
+
+
+_ESCAPE = re.compile(r"%([0-9A-Fa-f]{2})")
+_LONE_PERCENT = re.compile(r"%(?![0-9A-Fa-f]{2})")
+UNRESERVED = frozenset("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-._~")
+
+
+def _unescape_unreserved(match) -> str:
+    char = chr(int(match.group(1), 16))
+    return char if char in UNRESERVED else "%" + match.group(1).upper()
+
+
+def _normalize_path(path: str) -> str:
+    # Decode only unreserved characters (RFC 3986 6.2.2.2): %2F is not a path separator
+    path = _ESCAPE.sub(_unescape_unreserved, _LONE_PERCENT.sub("%25", path))
+    path = quote(path, safe="/:@!$&'()*+,;=-._~%")
+    if not path:
+        return "/"
+    trailing = path.endswith(("/", "/.", "/.."))
+    normalized = "/" + posixpath.normpath(path).lstrip("/")
+    if trailing and normalized != "/":
+        normalized += "/"
+    return normalized
+
+
+def canonicalize(url: str, base: str = None):
+    """Canonical form of url (resolved against base), or None if it is not a valid v3 onion URL."""
+    try:
+        parts = urlsplit(urljoin(base, url.strip()) if base else url.strip())
+        port = parts.port
+    except ValueError:
+        return None
+    scheme = parts.scheme.lower()
+    host = (parts.hostname or "").rstrip(".")
+    if scheme not in DEFAULT_PORTS or not valid_host(host):
+        return None
+
+    if port == DEFAULT_PORTS[scheme]:
+        port = None
+    scheme = ONION_SCHEME
+    netloc = host if port is None else f"{host}:{port}"
+
+    query = urlencode(sorted((k, v) for k, v in parse_qsl(parts.query, keep_blank_values=True)
+                             if not DROP_QUERY_PARAMS.match(k)))
+    return urlunsplit((scheme, netloc, _normalize_path(parts.path), query, ""))
+
+
+def classify(url: str) -> str:
+    """SKIP, PROBE or FETCH for a canonical URL."""
+    path = urlsplit(url).path.lower()
+    if path.startswith(SKIP_PATH_PREFIXES):
+        return SKIP
+    ext = posixpath.splitext(path)[1]
+    if ext in SKIP_EXTENSIONS:
+        return SKIP
+    if ext in FETCH_EXTENSIONS:
+        return FETCH
+    return PROBE
+
+
+def probe(session, url: str, timeout: float) -> bool:
+    """HEAD the URL; False only when the server says it is not HTML."""
+    try:
+        resp = session.head(url, timeout=timeout, allow_redirects=True)
+    except Exception:
+        return True  # let the GET and its retries decide
+    if resp.status_code in (405, 501):  # HEAD not supported
+        return True
+    content_type = resp.headers.get("Content-Type", "").lower()
+    return resp.status_code < 400 and (not content_type or content_type.startswith(HTML_TYPES))
@@ -1,10 +1,15 @@
 import streamlit as st
 import pandas as pd
 import json
+import sys
 from pathlib import Path
 
+sys.path.insert(0, str(Path(__file__).resolve().parent / "crawler"))
+import api
+from settings import METRICS_DIR
+
 # --- CONFIG ---
-DB_PATH = Path("data") / "crawler_data.json"  # relative path to repo root
+DB_PATH = api.DB_PATH
 
 # Seed URLs used in the crawler
 SEED_URLS = [
@@ -24,43 +29,43 @@ for url in SEED_URLS:
 
 st.markdown("---")
 
-# --- Load Data ---
-def load_crawler_data(path):
-    data = []
-    if path.exists():
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    data.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
-    return data
-
-data = load_crawler_data(DB_PATH)
-
-if data:
-    df = pd.DataFrame(data)
+# --- Load Data (via the query API, crawler/api.py; reads the files directly if it is not running) ---
+PAGE_SIZE = 100
+
+@st.cache_resource
+def api_client():
+    return api.Client()
+
+client = api_client()
+summary = client.get("/pages", limit=1)
 
-    # --- Summary Metrics ---
-    total_pages = len(df)
-    total_links = sum(len(row.get("links", [])) for row in data)
+if summary["total"]:
+    # --- Summary Metrics (rollup counters; `python crawler/rollups.py backfill` covers older crawls) ---
+    total_pages = client.get("/aggregates/total", metric="pages")["count"]
+    total_links = client.get("/aggregates/total", metric="links")["count"]
+    pages_24h = client.get("/aggregates/window", metric="pages", seconds=24 * 3600)["count"]
 
-    col1, col2 = st.columns(2)
+    col1, col2, col3 = st.columns(3)
     col1.metric("📄 Total Pages Crawled", total_pages)
     col2.metric("🔗 Total .onion Links Found", total_links)
+    col3.metric("🕒 Pages Crawled (Last 24h)", pages_24h)
 
     st.markdown("---")
 
-    # --- Crawled Pages Table ---
+    # --- Crawled Pages Table (one page of results at a time) ---
+    pages_count = (summary["total"] + PAGE_SIZE - 1) // PAGE_SIZE
+    page_no = st.number_input(f"Page (of {pages_count})", min_value=1, max_value=pages_count, value=1)
+    data = client.get("/pages", offset=(page_no - 1) * PAGE_SIZE, limit=PAGE_SIZE)["items"]
+    df = pd.DataFrame(data)
     with st.expander("📊 View Crawled Pages Table", expanded=True):
-        st.dataframe(df[["url", "title", "passage"]], use_container_width=True)
+        st.dataframe(df.reindex(columns=["url", "title", "passage"]), use_container_width=True)
 
     st.markdown("---")
 
     # --- Display Discovered Links per Page ---
     st.markdown("### 🔗 Discovered .onion Links by Page")
-    for idx, row in df.iterrows():
-        with st.expander(f"**{row['title']}** - {row['url']}", expanded=False):
+    for row in data:
+        with st.expander(f"**{row.get('title')}** - {row.get('url')}", expanded=False):
             links = row.get("links", [])
             if links:
                 for link in links:
@@ -78,3 +83,43 @@ else:
         2. The `crawler_data.json` file exists in the `data/` folder.
         """
     )
+
+# --- Tor Network Health (written by crawler/telemetry.py) ---
+def load_tor_telemetry():
+    files = sorted(METRICS_DIR.glob("tor_telemetry*.json"), key=lambda p: p.stat().st_mtime)
+    if not files:
+        return None
+    try:
+        return json.loads(files[-1].read_text(encoding="utf-8"))
+    except (OSError, json.JSONDecodeError):
+        return None
+
+tor = load_tor_telemetry()
+if tor:
+    st.markdown("---")
+    st.markdown("### 🧅 Tor Network Health")
+    counts = tor.get("counts", {})
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("⏱️ Circuit build p50 (ms)", tor["circuit_build_ms"].get("p50", "–"))
+    col2.metric("📇 Descriptor fetch p50 (ms)", tor["desc_fetch_ms"].get("p50", "–"))
+    col3.metric("🔌 Stream connect p50 (ms)", tor["stream_connect_ms"].get("p50", "–"))
+    col4.metric("🔄 Circuits rotated", counts.get("rotations", 0))
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("❌ Failed circuits", counts.get("circuits_failed", 0))
+    col2.metric("❌ Failed descriptor fetches", counts.get("desc_failed", 0))
+    col3.metric("❌ Failed streams", counts.get("streams_failed", 0))
+
+    series = tor.get("bandwidth_last_60s", {}).get("series", [])
+    if series:
+        bw = pd.DataFrame(series, columns=["ts", "read", "written"])
+        bw["ts"] = pd.to_datetime(bw["ts"], unit="s")
+        st.line_chart(bw.set_index("ts"))
+
+    with st.expander("Circuits and descriptor failures", expanded=False):
+        if tor.get("top_circuits"):
+            st.dataframe(pd.DataFrame(tor["top_circuits"]), use_container_width=True)
+        if tor.get("desc_failures"):
+            st.write("Descriptor failures by reason:", tor["desc_failures"])
+        if tor.get("rotations"):
+            st.dataframe(pd.DataFrame(tor["rotations"]), use_container_width=True)
@@ -9,24 +9,20 @@ import requests
 from bs4 import BeautifulSoup
 from requests.exceptions import RequestException
 
+import sys
+sys.path.insert(0, str(Path(__file__).resolve().parent / "crawler"))
+from settings import (SOCKS_HOST, SOCKS_PORT, REQUEST_TIMEOUT, MAX_PAGES_PER_DOMAIN,
+                      RATE_LIMIT_SECONDS, JITTER_SECONDS, MAX_RETRIES, socks_proxies)
+import api
+
 # --- CONFIG ---
-DB_PATH = Path("data") / "crawler_data.json"
+DB_PATH = Path(api.DB_PATH)
 SEED_URLS = [
     "http://duckduckgogg42xjoc72x3sjasowoarfbgcmvfimaftt6twagswzczad.onion",
     "http://sanityunhavm6aolhyye4h6kbdlxjmc7zw2y7nadbni6vd43agm7xvid.onion",
 ]
-SOCKS_HOST = "127.0.0.1"
-SOCKS_PORT = 9050
 USER_AGENT = "Mozilla/5.0 (compatible; TorCrawler/0.3)"
-REQUEST_TIMEOUT = 30
-MAX_PAGES_PER_DOMAIN = 5
-RATE_LIMIT_SECONDS = 5
-JITTER_SECONDS = 3
-MAX_RETRIES = 3
-PROXIES = {
-    "http": f"socks5h://{SOCKS_HOST}:{SOCKS_PORT}",
-    "https": f"socks5h://{SOCKS_HOST}:{SOCKS_PORT}",
-}
+PROXIES = socks_proxies()
 
 # --- UTILS ---
 def wait_for_socks(host=SOCKS_HOST, port=SOCKS_PORT, timeout=30):
@@ -131,35 +127,31 @@ if st.button("Run Crawler"):
     crawl(SEED_URLS, status)
     st.success("Crawler finished! Data saved to data/crawler_data.json")
 
-# Load and display crawler results
-def load_crawler_data(path):
-    data = []
-    if path.exists():
-        with open(path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    data.append(json.loads(line))
-                except json.JSONDecodeError:
-                    continue
-    return data
-
-data = load_crawler_data(DB_PATH)
-
-if data:
-    df = pd.DataFrame(data)
-    total_pages = len(df)
-    total_links = sum(len(row.get("links", [])) for row in data)
+# Load and display crawler results (via the query API; falls back to reading DB_PATH directly)
+@st.cache_resource
+def api_client():
+    return api.Client()
+
+client = api_client()
+pages = client.get("/pages", limit=api.MAX_LIMIT)
+
+if pages["total"]:
+    df = pd.DataFrame(pages["items"])
+    total_pages = pages["total"]
+    total_links = client.get("/links", limit=1)["total"]
     col1, col2 = st.columns(2)
     col1.metric("📄 Total Pages Crawled", total_pages)
     col2.metric("🔗 Total .onion Links Found", total_links)
     
     st.markdown("---")
     with st.expander("📊 View Crawled Pages Table", expanded=True):
-        st.dataframe(df[["url", "title", "passage"]], use_container_width=True)
+        st.dataframe(df.reindex(columns=["url", "title", "passage"]), use_container_width=True)
+        if total_pages > len(df):
+            st.caption(f"Showing the first {len(df)} of {total_pages} pages.")
 
     st.markdown("### 🔗 Discovered .onion Links by Page")
-    for idx, row in df.iterrows():
-        with st.expander(f"**{row['title']}** - {row['url']}", expanded=False):
+    for row in pages["items"]:
+        with st.expander(f"**{row.get('title')}** - {row.get('url')}", expanded=False):
             links = row.get("links", [])
             if links:
                 for link in links:
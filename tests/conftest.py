@@ -0,0 +1,9 @@
+import os
+import sys
+import tempfile
+from pathlib import Path
+
+# Same import layout as the root scripts: crawler modules import each other by name
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "crawler"))
+# Module-level defaults (store, metrics, spool) must never point at the repo's data/
+os.environ.setdefault("CRAWLER_DATA_DIR", tempfile.mkdtemp(prefix="dwtm-tests-"))
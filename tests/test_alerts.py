@@ -0,0 +1,92 @@
+import pytest
+
+import alerts
+
+ORG = "Example Corp"
+HOST = f"http://{'a' * 56}.onion"
+OTHER = f"http://{'b' * 56}.onion"
+
+
+class RecordingDispatcher:
+    def __init__(self):
+        self.emitted = []
+
+    def emit(self, kind, record):
+        self.emitted.append((kind, record))
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = alerts.AlertEngine(tmp_path / "store.sqlite", watchlists={ORG: {"terms": ["example corp", "example.com"]}},
+                                dispatcher=RecordingDispatcher())
+    yield engine
+    engine.close()
+
+
+def page(url, title="Forum", passage=""):
+    return {"url": url, "title": title, "passage": passage, "links": []}
+
+
+def rules(raised):
+    return sorted((a["org"], a["rule"], a["severity"]) for a in raised)
+
+
+def test_watchlist_mention_inherits_the_worst_threat(engine):
+    raised = engine.process(page(f"{HOST}/t/1", passage="Example Corp passwords and ransomware builder"), now=1000.0)
+    assert rules(raised) == [("*", "first_seen", "INFO"), ("*", "severity", "CRITICAL"), ("*", "severity", "HIGH"),
+                             (ORG, "watchlist", "CRITICAL")]
+    (mention,) = [a for a in raised if a["org"] == ORG]
+    assert mention["message"].startswith("Malware mentioning example corp")
+    assert alerts.get_key_metrics(ORG, conn=engine.conn, now=1000.0) == (1, 1, 1)
+
+
+def test_plain_mentions_and_low_keywords(engine):
+    raised = engine.process(page(f"{HOST}/about", passage="mirror of example.com support pages"), now=1000.0)
+    assert rules(raised) == [("*", "first_seen", "INFO"), (ORG, "watchlist", "MEDIUM")]
+    assert alerts.get_threat_counts(ORG, conn=engine.conn) == [("Brand Mention", 1)]
+    # LOW and MEDIUM keywords are recorded but stay below ALERT_MIN_SEVERITY
+    assert engine.process(page(f"{HOST}/x", passage="phishing kit and drugs"), now=1001.0) == []
+    assert dict(alerts.get_threat_counts(alerts.GLOBAL_ORG, conn=engine.conn)) == {
+        "Phishing Kit": 1, "Illicit Content": 1}
+
+
+def test_dedupe_key_folds_repeats_per_host_and_threat(engine):
+    engine.process(page(f"{HOST}/1", passage="example corp leak"), now=1000.0)
+    assert engine.process(page(f"{HOST}/2", passage="example corp breach"), now=1100.0) == []  # same host, Data Leak
+    assert rules(engine.process(page(f"{HOST}/3", passage="example corp exploit"), now=1200.0)) == [
+        ("*", "severity", "HIGH"), (ORG, "watchlist", "HIGH")]  # new threat type
+    assert len(engine.process(page(f"{OTHER}/1", passage="example corp leak"), now=1300.0)) == 3  # new host
+    later = 1100.0 + alerts.ALERT_DEDUPE_SECONDS + 1
+    assert rules(engine.process(page(f"{HOST}/4", passage="example corp leak"), now=later)) == [
+        ("*", "severity", "HIGH"), (ORG, "watchlist", "HIGH")]
+
+    folded = alerts.get_alerts(ORG, conn=engine.conn, rule="watchlist", limit=10)
+    assert sorted((a["url"], a["count"]) for a in folded) == [
+        (f"{HOST}/1", 2), (f"{HOST}/3", 1), (f"{HOST}/4", 1), (f"{OTHER}/1", 1)]
+
+
+def test_first_seen_fires_once_per_host(engine):
+    for i, now in enumerate((1000.0, 1000.0 + 2 * alerts.ALERT_DEDUPE_SECONDS)):
+        engine.process(page(f"{HOST}/{i}"), now=now)
+    engine.process(page(f"{OTHER}/"), now=1010.0)
+    found = alerts.get_alerts(alerts.GLOBAL_ORG, conn=engine.conn, rule="first_seen")
+    assert sorted((a["url"], a["count"]) for a in found) == [(f"{HOST}/0", 1), (f"{OTHER}/", 1)]
+
+
+def test_rate_spike_after_warmup(engine, monkeypatch):
+    monkeypatch.setattr(alerts, "SPIKE_WARMUP_MINUTES", 3)
+    for minute in range(5):  # baseline: one detection a minute
+        assert all(a["rule"] != "rate_spike" for a in
+                   engine.process(page(f"{HOST}/{minute}", passage="example corp"), now=60000.0 + minute * 60))
+    raised = []
+    for i in range(6):
+        raised += engine.process(page(f"{HOST}/burst{i}", passage="example corp"), now=60000.0 + 5 * 60 + i)
+    spikes = [a for a in raised if a["rule"] == "rate_spike"]
+    assert [(a["org"], a["severity"]) for a in spikes] == [(ORG, "HIGH")]
+
+
+def test_detections_and_alerts_are_forwarded(engine):
+    raised = engine.process(page(f"{HOST}/", passage="example corp passwords"), now=1000.0)
+    kinds = [kind for kind, _record in engine.dispatcher.emitted]
+    assert kinds.count("alert") == len(raised) and kinds.count("detection") == 2
+    assert all(r["url"] == f"{HOST}/" for kind, r in engine.dispatcher.emitted if kind == "detection")
@@ -0,0 +1,129 @@
+import json
+
+import pytest
+import requests
+
+import api
+
+
+def append(path, pages):
+    with open(path, "a", encoding="utf-8") as f:
+        for url, title, links in pages:
+            f.write(json.dumps({"url": url, "title": title, "links": links}) + "\n")
+
+
+@pytest.fixture
+def crawl(tmp_path):
+    path = tmp_path / "crawler_data.json"
+    append(path, [
+        ("http://a.onion/", "Market index", ["http://a.onion/1", "http://a.onion/2"]),
+        ("http://b.onion/", "Forum", []),
+        ("http://a.onion/1", "Market listing", ["http://b.onion/"]),
+        ("http://c.onion/", "Paste", ["http://a.onion/", "http://b.onion/", "http://c.onion/x"]),
+    ])
+    return path
+
+
+@pytest.fixture
+def service(crawl, tmp_path):
+    return api.QueryService(db_path=str(crawl), store_path=tmp_path / "store.sqlite")
+
+
+def get(service, route, **params):
+    _etag, body = service.query(route, {k: str(v) for k, v in params.items()})
+    return json.loads(body)
+
+
+def test_log_indexes_only_complete_lines(crawl):
+    log = api.PageLog(str(crawl))
+    log.refresh()
+    assert (len(log.starts), log.links) == (4, 6)
+    with open(crawl, "a", encoding="utf-8") as f:
+        f.write('{"url": "http://d.onion/", "links": ["x"]')  # writer mid-line
+    log.refresh()
+    assert (len(log.starts), log.links) == (4, 6)
+    with open(crawl, "a", encoding="utf-8") as f:
+        f.write("}\n")
+    log.refresh()
+    starts, _link_ends, hosts, count = log.snapshot()
+    assert (count, log.links, hosts[-1]) == (5, 7, "d.onion")
+    assert [p["url"] for p in log.read(starts, [4, 0])] == ["http://d.onion/", "http://a.onion/"]
+
+
+def test_log_starts_over_when_the_file_is_rewritten(crawl):
+    log = api.PageLog(str(crawl))
+    log.refresh()
+    crawl.write_text("")
+    append(crawl, [("http://z.onion/", "Z", [])])
+    log.refresh()
+    starts, _link_ends, hosts, count = log.snapshot()
+    assert (count, log.links, hosts) == (1, 0, ["z.onion"])
+
+
+def test_pages_paginate_and_filter(service):
+    page = get(service, "/pages", offset=1, limit=2)
+    assert page["total"] == 4
+    assert [p["url"] for p in page["items"]] == ["http://b.onion/", "http://a.onion/1"]
+    assert [p["url"] for p in get(service, "/pages", domain="a.onion")["items"]] == ["http://a.onion/", "http://a.onion/1"]
+    market = get(service, "/pages", q="market", offset=1)
+    assert (market["total"], [p["url"] for p in market["items"]]) == (2, ["http://a.onion/1"])
+    assert get(service, "/pages", offset=10)["items"] == []
+
+
+def test_links_paginate_across_pages(service):
+    everything = get(service, "/links", limit=100)["items"]
+    assert len(everything) == 6
+    for offset in range(7):
+        for limit in (1, 2, 4):
+            page = get(service, "/links", offset=offset, limit=limit)
+            assert page["total"] == 6
+            assert page["items"] == everything[offset:offset + limit]
+
+
+def test_links_filter_by_source_and_domain(service):
+    page = get(service, "/links", source="http://c.onion/", offset=1)
+    assert page["total"] == 3
+    assert [l["target"] for l in page["items"]] == ["http://b.onion/", "http://c.onion/x"]
+    page = get(service, "/links", domain="a.onion", offset=1, limit=2)
+    assert page["total"] == 3
+    assert [l["target"] for l in page["items"]] == ["http://a.onion/2", "http://b.onion/"]
+    assert get(service, "/links", source="http://c.onion/", domain="a.onion")["total"] == 0
+
+
+def test_cache_is_dropped_when_the_crawl_grows(service, crawl):
+    first = service.query("/pages", {})
+    assert service.query("/pages", {}) == first
+    assert (service.hits, service.misses) == (1, 1)
+    append(crawl, [("http://d.onion/", "New", [])])
+    etag, body = service.query("/pages", {})
+    assert etag != first[0]
+    assert json.loads(body)["total"] == 5
+    assert service.misses == 2
+
+
+def test_matching_etag_skips_the_query(service):
+    etag, _body = service.query("/pages", {"limit": "1"})
+    misses = service.misses
+    assert service.query("/pages", {"limit": "1"}, if_none_match=etag) == (etag, None)
+    assert service.misses == misses
+    assert service.query("/pages", {"limit": "2"}, if_none_match=etag)[1] is not None
+
+
+def test_http_revalidation(service, crawl):
+    server = api.serve("127.0.0.1", 0, service)
+    try:
+        session = requests.Session()
+        session.trust_env = False
+        url = f"http://127.0.0.1:{server.server_address[1]}/pages?limit=1"
+        resp = session.get(url)
+        assert resp.status_code == 200 and resp.json()["total"] == 4
+        etag = resp.headers["ETag"]
+        assert session.get(url, headers={"If-None-Match": etag}).status_code == 304
+        append(crawl, [("http://d.onion/", "New", [])])
+        resp = session.get(url, headers={"If-None-Match": etag})
+        assert resp.status_code == 200 and resp.headers["ETag"] != etag
+        assert session.get(url.replace("/pages", "/nope")).status_code == 404
+        assert session.get(url + "&offset=-1").status_code == 400
+    finally:
+        server.shutdown()
+        server.server_close()
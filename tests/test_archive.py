@@ -0,0 +1,84 @@
+import threading
+
+import pytest
+
+import archive
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = archive.Archive(tmp_path)
+    yield store
+    store.close()
+
+
+def page(n):
+    return (f"<html><head><title>Market {n}</title></head><body>" + "listing " * 50 + f"{n}</body></html>").encode()
+
+
+def test_round_trip(store):
+    bodies = [page(1), b"", bytes(range(256)) * 4, "ünïcode".encode()]
+    digests = [store.put(f"http://a.onion/{i}", body) for i, body in enumerate(bodies)]
+    assert [store.get(d) for d in digests] == bodies
+    with pytest.raises(KeyError):
+        store.get("0" * 64)
+
+
+def test_identical_bodies_are_stored_once(store, tmp_path):
+    first = store.put("http://a.onion/", page(1), fetched_at=1.0)
+    assert store.put("http://b.onion/mirror", page(1), fetched_at=2.0) == first
+    store.put("http://a.onion/", page(2), fetched_at=3.0)
+    stats = store.stats()
+    assert (stats["blobs"], stats["fetches"], stats["urls"]) == (2, 3, 2)
+    assert [h for h, _status, _ts in store.history("http://a.onion/")] == [first, store.latest("http://a.onion/")[0]]
+    size = (tmp_path / "seg-000001.pack").stat().st_size
+    store.put("http://c.onion/", page(1))
+    assert (tmp_path / "seg-000001.pack").stat().st_size == size
+
+
+def test_concurrent_puts_of_one_body_store_it_once(store):
+    barrier = threading.Barrier(8)
+
+    def put(i):
+        barrier.wait()
+        store.put(f"http://a.onion/{i}", page(7))
+
+    threads = [threading.Thread(target=put, args=(i,)) for i in range(8)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert (store.stats()["blobs"], store.stats()["fetches"]) == (1, 8)
+
+
+def test_segments_roll_over_and_survive_reopening(monkeypatch, tmp_path):
+    monkeypatch.setattr(archive, "SEGMENT_BYTES", 300)
+    store = archive.Archive(tmp_path, level=1)
+    digests = [store.put(f"http://a.onion/{i}", bytes(range(i, i + 200))) for i in range(4)]
+    store.close()
+    assert sorted(p.name for p in tmp_path.glob("seg-*.pack")) == [f"seg-00000{i}.pack" for i in (1, 2)]
+
+    reopened = archive.Archive(tmp_path, level=1)
+    digests.append(reopened.put("http://a.onion/4", bytes(range(4, 204))))
+    assert [reopened.get(d) for d in digests] == [bytes(range(i, i + 200)) for i in range(5)]
+    assert len(list(tmp_path.glob("seg-*.pack"))) == 3
+    reopened.close()
+
+
+def test_dictionary_compressed_pages_read_back(monkeypatch, tmp_path):
+    pytest.importorskip("zstandard")
+    monkeypatch.setattr(archive, "DICT_TRAIN_SAMPLES", 50)
+    store = archive.Archive(tmp_path)
+    digests = [store.put(f"http://a.onion/{i}", page(i)) for i in range(80)]
+    assert store.dict_id
+    assert [store.get(d) for d in digests] == [page(i) for i in range(80)]
+    store.close()
+
+
+def test_corruption_is_detected(store, tmp_path):
+    digest = store.put("http://a.onion/", page(1))
+    data = bytearray((tmp_path / "seg-000001.pack").read_bytes())
+    data[0] ^= 0xFF
+    (tmp_path / "seg-000001.pack").write_bytes(bytes(data))
+    with pytest.raises(ValueError):
+        store.get(digest)
@@ -0,0 +1,62 @@
+import sys
+from pathlib import Path
+
+import requests
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "benchmarks"))
+import fake_onion
+import indicators
+import run_bench
+import socks_stub
+
+
+def test_fake_web_is_deterministic_and_uses_valid_onions():
+    web = fake_onion.OnionWeb(sites=5, pages_per_site=4, mirrors=2)
+    same = fake_onion.OnionWeb(sites=5, pages_per_site=4, mirrors=2)
+    assert web.hosts == same.hosts
+    assert list(web.pages()) == list(same.pages())
+    assert fake_onion.OnionWeb(sites=5, seed=1).hosts != web.hosts
+    assert all(indicators.valid_onion_v3(h) for names in web.hosts for h in names)
+    assert len(list(web.pages(limit=7))) == 7
+    assert [web.parse_path(web.page_path(p)) for p in range(3)] == [0, 1, 2]
+    assert web.parse_path("/static/1.png") == -1
+
+
+def test_pages_are_served_through_the_socks_stand_in():
+    web = fake_onion.OnionWeb(sites=2, pages_per_site=3)
+    http_server = fake_onion.serve(web)
+    socks = socks_stub.serve(http_server.server_address)
+    try:
+        session = requests.Session()
+        session.trust_env = False
+        proxy = f"socks5h://circuit-1:x@127.0.0.1:{socks.server_address[1]}"
+        session.proxies = {"http": proxy}
+        host = web.hosts[1][0]
+        resp = session.get(f"http://{host}/page/2.html", timeout=5)
+        assert resp.status_code == 200 and resp.text == web.render(1, 2)
+        assert session.get(f"http://{host}/page/9.html", timeout=5).status_code == 404
+        assert session.get(f"http://{'a' * 56}.onion/", timeout=5).status_code == 404
+        assert socks.usernames == {"circuit-1": 2}  # connections: keep-alive reuses one per host
+        assert host in socks.hosts
+    finally:
+        socks.shutdown()
+        http_server.shutdown()
+
+
+def test_failure_rate_is_seeded_per_attempt():
+    web = fake_onion.OnionWeb(sites=1, failure_rate=0.5)
+    again = fake_onion.OnionWeb(sites=1, failure_rate=0.5)
+    host = web.hosts[0][0]
+    outcomes = [web.should_fail(host, "/") for _ in range(20)]
+    assert outcomes == [again.should_fail(host, "/") for _ in range(20)]
+    assert any(outcomes) and not all(outcomes)
+
+
+def test_compare_flags_throughput_and_memory_regressions():
+    def result(rate, mem):
+        return {"scenarios": {"parse": {"lxml": {"pages_per_sec": rate, "peak_mem_bytes": mem}}}}
+
+    assert run_bench.compare(result(90, 110), result(100, 100), 0.2) == []
+    regressions = run_bench.compare(result(70, 130), result(100, 100), 0.2)
+    assert [r.split(":")[0] for r in regressions] == ["parse.lxml", "parse.lxml"]
+    assert run_bench.compare(result(1, 1), {"scenarios": {}}, 0.2) == []
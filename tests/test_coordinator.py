@@ -0,0 +1,116 @@
+import pytest
+
+import coordinator
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def frontier(request, tmp_path):
+    uri = "memory://" if request.param == "memory" else f"sqlite:///{tmp_path / 'frontier.sqlite'}"
+    f = coordinator.open_frontier(uri, max_pages_per_domain=2)
+    yield f
+    f.close()
+
+
+def urls(domain, n):
+    return [f"http://{domain}.onion/{i}" for i in range(n)]
+
+
+def test_claim_leases_each_url_once(frontier):
+    frontier.register("w1")
+    assert frontier.add_urls(urls("a", 2) + urls("b", 2), source="seed") == 4
+    assert frontier.add_urls(urls("a", 2)) == 0
+    first = frontier.claim("w1", 10)
+    assert sorted(u for u, _, _ in first) == sorted(urls("a", 2) + urls("b", 2))
+    assert frontier.claim("w1", 10) == []
+    assert frontier.outstanding() == 4
+
+
+def test_expired_lease_is_reclaimed_until_max_attempts(frontier, monkeypatch):
+    frontier.register("w1")
+    frontier.add_urls(urls("a", 1))
+    monkeypatch.setattr(coordinator, "LEASE_SECONDS", -1)  # every lease is already expired
+    for _ in range(coordinator.MAX_ATTEMPTS):
+        assert [u for u, _, _ in frontier.claim("w1", 10)] == urls("a", 1)
+    assert frontier.claim("w1", 10) == []
+
+
+def test_heartbeat_renews_leases(frontier, monkeypatch):
+    frontier.register("w1")
+    frontier.add_urls(urls("a", 1))
+    monkeypatch.setattr(coordinator, "LEASE_SECONDS", -1)
+    assert frontier.claim("w1", 10)
+    monkeypatch.setattr(coordinator, "LEASE_SECONDS", 120)
+    frontier.heartbeat("w1")  # a slow fetch keeps its lease
+    assert frontier.claim("w1", 10) == []
+
+
+def test_unregister_releases_leases(frontier):
+    frontier.register("w1")
+    frontier.add_urls(urls("a", 1))
+    assert frontier.claim("w1", 10)
+    frontier.unregister("w1")
+    frontier.register("w2")
+    assert [u for u, _, _ in frontier.claim("w2", 10)] == urls("a", 1)
+
+
+def test_domains_are_sharded_across_workers(frontier):
+    domains = [f"site{i}" for i in range(20)]
+    for w in ("w1", "w2"):
+        frontier.register(w)
+    frontier.add_urls([u for d in domains for u in urls(d, 1)])
+    got = {w: {d for _, d, _ in frontier.claim(w, 100)} for w in ("w1", "w2")}
+    assert got["w1"] and got["w2"]
+    assert not got["w1"] & got["w2"]
+    assert got["w1"] | got["w2"] == {f"{d}.onion" for d in domains}
+
+
+def test_claim_returns_provenance(frontier):
+    frontier.register("w1")
+    frontier.add_urls(urls("a", 1), source="search:ahmia:leak")
+    assert frontier.claim("w1", 10) == [(urls("a", 1)[0], "a.onion", "search:ahmia:leak")]
+
+
+def test_claim_never_leases_past_the_domain_budget(frontier):
+    frontier.register("w1")
+    frontier.add_urls(urls("a", 6) + urls("b", 1))
+    first = frontier.claim("w1", 10)
+    assert sum(d == "a.onion" for _, d, _ in first) == 2  # budget 2, nothing done yet
+    assert any(d == "b.onion" for _, d, _ in first)
+    assert frontier.claim("w1", 10) == []  # live leases use up the rest
+    frontier.complete(first[0][0], "w1", ok=False)  # a failed page does not spend budget
+    assert [d for _, d, _ in frontier.claim("w1", 10)] == [first[0][1]]
+
+
+def test_exhausted_leases_are_not_outstanding(frontier, monkeypatch):
+    frontier.register("w1")
+    frontier.add_urls(urls("a", 1))
+    monkeypatch.setattr(coordinator, "LEASE_SECONDS", -1)  # the worker "crashes" on every attempt
+    for _ in range(coordinator.MAX_ATTEMPTS):
+        assert frontier.claim("w1", 10)
+    assert frontier.outstanding() == 0  # other workers may exit
+    assert frontier.claim("w1", 10) == []
+    assert frontier.stats().get("failed") == 1
+
+
+def test_domain_budget_skips_pending_urls(frontier):
+    frontier.register("w1")
+    frontier.add_urls(urls("a", 4))
+    claimed = frontier.claim("w1", 2)
+    for url, _, _ in claimed:
+        frontier.complete(url, "w1")
+    assert frontier.claim("w1", 10) == []
+    assert frontier.stats()["skipped"] == 2
+    assert frontier.add_urls(["http://a.onion/late"]) == 0
+
+
+def test_frontier_is_abstract():
+    with pytest.raises(TypeError):
+        coordinator.Frontier()
+
+
+def test_sqlite_uri_paths(tmp_path):
+    f = coordinator.open_frontier(f"sqlite:///{tmp_path / 'abs.sqlite'}")
+    assert f.path == str(tmp_path / "abs.sqlite")
+    f.close()
+    with pytest.raises(ValueError):
+        coordinator.open_frontier("redis://localhost")
@@ -0,0 +1,69 @@
+import coordinator
+import discovery
+
+ENGINE = "http://juhanurmihxlp77nkq76byazcldy2hlmovfu2epvl5ankdibsot4csyd.onion"
+OTHER_ENGINE = "http://haystak5njsmn2hqkewecpaxetahtwhsbsa64jom2k22z5afxhnpxfid.onion"
+A = "http://duckduckgogg42xjoc72x3sjasowoarfbgcmvfimaftt6twagswzczad.onion"
+B = "http://sanityunhavm6aolhyye4h6kbdlxjmc7zw2y7nadbni6vd43agm7xvid.onion"
+
+
+def test_build_queries():
+    watchlists = {"Example Corp": {"terms": ["Example Corp", "example.com", "LEAK"]}, "Other": {}}
+    assert discovery.build_queries(["leak", "porn", " exploit ", "child", ""], watchlists) == [
+        "leak", "exploit", '"example corp"', "example.com"]
+    assert not set(discovery.build_queries(watchlists={})) & discovery.EXCLUDED_QUERIES
+
+
+def test_result_urls_unwraps_redirectors_and_skips_the_engine():
+    html = f"""
+        <a href="/search/?q=next">next page</a>
+        <a href="{ENGINE}/about">about</a>
+        <a href="/search/redirect?search_term=leak&redirect_url={A}/forum/">A</a>
+        <a href="{B.upper()}/#top">B</a>
+        <a href="{A}/forum/">A again</a>
+        <a href="{B}/logo.png">asset</a>
+        <a href="https://clearnet.example/">clearnet</a>
+    """
+    assert discovery.result_urls(html, f"{ENGINE}/search/?q=leak") == [f"{A}/forum/", f"{B}/"]
+
+
+def test_discover_ranks_by_hits_and_caches_results(tmp_path):
+    engines = {"one": ENGINE + "/s?q={query}", "two": OTHER_ENGINE + "/?q={query}"}
+    pages = {"leak": f'<a href="{A}/">a</a><a href="{B}/">b</a>', "exploit": f'<a href="{B}/">b</a>'}
+    fetched = []
+
+    def fetch(url):
+        fetched.append(url)
+        return pages[url.rsplit("=", 1)[1]]
+
+    cache = discovery.ResultCache(tmp_path / "store.sqlite", ttl=60)
+    found = discovery.discover(fetch, ["leak", "exploit"], engines, cache, now=1000.0)
+    assert list(found) == [f"{B}/", f"{A}/"]
+    assert found[f"{A}/"] == ["search:one:leak", "search:two:leak"]
+    assert len(fetched) == 4
+
+    assert discovery.discover(fetch, ["leak", "exploit"], engines, cache, now=1030.0) == found
+    assert len(fetched) == 4  # all from cache
+    discovery.discover(fetch, ["leak"], engines, cache, now=1100.0)
+    assert len(fetched) == 6  # expired
+    hits = dict(cache.conn.execute("SELECT url, hits FROM discoveries").fetchall())
+    assert hits == {f"{A}/": 3, f"{B}/": 3}
+    cache.close()
+
+
+def test_failed_queries_are_not_cached(tmp_path):
+    cache = discovery.ResultCache(tmp_path / "store.sqlite")
+    engines = {"one": ENGINE + "/s?q={query}"}
+    assert discovery.discover(lambda url: None, ["leak"], engines, cache, now=1000.0) == {}
+    assert cache.get("one", "leak", 1000.0) is None
+    cache.close()
+
+
+def test_seed_frontier_keeps_the_first_source():
+    frontier = coordinator.open_frontier("memory://")
+    frontier.register("w1")
+    results = {f"{A}/": ["search:one:leak", "search:two:leak"], f"{B}/": ["search:two:exploit"]}
+    assert discovery.seed_frontier(frontier, results) == 2
+    claimed = frontier.claim("w1", 10)
+    assert sorted((url, source) for url, _domain, source in claimed) == [
+        (f"{A}/", "search:one:leak"), (f"{B}/", "search:two:exploit")]
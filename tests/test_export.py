@@ -0,0 +1,66 @@
+import csv
+import os
+
+import pytest
+
+import alerts
+import export
+
+
+def add(conn, ts, org="Example Corp", severity="HIGH", threat_type="Credential Leak"):
+    conn.execute("INSERT INTO detections (ts, org, threat_type, severity, description, url) VALUES (?, ?, ?, ?, ?, ?)",
+                 (ts, org, threat_type, severity, f"at {ts}", f"http://{org[0].lower()}.onion/"))
+    conn.commit()
+
+
+@pytest.fixture
+def conn(tmp_path):
+    conn = alerts.connect(tmp_path / "store.sqlite")
+    for ts in (300.0, 100.0, 200.0, 200.0, 400.0):  # a tie on ts, inserted out of order
+        add(conn, ts)
+    add(conn, 250.0, org="Other Org", severity="LOW")
+    return conn
+
+
+def test_iter_detections_pages_by_ts_then_id(conn):
+    rows = list(export.iter_detections(conn, chunk_rows=2))
+    assert [r[0] for r in rows] == [100.0, 200.0, 200.0, 250.0, 300.0, 400.0]
+    assert rows == list(export.iter_detections(conn, chunk_rows=1000))
+
+
+def test_iter_detections_filters(conn):
+    rows = export.iter_detections(conn, chunk_rows=2, org="Example Corp", since=200.0, until=400.0)
+    assert [r[0] for r in rows] == [200.0, 200.0, 300.0]
+    assert [r[0] for r in export.iter_detections(conn, min_severity="HIGH")] == [100.0, 200.0, 200.0, 300.0, 400.0]
+
+
+def test_cache_key_moves_with_matching_detections(conn):
+    key = export.cache_key(conn, "csv", org="Example Corp")
+    assert export.cache_key(conn, "csv", org="Example Corp") == key
+    assert export.cache_key(conn, "jsonl", org="Example Corp") != key
+    assert export.cache_key(conn, "csv", org="Other Org") != key
+    add(conn, 500.0, org="Other Org")
+    assert export.cache_key(conn, "csv", org="Example Corp") == key
+    add(conn, 500.0)
+    assert export.cache_key(conn, "csv", org="Example Corp") != key
+
+
+def test_export_is_cached_until_a_detection_lands(conn, tmp_path):
+    path = export.export("csv", "Example Corp", conn=conn, out_dir=tmp_path / "exports")
+    with open(path, newline="", encoding="utf-8") as f:
+        rows = list(csv.reader(f))
+    assert rows[0] == export.COLUMNS and len(rows) == 6
+    assert export.export("csv", "Example Corp", conn=conn, out_dir=tmp_path / "exports") == path
+    add(conn, 500.0)
+    assert export.export("csv", "Example Corp", conn=conn, out_dir=tmp_path / "exports") != path
+
+
+def test_evict_keeps_the_most_recently_used(tmp_path):
+    for i, name in enumerate(["csv-a.csv", "jsonl-b.jsonl", "summary-c.txt", "csv-d.csv"]):
+        path = tmp_path / name
+        path.write_text("x")
+        os.utime(path, (1000 + i, 1000 + i))
+    os.utime(tmp_path / "csv-a.csv")  # a cache hit touches the file
+    (tmp_path / "csv-e.csv.1.2.tmp").write_text("x")  # a writer still at work
+    export.evict(tmp_path, keep=2)
+    assert sorted(p.name for p in tmp_path.iterdir()) == ["csv-a.csv", "csv-d.csv", "csv-e.csv.1.2.tmp"]
@@ -0,0 +1,119 @@
+import hashlib
+
+import pytest
+
+import indicators
+
+ONION = "duckduckgogg42xjoc72x3sjasowoarfbgcmvfimaftt6twagswzczad"
+BTC = "1A1zP1eP5QGefi2DMPTfTL5SLmv7DivfNa"
+BECH32 = "bc1qar0srrr7xfkvy5l643lydnw9re59gtzzwf5mdq"
+
+
+def monero_address() -> str:
+    """Standard mainnet address (network byte 18) in Monero's block base58."""
+    body = bytes([18]) + hashlib.sha256(b"spend").digest() + hashlib.sha256(b"view").digest()
+    if indicators.keccak is not None:
+        checksum = indicators.keccak.new(digest_bits=256, data=body).digest()[:4]
+    else:
+        checksum = b"\x00" * 4
+    raw, out = body + checksum, ""
+    for start in range(0, len(raw), 8):
+        block = raw[start:start + 8]
+        num, chars = int.from_bytes(block, "big"), ""
+        for _ in range({8: 11, 5: 7}[len(block)]):
+            num, digit = divmod(num, 58)
+            chars = indicators.B58_ALPHABET[digit] + chars
+        out += chars
+    return out
+
+
+def corrupt(value: str) -> str:
+    """Change one character in the middle, staying inside the alphabet."""
+    i = len(value) // 2
+    return value[:i] + ("2" if value[i] != "2" else "3") + value[i + 1:]
+
+
+@pytest.mark.parametrize("validator, value", [
+    (indicators.valid_base58check, BTC),
+    (indicators.valid_bech32, BECH32),
+    (indicators.valid_onion_v3, ONION + ".onion"),
+    (indicators.valid_monero, monero_address()),
+])
+def test_validators_check_checksums(validator, value):
+    assert validator(value)
+    if validator is not indicators.valid_monero or indicators.keccak is not None:
+        assert not validator(corrupt(value))
+
+
+@pytest.mark.parametrize("line", [
+    "alice@example.com:hunter2",
+    "bob_99:S3cretPass",
+    "admin:hunter22",
+    "user1:p@ssw0rd",
+])
+def test_credential_shapes_accepted(line):
+    assert indicators.valid_credential(line)
+
+
+@pytest.mark.parametrize("line", [
+    "color:red;",
+    "key:value1,",
+    "Login:Page",
+    "Price:$100",
+    "Total:1,250.00",
+    "john:password",
+    f"BTC:{BTC}",
+    "contact:ops@evil.example",
+    "mailto:x@example.com",
+    "Status:Online",
+    "Shipping:Worldwide",
+    "Escrow:Enabled",
+    "Vendor:DrugLord",
+    "Date:2024-05-01",
+    "Ratio:1920x1080",
+    "Version:v1.2.3",
+    "PGP:0x1F2E3D4C",
+])
+def test_credential_false_positives_rejected(line):
+    assert not indicators.valid_credential(line)
+
+
+def test_extract_one_page():
+    xmr = monero_address()
+    html = f"""<html><head><style>a {{ color:red; }}
+color:red;
+</style><script>
+key:value1,
+</script></head><body><!-- old:Passw0rd1 -->
+<p>Login:Page</p><p>Price:$100</p>
+<a href="http://{ONION}.onion/x">mirror</a> <a href="mailto:Ops@Example.com">mail</a>
+<pre>
+alice@example.com:hunter2
+BTC:{BTC}
+</pre>
+<p>{BECH32.upper()} {xmr} {corrupt(BTC)} 5f4dcc3b5aa765d61d8327deb882cf99</p>
+</body></html>"""
+    assert indicators.extract(html) == {
+        ("onion", f"{ONION}.onion"),
+        ("email", "ops@example.com"),
+        ("credential", "alice@example.com:hunter2"),
+        ("btc", BTC),
+        ("btc", BECH32),
+        ("xmr", xmr),
+        ("md5", "5f4dcc3b5aa765d61d8327deb882cf99"),
+    }
+
+
+def test_subdomain_onions_are_reported_as_the_service():
+    html = f"mirror: www.{ONION}.onion and <a href='http://a.b.{ONION.upper()}.onion/x'>x</a>"
+    assert indicators.extract(html) == {("onion", f"{ONION}.onion")}
+
+
+def test_many_rejected_lines_scan_in_linear_time():
+    page = "\n".join(f"Status{i}:Online" for i in range(20000)) + f"\n{BTC}"
+    assert indicators.extract(page) == {("btc", BTC)}
+
+
+def test_dotted_email_is_one_match():
+    assert indicators.extract("mail first.last@example.com or 1.ops@example.org") == {
+        ("email", "first.last@example.com"), ("email", "1.ops@example.org")}
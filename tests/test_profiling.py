@@ -0,0 +1,71 @@
+import json
+import pstats
+import threading
+
+import pytest
+
+import profiling
+
+
+@pytest.fixture(autouse=True)
+def no_run(monkeypatch):
+    monkeypatch.setattr(profiling, "_run", None)
+    yield
+    if profiling._run is not None:
+        profiling._run.discard()
+
+
+def test_parse_modes():
+    assert profiling.parse_modes("") == set()
+    assert profiling.parse_modes("cprofile") == {"cprofile", "spans"}
+    assert profiling.parse_modes("all") == set(profiling.MODES)
+    with pytest.raises(ValueError):
+        profiling.parse_modes("spans,flame")
+
+
+def test_cli_modes_take_precedence_over_the_environment(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILE", "spans")
+    from_env = profiling.enable(out_dir=tmp_path)
+    assert profiling.enable(out_dir=tmp_path) is from_env
+    from_cli = profiling.enable("cprofile", out_dir=tmp_path)
+    assert from_cli is not from_env and from_cli.modes == {"cprofile", "spans"}
+    assert profiling.enable("cprofile", out_dir=tmp_path) is from_cli
+    assert profiling.enable(out_dir=tmp_path) is from_cli
+
+
+def parse(n):
+    return sum(i * i for i in range(n))
+
+
+def test_each_thread_gets_its_own_profiler(tmp_path):
+    run = profiling.Run({"spans", "cprofile"}, tmp_path)
+    barrier = threading.Barrier(4)
+
+    def worker():
+        barrier.wait()
+        for _ in range(5):
+            with run.span("parse"):
+                parse(2000)
+
+    threads = [threading.Thread(target=worker) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert len(run.profilers["parse"]) == 4
+    run.finish()
+
+    stats = pstats.Stats(str(run.out_dir / "parse.prof"))
+    calls = {name: s[1] for (_file, _line, name), s in stats.stats.items()}
+    assert calls["parse"] == 20
+    assert json.loads((run.out_dir / "summary.json").read_text())["parse"]["calls"] == 20
+
+
+def test_traced_functions_follow_the_current_run(tmp_path):
+    traced = profiling.traced(parse, "parse")
+    first = profiling.enable("spans", out_dir=tmp_path)
+    traced(10)
+    second = profiling.enable("cprofile", out_dir=tmp_path)
+    traced(10)
+    assert first.stats["parse"]["calls"] == 1
+    assert second.stats["parse"]["calls"] == 1
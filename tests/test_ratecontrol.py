@@ -0,0 +1,85 @@
+import threading
+import time
+
+import ratecontrol
+
+
+def limit(**kw):
+    kw = dict({"max_limit": 8, "initial": 1, "adaptive": True}, **kw)
+    return ratecontrol.AIMDLimit("test", **kw)
+
+
+def complete(lim, ok=True, latency=0.1, now=0.0):
+    lim.inflight += 1
+    lim.record(ok, latency, now)
+
+
+def test_additive_increase_up_to_max():
+    lim = limit()
+    for _ in range(3):
+        complete(lim)
+    assert 2 <= lim.limit < 3  # about +1 per round trip's worth of completions
+    for _ in range(200):
+        complete(lim)
+    assert lim.limit == 8
+
+
+def test_multiplicative_decrease_once_per_round_trip():
+    lim = limit(initial=8)
+    complete(lim, latency=1.0, now=100.0)
+    complete(lim, ok=False, now=101.0)
+    complete(lim, ok=False, now=101.5)  # same congested window
+    assert lim.limit == 8 * ratecontrol.DECREASE_FACTOR
+    complete(lim, ok=False, now=103.0)
+    assert lim.limit == 8 * ratecontrol.DECREASE_FACTOR ** 2
+    for t in range(10):
+        complete(lim, ok=False, now=200.0 + 10 * t)
+    assert lim.limit == lim.min_limit
+
+
+def test_latency_spike_backs_off():
+    lim = limit(initial=4)
+    complete(lim, latency=0.1, now=1.0)
+    complete(lim, latency=0.1 * ratecontrol.LATENCY_TOLERANCE * 2, now=2.0)
+    assert lim.limit < 4
+
+
+def test_static_limit_never_moves():
+    lim = limit(initial=1, max_limit=1, adaptive=False)
+    complete(lim, ok=False)
+    complete(lim, latency=10.0)
+    assert lim.limit == 1
+
+
+def test_slot_prefers_circuit_with_headroom_and_records_failures():
+    controller = ratecontrol.AIMDController(circuits=2, metrics_path=None)
+    controller.circuits[0].limit, controller.circuits[1].limit = 4, 2
+    with controller.slot("a.onion") as first, controller.slot("b.onion") as second, \
+            controller.slot("c.onion") as third:
+        # free share of each limit: 1 vs 1, then 3/4 vs 1, then 3/4 vs 1/2
+        assert [first.circuit, second.circuit, third.circuit] == ["circuit-0", "circuit-1", "circuit-0"]
+    with controller.slot("a.onion") as slot:
+        slot.ok = False
+    host = controller.hosts["a.onion"]
+    assert (host.successes, host.failures, host.inflight) == (1, 1, 0)
+    assert all(c.inflight == 0 for c in controller.circuits)
+
+
+def test_static_pacing_is_one_request_at_a_time():
+    controller = ratecontrol.AIMDController(circuits=4, adaptive=False, metrics_path=None,
+                                            pause=lambda: time.sleep(0.05))
+    assert controller.max_in_flight == 1
+    starts, lock = [], threading.Lock()
+
+    def request(host):
+        with controller.slot(host):
+            with lock:
+                starts.append(time.monotonic())
+
+    threads = [threading.Thread(target=request, args=(f"h{i}.onion",)) for i in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    starts.sort()
+    assert all(b - a >= 0.045 for a, b in zip(starts, starts[1:]))  # the pause is taken inside the slot
@@ -0,0 +1,77 @@
+import json
+
+import pytest
+
+import archive
+import crawler as engine
+import reextract
+
+
+def body(n):
+    return (f"<html><head><title>Page {n}</title></head><body>"
+            f"<p>Fresh combo list {n}: credentials leak from a retail site, verified yesterday</p>"
+            f"<a href='http://{'a' * 56}.onion/{n}'>next</a></body></html>").encode()
+
+
+@pytest.fixture
+def archive_root(tmp_path):
+    root = tmp_path / "archive"
+    store = archive.Archive(root)
+    for n in range(10):
+        store.put(f"http://{'b' * 56}.onion/{n}", body(n))
+    store.close()
+    return root
+
+
+def run(archive_root, out_root, **kw):
+    return reextract.reextract(archive_root, out_root, workers=1, chunk_size=3, **kw)
+
+
+def records(out_dir):
+    return [json.loads(line) for part in sorted(out_dir.glob("part-*.jsonl")) for line in part.open(encoding="utf-8")]
+
+
+def test_version_changes_with_the_html_parser(monkeypatch):
+    version = reextract.extractor_version()
+    assert reextract.extractor_version() == version
+    monkeypatch.setattr(engine, "HTML_PARSER", "lxml")
+    assert reextract.extractor_version() != version
+
+
+def test_full_run_writes_every_latest_page(archive_root, tmp_path):
+    manifest = run(archive_root, tmp_path / "out")
+    out_dir = tmp_path / "out" / manifest["extractor_version"]
+    assert (manifest["records"], manifest["errors"], manifest["done_chunks"]) == (10, 0, [0, 1, 2, 3])
+    found = records(out_dir)
+    assert sorted(r["title"] for r in found) == sorted(f"Page {n}" for n in range(10))
+    assert all(r["threat"] and r["extractor_version"] == manifest["extractor_version"] for r in found)
+
+
+def test_resume_only_runs_unfinished_chunks(archive_root, tmp_path):
+    manifest = run(archive_root, tmp_path / "out")
+    out_dir = tmp_path / "out" / manifest["extractor_version"]
+    # Interrupted run: chunk 2 never finished, and the archive has grown since the snapshot
+    manifest.update(done_chunks=[0, 1, 3], records=7, finished_at=None)
+    reextract.save_manifest(out_dir / "_manifest.json", manifest)
+    (out_dir / "part-000002.jsonl").unlink()
+    (out_dir / "part-000000.jsonl").write_text('{"sentinel": true}\n', encoding="utf-8")
+    store = archive.Archive(archive_root)
+    store.put(f"http://{'c' * 56}.onion/", body(99))
+    store.close()
+
+    resumed = run(archive_root, tmp_path / "out")
+    assert resumed["done_chunks"] == [0, 1, 2, 3] and resumed["records"] == 10 and resumed["finished_at"]
+    assert (out_dir / "part-000000.jsonl").read_text(encoding="utf-8") == '{"sentinel": true}\n'
+    assert len((out_dir / "part-000002.jsonl").read_text(encoding="utf-8").splitlines()) == 3
+    assert not (out_dir / "part-000004.jsonl").exists()  # pinned to the first snapshot
+
+    assert run(archive_root, tmp_path / "out") == resumed  # complete: nothing to do
+
+
+def test_restart_and_a_new_chunk_size_start_over(archive_root, tmp_path):
+    first = run(archive_root, tmp_path / "out")
+    out_dir = tmp_path / "out" / first["extractor_version"]
+    again = reextract.reextract(archive_root, tmp_path / "out", workers=1, chunk_size=4)
+    assert again["done_chunks"] == [0, 1, 2] and again["records"] == 10
+    assert sorted(p.name for p in out_dir.glob("part-*")) == [f"part-00000{i}.jsonl" for i in range(3)]
+    assert run(archive_root, tmp_path / "out", restart=True)["started_at"] > again["started_at"]
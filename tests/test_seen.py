@@ -0,0 +1,46 @@
+import pytest
+
+import seen
+
+
+def test_grows_past_initial_capacity():
+    s = seen.SeenSet(capacity=16)
+    urls = list(seen.synthetic_urls(5000))
+    assert all(s.add(u) for u in urls)
+    assert not any(s.add(u) for u in urls)
+    assert len(s) == 5000
+    assert all(u in s for u in urls)
+    assert not any(u in s for u in seen.synthetic_urls(1000, prefix="b"))
+    assert s.nbytes < 5000 * 32  # a few slots per URL, not a set of strings
+
+
+def test_file_backed_set_survives_reopen_and_growth(tmp_path):
+    path = tmp_path / "seen.bin"
+    s = seen.SeenSet(path, capacity=16)
+    urls = list(seen.synthetic_urls(1000))
+    for u in urls:
+        s.add(u)
+    s.close()
+    assert not list(tmp_path.glob("*.grow"))
+
+    reopened = seen.open_seen(path, bloom_front=True)
+    assert len(reopened) == 1000
+    assert all(u in reopened for u in urls)
+    assert not reopened.add(urls[0])
+    assert reopened.add("http://new.onion/")
+    reopened.close()
+
+
+def test_rejects_foreign_file(tmp_path):
+    path = tmp_path / "not-seen.bin"
+    path.write_bytes(b"\x00" * 64)
+    with pytest.raises(ValueError):
+        seen.SeenSet(path)
+
+
+def test_scalable_bloom_grows_with_bounded_error():
+    bloom = seen.ScalableBloom(initial_capacity=1000, error_rate=0.01)
+    result = seen.measure(bloom, 20000, 20000)
+    assert len(bloom.filters) > 1
+    assert result["false_positive_rate"] < 0.02
+    assert result["bytes_per_url"] < 4
@@ -0,0 +1,131 @@
+import threading
+import time
+
+import pytest
+
+import sinks
+
+
+class RecordingSink(sinks.Sink):
+    def __init__(self, fail=False, gate=None):
+        super().__init__("test://recording")
+        self.fail = fail
+        self.gate = gate
+        self.records = []
+
+    def deliver(self, batch):
+        if self.gate is not None:
+            self.gate.wait(5)
+        if self.fail:
+            raise ConnectionError("SIEM down")
+        self.records.extend(batch)
+
+
+def wait_until(predicate, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        if time.monotonic() > deadline:
+            raise AssertionError("condition not met in time")
+        time.sleep(0.02)
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(sinks, "RETRY_BASE_SECONDS", 0)
+    monkeypatch.setattr(sinks, "SPOOL_POLL_SECONDS", 0.05)
+
+
+def channel(sink, spool_root, **kw):
+    kw = dict({"batch_size": 5, "batch_seconds": 0.05, "concurrency": 1}, **kw)
+    return sinks.Channel(sink, spool_root=spool_root, **kw)
+
+
+def test_failed_batches_are_replayed_after_restart(tmp_path):
+    down = channel(RecordingSink(fail=True), tmp_path)
+    for i in range(3):
+        down.offer({"n": i})
+    wait_until(lambda: down.stats()["retried"] >= 3)
+    down.close()
+    assert down.spool.pending() >= 1
+
+    up = channel(RecordingSink(), tmp_path)  # same sink URI, same spool directory
+    wait_until(lambda: up.spool.pending() == 0 and len(up.sink.records) >= 3)
+    up.close()
+    assert sorted(r["n"] for r in up.sink.records) == [0, 1, 2]
+
+
+def test_full_queue_spills_to_spool_without_losing_records(tmp_path):
+    gate = threading.Event()
+    ch = channel(RecordingSink(gate=gate), tmp_path, queue_size=2)
+    for i in range(40):
+        ch.offer({"n": i})  # never blocks, even with delivery stuck
+    assert ch.stats()["spilled"] > 0
+    gate.set()
+    wait_until(lambda: len(ch.sink.records) == 40 and ch.spool.pending() == 0)
+    ch.close()
+    assert sorted(r["n"] for r in ch.sink.records) == list(range(40))
+
+
+def test_permanent_errors_are_dropped_not_retried(tmp_path):
+    class Rejecting(RecordingSink):
+        def deliver(self, batch):
+            raise sinks.PermanentError("400 Bad Request")
+
+    ch = channel(Rejecting(), tmp_path)
+    ch.offer({"n": 1})
+    wait_until(lambda: ch.stats()["failed"] == 1)
+    ch.close()
+    assert ch.spool.pending() == 0
+
+
+def test_spool_keeps_attempts_and_due_time(tmp_path):
+    spool = sinks.Spool(tmp_path, max_bytes=1)
+    later = spool.write([{"n": 1}], attempts=2, due=time.time() + 60)
+    now = spool.write([{"n": 2}, {"n": 3}])
+    assert sinks.Spool.attempts(later) == 2
+    assert spool.due() == [now]
+    assert spool.read(now) == [{"n": 2}, {"n": 3}]
+    assert spool.enforce_limit() == 3  # over max_bytes: everything goes, oldest first
+    assert spool.pending() == 0
+
+
+def test_sink_must_implement_deliver():
+    class Incomplete(sinks.Sink):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete("test://incomplete")
+
+
+def test_a_batch_is_claimed_by_one_worker(tmp_path):
+    mine, theirs = sinks.Spool(tmp_path), sinks.Spool(tmp_path)  # two workers, one shared volume
+    path = mine.write([{"n": 1}], attempts=3)
+    claimed = mine.claim(path)
+    assert theirs.claim(path) is None
+    assert theirs.due() == [] and theirs.pending() == 1
+    assert sinks.Spool.attempts(claimed) == 3
+    assert theirs.read(claimed) == [{"n": 1}]
+
+
+def test_stale_claims_are_released(tmp_path):
+    spool = sinks.Spool(tmp_path)
+    path = spool.write([{"n": 1}])
+    spool.claim(path)
+    assert spool.release_stale(max_age=60) == 0
+    assert spool.release_stale(max_age=60, now=time.time() + 61) == 1
+    assert spool.due() == [path]
+
+
+def test_workers_sharing_a_spool_deliver_each_batch_once(tmp_path):
+    down = channel(RecordingSink(fail=True), tmp_path, batch_size=1)
+    for i in range(20):
+        down.offer({"n": i})
+    wait_until(lambda: down.stats()["retried"] >= 20)
+    down.close()
+
+    workers = [channel(RecordingSink(), tmp_path, concurrency=2) for _ in range(3)]
+    wait_until(lambda: workers[0].spool.pending() == 0)
+    for ch in workers:
+        ch.close()
+    delivered = sorted(r["n"] for ch in workers for r in ch.sink.records)
+    assert delivered == list(range(20))
@@ -0,0 +1,93 @@
+import json
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+pytest.importorskip("stem")
+import supervisor
+
+
+class FakeController:
+    def __init__(self, phase=""):
+        self.phase = phase
+        self.listeners = []
+
+    def add_event_listener(self, listener, *event_types):
+        self.listeners.append(listener)
+
+    def remove_event_listener(self, listener):
+        self.listeners.remove(listener)
+
+    def get_info(self, key, default=None):
+        return self.phase or default
+
+    def emit(self, action="BOOTSTRAP", **arguments):
+        for listener in list(self.listeners):
+            listener(SimpleNamespace(action=action, arguments=arguments))
+
+
+def test_on_bootstrap_only_moves_forward(tmp_path):
+    startup = supervisor.Startup(tmp_path / "startup.json")
+    startup.on_bootstrap(10, "conn_done", "Connected to a relay")
+    startup.on_bootstrap(5, "conn")  # late, out-of-order event
+    startup.on_bootstrap(10, "conn_done")
+    assert not startup.ready.is_set()
+    startup.on_bootstrap(100, "done", "Done")
+    assert startup.ready.is_set()
+    assert [(b["progress"], b["tag"]) for b in startup.report["bootstrap"]] == [(10, "conn_done"), (100, "done")]
+    startup.write()
+    written = json.loads((tmp_path / "startup.json").read_text())
+    assert written["bootstrap"][-1]["summary"] == "Done"
+    assert list(tmp_path.iterdir()) == [tmp_path / "startup.json"]
+
+
+def test_on_status_ignores_other_client_status_events(tmp_path):
+    startup = supervisor.Startup(tmp_path / "startup.json")
+    startup.on_status(SimpleNamespace(action="CIRCUIT_ESTABLISHED", arguments={}))
+    startup.on_status(SimpleNamespace(action="BOOTSTRAP", arguments={"PROGRESS": "75", "TAG": "enough_dirinfo"}))
+    assert startup.progress == 75
+
+
+def test_already_bootstrapped_tor_is_ready_at_once(tmp_path):
+    controller = FakeController('NOTICE BOOTSTRAP PROGRESS=100 TAG=done SUMMARY="Done"')
+    startup = supervisor.Startup(tmp_path / "startup.json")
+    assert supervisor.wait_for_bootstrap(controller, startup, timeout=0.01)
+    assert controller.listeners == []
+
+
+def test_bootstrap_waits_for_the_event(tmp_path):
+    controller = FakeController('NOTICE BOOTSTRAP PROGRESS=45 TAG=requesting_descriptors SUMMARY="Asking"')
+    startup = supervisor.Startup(tmp_path / "startup.json")
+    timer = threading.Timer(0.05, controller.emit, kwargs={"PROGRESS": "100", "TAG": "done"})
+    timer.start()
+    assert supervisor.wait_for_bootstrap(controller, startup, timeout=5)
+    timer.join()
+    assert [b["progress"] for b in startup.report["bootstrap"]] == [45, 100]
+
+
+def test_stalled_bootstrap_times_out(tmp_path):
+    controller = FakeController('NOTICE BOOTSTRAP PROGRESS=45 TAG=requesting_descriptors')
+    startup = supervisor.Startup(tmp_path / "startup.json")
+    assert not supervisor.wait_for_bootstrap(controller, startup, timeout=0.05)
+    assert startup.progress == 45 and controller.listeners == []
+
+
+def test_warm_circuits_records_each_circuit(tmp_path, monkeypatch):
+    class Session:
+        def __init__(self, name):
+            self.name = name
+
+        def head(self, url, timeout):
+            if self.name == "circuit-1":
+                raise ConnectionError("rendezvous failed")
+
+    monkeypatch.setattr(supervisor.ratecontrol, "ADAPTIVE", True)
+    monkeypatch.setattr(supervisor.ratecontrol, "CIRCUITS", 3)
+    monkeypatch.setattr(supervisor.crawler, "session_with_headers", Session)
+    startup = supervisor.Startup(tmp_path / "startup.json")
+    supervisor.warm_circuits(startup, ["http://a.onion", "http://b.onion"], circuits=5, timeout=5)
+    warmup = startup.report["warmup"]
+    assert {name: (w["url"], w["ok"]) for name, w in warmup.items()} == {
+        "circuit-0": ("http://a.onion", True), "circuit-1": ("http://b.onion", False),
+        "circuit-2": ("http://a.onion", True)}
@@ -0,0 +1,118 @@
+from types import SimpleNamespace
+
+import pytest
+
+stem = pytest.importorskip("stem")
+import telemetry
+
+
+class Clock:
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+class FakeController:
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.closed = []
+
+    def close_circuit(self, circ_id):
+        if self.fail:
+            raise stem.InvalidRequest("552", "Unknown circuit")
+        self.closed.append(circ_id)
+
+
+def circ(circ_id, status, purpose="HS_CLIENT_REND", rend_query=None, username="circuit-0", reason=None):
+    return SimpleNamespace(id=circ_id, status=status, purpose=purpose, hs_state=None, rend_query=rend_query,
+                           socks_username=username, reason=reason)
+
+
+def stream(stream_id, status, circ_id="1", target="abc.onion", reason=None):
+    return SimpleNamespace(id=stream_id, status=status, circ_id=circ_id, target_address=target, reason=reason)
+
+
+def hs_desc(action, address="abc", reason=None):
+    return SimpleNamespace(action=action, address=address, reason=reason)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(telemetry.time, "time", clock)
+    return clock
+
+
+@pytest.fixture
+def tel(clock):
+    return telemetry.TorTelemetry(controller=FakeController(), metrics_path=None)
+
+
+def test_stage_timings_for_one_onion_fetch(tel, clock):
+    tel.on_hs_desc(hs_desc(stem.HSDescAction.REQUESTED))
+    clock.now += 1.5
+    tel.on_hs_desc(hs_desc(stem.HSDescAction.RECEIVED))
+    tel.on_circ(circ("1", stem.CircStatus.LAUNCHED, rend_query="abc.onion"))
+    clock.now += 2.0
+    tel.on_circ(circ("1", stem.CircStatus.BUILT))
+    tel.on_stream(stream("10", stem.StreamStatus.NEW, circ_id="0"))
+    clock.now += 0.25
+    tel.on_stream(stream("10", stem.StreamStatus.SENTCONNECT))
+    tel.on_stream(stream("10", stem.StreamStatus.SUCCEEDED))
+
+    assert tel.request_breakdown("ABC.onion") == {"desc_ms": 1500.0, "rend_build_ms": 2000.0, "connect_ms": 250.0}
+    summary = tel.summary()
+    assert summary["desc_fetch_ms"]["p50"] == 1500.0
+    assert summary["rend_circuit_build_ms"]["p50"] == 2000.0
+    assert summary["stream_connect_ms"]["p50"] == 250.0
+    assert summary["by_socks_username"]["circuit-0"]["streams_succeeded"] == 1
+
+
+def test_failures_are_attributed(tel):
+    tel.on_hs_desc(hs_desc(stem.HSDescAction.REQUESTED))
+    tel.on_hs_desc(hs_desc(stem.HSDescAction.FAILED, reason="NOT_FOUND"))
+    assert tel.request_breakdown("abc.onion") == {"last_failure": "desc NOT_FOUND"}
+    tel.on_circ(circ("2", stem.CircStatus.LAUNCHED))
+    tel.on_circ(circ("2", stem.CircStatus.FAILED, reason="TIMEOUT"))
+    counts = tel.summary()["counts"]
+    assert (counts["desc_failed"], counts["circuits_failed"], counts["circuit_fail_TIMEOUT"]) == (1, 1, 1)
+
+
+def built(tel, streams=3, bad=2):
+    return {"status": stem.CircStatus.BUILT, "streams": streams, "bad_streams": bad}
+
+
+def test_should_rotate_needs_enough_bad_streams(tel):
+    assert tel._should_rotate("1", built(tel))
+    assert not tel._should_rotate("1", built(tel, streams=2, bad=2))  # too few to judge
+    assert not tel._should_rotate("1", built(tel, bad=1))
+
+
+def test_should_rotate_spares_busy_rotated_and_unbuilt_circuits(tel):
+    assert not tel._should_rotate("1", dict(built(tel), rotated=True))
+    assert not tel._should_rotate("1", dict(built(tel), status=stem.CircStatus.EXTENDED))
+    tel.streams["10"] = {"circ_id": "1"}
+    assert not tel._should_rotate("1", built(tel))
+    assert not telemetry.TorTelemetry(rotate=False, metrics_path=None)._should_rotate("2", built(tel))
+
+
+def test_failing_streams_rotate_the_circuit_once(tel):
+    tel.on_circ(circ("1", stem.CircStatus.LAUNCHED))
+    tel.on_circ(circ("1", stem.CircStatus.BUILT))
+    for i in range(4):
+        tel.on_stream(stream(str(i), stem.StreamStatus.NEW))
+        tel.on_stream(stream(str(i), stem.StreamStatus.FAILED, reason="TIMEOUT"))
+    assert tel.controller.closed == ["1"]
+    summary = tel.summary()
+    assert summary["counts"]["rotations"] == 1
+    assert [(r["circuit"], r["closed"]) for r in summary["rotations"]] == [("1", True)]
+
+
+def test_rotation_records_a_failed_close(clock):
+    tel = telemetry.TorTelemetry(controller=FakeController(fail=True), metrics_path=None)
+    tel._rotate("7", "test")
+    (decision,) = tel.summary()["rotations"]
+    assert decision["closed"] is False and "Unknown circuit" in decision["error"]
+    assert "rotations" not in tel.summary()["counts"]
@@ -0,0 +1,80 @@
+import pytest
+
+import urlnorm
+
+HOST = "duckduckgogg42xjoc72x3sjasowoarfbgcmvfimaftt6twagswzczad.onion"
+BASE = f"http://{HOST}"
+
+
+@pytest.mark.parametrize("url, expected", [
+    (f"HTTPS://{HOST.upper()}:443/a/", "/a/"),
+    (f"{BASE}:80/forum/", "/forum/"),
+    (f"{BASE}/forum", "/forum"),
+    (f"{BASE}", "/"),
+    (f"{BASE}/a/../b/./c/", "/b/c/"),
+    (f"{BASE}/a/b/..", "/a/"),
+    (f"{BASE}//x//y", "/x/y"),
+    (f"{BASE}/%7euser/%41", "/~user/A"),
+    (f"{BASE}/files/a%2fb%3f%23", "/files/a%2Fb%3F%23"),
+    (f"{BASE}/a b", "/a%20b"),
+    (f"{BASE}/100%", "/100%25"),
+])
+def test_canonical_paths(url, expected):
+    assert urlnorm.canonicalize(url) == BASE + expected
+
+
+def test_query_and_fragment():
+    url = f"{BASE}/t.php?b=2&utm_source=x&a=1&sid=abc#reply-4"
+    assert urlnorm.canonicalize(url) == f"{BASE}/t.php?a=1&b=2"
+
+
+def test_nonstandard_port_is_kept():
+    assert urlnorm.canonicalize(f"{BASE}:8080/") == f"http://{HOST}:8080/"
+
+
+@pytest.mark.parametrize("href, expected", [
+    ("thread-1.html", "/forum/thread-1.html"),
+    ("../index.php", "/index.php"),
+    ("/rules", "/rules"),
+    ("?page=2", "/forum/?page=2"),
+])
+def test_relative_links_resolve_against_directory(href, expected):
+    assert urlnorm.canonicalize(href, f"{BASE}/forum/") == BASE + expected
+
+
+@pytest.mark.parametrize("url", [
+    "http://expyuzz4wqqyqhjn.onion/",                                        # v2
+    f"http://{HOST.replace('duck', 'duke')}/",                                  # bad checksum
+    "http://example.com/",
+    "mailto:ops@example.com",
+    "ftp://" + HOST + "/",
+    f"http://{HOST}:99999/",
+])
+def test_invalid_urls_are_dropped(url):
+    assert urlnorm.canonicalize(url) is None
+
+
+@pytest.mark.parametrize("path, kind", [
+    ("/", urlnorm.FETCH),
+    ("/forum/", urlnorm.FETCH),
+    ("/thread.php", urlnorm.FETCH),
+    ("/index.HTML", urlnorm.FETCH),
+    ("/logo.png", urlnorm.SKIP),
+    ("/dump.tar.gz", urlnorm.SKIP),
+    ("/static/page.html", urlnorm.SKIP),
+    ("/download", urlnorm.FETCH),
+    ("/data.bin2", urlnorm.PROBE),
+    ("/v1.2", urlnorm.PROBE),
+])
+def test_classify(path, kind):
+    assert urlnorm.classify(BASE + path) == kind
+
+
+def test_page_links_resolve_against_the_served_url(tmp_path):
+    import crawler
+
+    html = '<html><a href="thread-1.html">t</a><a href="style.css">s</a></html>'
+    # /forum redirected to /forum/: the relative link lives under /forum/
+    parsed = crawler.process_page(f"{BASE}/forum", html, db_path=tmp_path / "crawl.json", base_url=f"{BASE}/forum/")
+    assert parsed["url"] == f"{BASE}/forum"
+    assert parsed["links"] == [f"{BASE}/forum/thread-1.html"]
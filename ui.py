@@ -1,92 +1,84 @@
 import streamlit as st
 import pandas as pd
-import numpy as np
-import io
-import base64
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent / "crawler"))
+import api
+import export
+from alerts import GLOBAL_ORG
+from detector import SEVERITIES
 
 # --- Utility Functions ---
 
-# Function to convert DataFrame to CSV for download
-def convert_df_to_csv(df):
-    return df.to_csv(index=False).encode('utf-8')
+# Exports are generated from the detections table in chunks and cached on disk
+# (see crawler/export.py); nothing is built until a button is clicked.
+def prepare_export(fmt, organization_name, date_range, min_severity):
+    since = until = None
+    if len(date_range) == 2:
+        since = export.parse_date(date_range[0].isoformat())
+        until = export.parse_date(date_range[1].isoformat()) + 86400
+    return export.export(fmt, organization_name, since, until, min_severity or None)
+
+def export_button(label, fmt, file_name, mime, filters):
+    # Only the run that prepared the export reads the file; every other rerun leaves it on disk
+    if st.button(f"Prepare {label}", key=f"prepare_{fmt}"):
+        path = prepare_export(fmt, *filters)
+        with open(path, "rb") as f:
+            st.download_button(label=f"Download {label}", data=f, file_name=file_name, mime=mime, key=f"download_{fmt}")
 
-# Function to generate a dummy PDF report content (as Streamlit doesn't support PDF generation natively)
-# In a real application, you would use a library like FPDF or ReportLab here.
-def generate_pdf_report(organization_name, log_data):
-    # This is a placeholder for actual PDF generation logic
-    report_text = f"""
-    --- Dark Web Threat Monitoring Report for {organization_name} ---
+# --- Data Functions (Org-Specific, served by the query API, crawler/api.py) ---
 
-    Summary: 
-    Total Threats: 457
-    Critical Alerts: 15
-    New Alerts (24h): 32
+@st.cache_resource
+def api_client():
+    return api.Client()
 
-    Detailed Log Snippet:
-    {log_data.to_string()}
+client = api_client()
 
-    Note: This is a simulated report. For a full PDF, complex libraries are needed.
-    """
-    return report_text.encode('utf-8')
+SEVERITY_LEVELS = {"CRITICAL": "error", "HIGH": "warning", "MEDIUM": "warning"}
+SEVERITY_ICONS = {"CRITICAL": "💥", "HIGH": "⚠️", "MEDIUM": "⚠️"}
 
-# --- Data Simulation Functions (Org-Specific) ---
+def get_org_summary(org_name):
+    return client.get("/org", org=org_name)
 
 def get_key_metrics(org_name):
-    # Simple simulation: metrics change based on the organization name
-    if org_name == "GlobalTech Inc.":
-        return 457, 32, 15
-    elif org_name == "SecureBank":
-        return 210, 8, 5
-    else:
-        return 50, 2, 1
+    summary = get_org_summary(org_name)
+    return summary["total"], summary["new_24h"], summary["critical"]
 
 def get_threat_data(org_name):
-    if org_name == "SecureBank":
-        return pd.DataFrame({
-            'Threat Type': ['Credential Leak', 'Impersonation', 'Phishing Kit', 'Fake Job Site'],
-            'Count': [110, 50, 30, 20] 
-        })
-    else: # Default or GlobalTech Inc.
-        return pd.DataFrame({
-            'Threat Type': ['Credential Leak', 'Impersonation', 'Phishing Kit', 'Fake Job Site'],
-            'Count': [90, 120, 60, 45] 
-        })
+    return pd.DataFrame(get_org_summary(org_name)["threat_counts"], columns=['Threat Type', 'Count'])
 
 def get_alerts(org_name):
-    if org_name == "SecureBank":
-        return [
-            ("error", f"💥 **CRITICAL:** Large SQL dump of customer data found on forum."),
-            ("warning", f"⚠️ **MEDIUM:** Phishing kit targeting '{org_name}' found."),
-            ("info", f"✅ **LOW:** No critical new threats detected in the last 12 hours.")
-        ]
-    else:
-        return [
-            ("error", f"💡 **CRITICAL:** New brand impersonation detected for '{org_name}'. Contact legal team."),
-            ("warning", f"⚠️ **HIGH:** 500+ user credentials leaked on forum."),
-            ("warning", f"⚠️ **MEDIUM:** Phishing kit targeting '{org_name}' found."),
-            ("info", f"✅ **LOW:** New fake job posting on dark web.")
-        ]
-
-def get_log_data(org_name):
-    return pd.DataFrame({
-        'Timestamp': ['2023-10-26 10:30', '2023-10-26 09:45', '2023-10-26 09:40', '2023-10-26 09:00', '2023-10-25 18:00'],
-        'Threat Type': ['Credential Leak', 'Impersonation Leak', 'Phishing Kit', 'Credential Leak', 'Fake Job Site'],
-        'Severity': ['CRITICAL', 'HIGH', 'MEDIUM', 'HIGH', 'LOW'],
-        'Description': [
-            f'Full user table snippet leaked (Org: {org_name})', 
-            f'Fake login portal at mirrotech.onion', 
-            f'New phishing kit targeting {org_name} logo found',
-            '500+ user credentials leaked on forum', 
-            'Job scam link posted on RAMP'
-        ],
-        'Source URL': [
-            'http://ramblers.onion/leak', 
-            'http://mirrotech.onion/fake_site', 
-            'http://shadowdrop.onion/phish', 
-            'http://leaks.onion/users', 
-            'http://hireme.onion/jobs'
-        ]
-    })
+    found = client.get("/alerts", org=org_name)["items"]
+    if not found:
+        return [("info", f"✅ **INFO:** No alerts raised for '{org_name}' yet.")]
+    messages = []
+    for a in found:
+        repeat = f" (x{a['count']})" if a['count'] > 1 else ""
+        icon = SEVERITY_ICONS.get(a['severity'], "✅")
+        messages.append((SEVERITY_LEVELS.get(a['severity'], "info"),
+                         f"{icon} **{a['severity']}:** {a['message']}{repeat}"))
+    return messages
+
+def get_new_services(limit=10):
+    """First-seen onion hosts (INFO alerts on the global org), newest first."""
+    found = client.get("/alerts", org=GLOBAL_ORG, rule="first_seen", limit=limit)["items"]
+    new = pd.DataFrame([(a['ts'], a['url']) for a in found], columns=['First Seen', 'URL'])
+    new['First Seen'] = pd.to_datetime(new['First Seen'], unit='s').dt.strftime('%Y-%m-%d %H:%M')
+    return new
+
+def get_trend_data(org_name, days=30):
+    series = client.get("/aggregates/series", metric="detections", grain="day", periods=days, dim="org", key=org_name)
+    trend = pd.DataFrame(series["items"], columns=['Day', 'Threats'])
+    trend['Day'] = pd.to_datetime(trend['Day'], unit='s').dt.date
+    return trend
+
+def get_log_data(org_name, limit=200):
+    rows = client.get("/detections", org=org_name, order="desc", limit=limit)["items"]
+    log = pd.DataFrame([(r['ts'], r['threat_type'], r['severity'], r['description'], r['url']) for r in rows],
+                       columns=['Timestamp', 'Threat Type', 'Severity', 'Description', 'Source URL'])
+    log['Timestamp'] = pd.to_datetime(log['Timestamp'], unit='s').dt.strftime('%Y-%m-%d %H:%M')
+    return log
 
 # --- Streamlit UI Layout ---
 
@@ -99,7 +91,7 @@ with st.sidebar:
     st.header("DarkSight Crawler")
     
     # ORGANIZATION SELECTION - Makes the app organization-specific
-    organization_options = ["GlobalTech Inc.", "SecureBank", "Acme University"]
+    organization_options = client.get("/orgs")["items"]
     selected_org = st.selectbox(
         "Select Organization to Monitor",
         options=organization_options
@@ -108,6 +100,16 @@ with st.sidebar:
     st.subheader("Navigation")
     st.radio("Go to", ["Dashboard", "Crawler Settings", "Reports", "Team"])
 
+if not organization_options:
+    st.title("Dark Web Threat Monitoring Dashboard")
+    st.info("No organizations are watched yet: copy data/watchlists.example.json to data/watchlists.json "
+            "(or set THREAT_WATCHLIST_PATH) and list each organization's terms.")
+    new_services = get_new_services()
+    if not new_services.empty:
+        st.subheader("New Onion Services")
+        st.dataframe(new_services, hide_index=True, use_container_width=True)
+    st.stop()
+
 # --- Main Dashboard Content ---
 
 st.title(f"Dark Web Threat Monitoring Dashboard: {selected_org}")
@@ -116,28 +118,16 @@ st.title(f"Dark Web Threat Monitoring Dashboard: {selected_org}")
 total_threats, new_threats, critical_severity = get_key_metrics(selected_org)
 log_data_df = get_log_data(selected_org)
 
-# Create a container for the export button to place it high up
+# Create a container for the export buttons to place them high up
 export_col, _ = st.columns([1, 4]) 
 with export_col:
-    # CSV Download Button
-    csv = convert_df_to_csv(log_data_df)
-    st.download_button(
-        label="Download Full Log (.csv)",
-        data=csv,
-        file_name=f'{selected_org}_threat_log.csv',
-        mime='text/csv',
-        key='download_csv'
-    )
-    
-    # PDF Placeholder Download Button (Actual PDF generation is complex)
-    pdf_content = generate_pdf_report(selected_org, log_data_df)
-    st.download_button(
-        label="Generate Summary Report (.txt)", # Using .txt as placeholder for PDF
-        data=pdf_content,
-        file_name=f'{selected_org}_summary_report.txt',
-        mime='application/octet-stream',
-        key='download_pdf'
-    )
+    with st.expander("Export", expanded=False):
+        date_range = st.date_input("Date range (UTC)", value=())
+        min_severity = st.selectbox("Minimum severity", [""] + SEVERITIES)
+        filters = (selected_org, date_range, min_severity)
+        export_button("Full Log (.csv)", "csv", f'{selected_org}_threat_log.csv', 'text/csv', filters)
+        export_button("Full Log (.jsonl)", "jsonl", f'{selected_org}_threat_log.jsonl', 'application/x-ndjson', filters)
+        export_button("Summary Report (.txt)", "summary", f'{selected_org}_summary_report.txt', 'text/plain', filters)
 
 
 # Key Metric Cards
@@ -168,11 +158,9 @@ with col_charts:
         use_container_width=True
     )
 
-    # Threat Trend Line Chart (Simulated)
+    # Threat Trend Line Chart (daily rollup buckets)
     st.header("Threat Trend (Last 30 Days)")
-    # Generate cumulative random data for a rising trend effect
-    trend_data = pd.DataFrame(np.cumsum(np.random.randint(-1, 3, size=30)), columns=['Threats'])
-    trend_data['Day'] = range(1, 31)
+    trend_data = get_trend_data(selected_org)
     
     st.line_chart(
         trend_data, 
@@ -194,7 +182,15 @@ with col_alerts:
             st.warning(message)
         else:
             st.info(message)
-    
+
+    # First-seen onion hosts are INFO alerts on the global org, not on any watchlist
+    st.subheader("New Onion Services")
+    new_services = get_new_services()
+    if new_services.empty:
+        st.info("No new onion services seen yet.")
+    else:
+        st.dataframe(new_services, hide_index=True, use_container_width=True)
+
 # Detailed Threat Log
 st.markdown("---")
 st.subheader("Detailed Threat Log")